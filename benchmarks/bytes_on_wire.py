@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.training_database import (
+    CardSpec,
+    DogSpec,
+    TrainingDatabase,
+    TrainingSpec,
+    TrainingType,
+)
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    brotli,
+    compression,
+    user_authentication,
+)
+
+parser = argparse.ArgumentParser(prog="Bytes on wire")
+parser.add_argument("--cards", default=500, type=int)
+parser.add_argument("--trainings_per_card", default=10, type=int)
+parser.add_argument("--user_id", default="benchmark", type=str)
+
+
+async def seed(
+    training_database: TrainingDatabase, *, cards, trainings_per_card, user_id
+):
+    dog = await training_database.create_dog_entry(
+        dog_spec=DogSpec(registration_time=1, name="benchmark", user_id=user_id)
+    )
+    for timestamp in range(1, cards + 1):
+        await training_database.create_card_entry(
+            card_spec=CardSpec(
+                timestamp=timestamp, cost=100, slots=trainings_per_card, user_id=user_id
+            )
+        )
+    await training_database.create_training_entries(
+        training_specs=[
+            TrainingSpec(
+                timestamp=timestamp,
+                type=TrainingType.QUERBEET,
+                dogs=[dog.id],
+                user_id=user_id,
+            )
+            for timestamp in range(1, cards * trainings_per_card + 1)
+        ]
+    )
+
+
+async def measure(client, path, *, user_id):
+    sizes = {}
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        response = await client.get(
+            path, headers={"user_id": user_id, "Accept-Encoding": encoding}
+        )
+        sizes[encoding] = len(await response.read())
+    response = await client.get(
+        path,
+        headers={
+            "user_id": user_id,
+            "If-None-Match": response.headers["ETag"],
+        },
+    )
+    sizes[f"repeat ({response.status})"] = len(await response.read())
+    return sizes
+
+
+async def main(*, cards, trainings_per_card, user_id):
+    with tempfile.TemporaryDirectory() as directory:
+        connection = f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade)
+        await engine.dispose()
+
+        training_database = TrainingDatabase(connection=connection)
+        await seed(
+            training_database,
+            cards=cards,
+            trainings_per_card=trainings_per_card,
+            user_id=user_id,
+        )
+        training_handler = TrainingHandler(training_database=training_database)
+        app = web.Application(middlewares=[compression, user_authentication])
+        app.add_routes(
+            [
+                web.get("/trainings", training_handler.get_all_trainings),
+                web.get("/cards", training_handler.get_all_cards),
+            ]
+        )
+        async with TestClient(TestServer(app), auto_decompress=False) as client:
+            for path in ("/cards", "/trainings"):
+                sizes = await measure(client, path, user_id=user_id)
+                identity = sizes["identity"]
+                print(f"{path}:")
+                for name, size in sizes.items():
+                    print(f"  {name}: {size} bytes ({size / identity:.1%})")
+        await training_database.engine.dispose()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            cards=args.cards,
+            trainings_per_card=args.trainings_per_card,
+            user_id=args.user_id,
+        )
+    )
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.training_database import TrainingDatabase, TrainingType
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    unit_of_work,
+    user_authentication,
+)
+
+parser = argparse.ArgumentParser(prog="Checkouts per request")
+parser.add_argument("--requests", default=100, type=int)
+parser.add_argument("--user_id", default="benchmark", type=str)
+
+
+async def create_app(*, connection, middlewares):
+    engine = create_async_engine(connection)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await engine.dispose()
+
+    training_database = TrainingDatabase(connection=connection)
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(middlewares=middlewares)
+    app["training_database"] = training_database
+    app.add_routes(
+        [
+            web.get("/cards", training_handler.get_all_cards),
+            web.post("/cards", training_handler.create_card_entry),
+            web.post("/dogs", training_handler.create_dog_entry),
+            web.post("/trainings", training_handler.create_training_entry),
+        ]
+    )
+    return app, training_database
+
+
+async def measure(*, connection, middlewares, requests, user_id):
+    app, training_database = await create_app(
+        connection=connection, middlewares=middlewares
+    )
+    headers = {"user_id": user_id}
+    checkouts = {}
+    async with TestClient(TestServer(app)) as client:
+
+        async def count(name, send):
+            start = training_database.pool_metrics.checkouts
+            for _ in range(requests):
+                response = await send()
+                response.raise_for_status()
+            checkouts[name] = (
+                training_database.pool_metrics.checkouts - start
+            ) / requests
+            return await response.json()
+
+        await count(
+            "POST /cards",
+            lambda: client.post(
+                "/cards",
+                json={"timestamp": 1, "cost": 1, "slots": 1},
+                headers=headers,
+            ),
+        )
+        dog = await count(
+            "POST /dogs",
+            lambda: client.post(
+                "/dogs",
+                json={"name": "benchmark", "registration_time": 1},
+                headers=headers,
+            ),
+        )
+        await count(
+            "POST /trainings",
+            lambda: client.post(
+                "/trainings",
+                json={
+                    "timestamp": 1,
+                    "type": TrainingType.QUERBEET.value,
+                    "dogs": [dog["id"]],
+                },
+                headers=headers,
+            ),
+        )
+        await count(
+            "GET /cards?expand=trainings.dog",
+            lambda: client.get(
+                "/cards", params={"expand": "trainings.dog"}, headers=headers
+            ),
+        )
+    await training_database.engine.dispose()
+    return checkouts
+
+
+async def main(*, requests, user_id):
+    results = {}
+    for name, middlewares in [
+        ("per repository call", [user_authentication]),
+        ("per request", [user_authentication, unit_of_work]),
+    ]:
+        with tempfile.TemporaryDirectory() as directory:
+            connection = f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}"
+            results[name] = await measure(
+                connection=connection,
+                middlewares=middlewares,
+                requests=requests,
+                user_id=user_id,
+            )
+    for name, checkouts in results.items():
+        print(f"Sessions {name}:")
+        for request, per_request in checkouts.items():
+            print(f"  {request}: {per_request:.2f} checkouts per request")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(main(requests=args.requests, user_id=args.user_id))
@@ -0,0 +1,86 @@
+from sqlalchemy import insert
+
+from dogtraining.server.models import Card, Dog, Training
+from dogtraining.server.training_database import TrainingType
+
+DOGS_PER_USER = 5
+SLOTS_PER_CARD = 10
+MINUTE = 60_000
+SEED_CHUNK_SIZE = 10_000
+TYPES = list(TrainingType)
+
+
+def training_values(
+    index, *, users, dogs_per_user=DOGS_PER_USER, slots_per_card=SLOTS_PER_CARD
+):
+    user = index % users
+    booking = index // users
+    return dict(
+        id=f"training-{index}",
+        timestamp=(booking + 1) * MINUTE,
+        type=TYPES[booking % len(TYPES)],
+        user_id=f"user-{user}",
+        card_id=f"card-{user}-{booking // slots_per_card}",
+        dog_id=f"dog-{user}-{booking % dogs_per_user}",
+    )
+
+
+def card_values(index, *, users, slots_per_card=SLOTS_PER_CARD):
+    user = index % users
+    booking = index // users
+    return dict(
+        id=f"card-{user}-{booking // slots_per_card}",
+        timestamp=(booking + 1) * MINUTE,
+        cost=100,
+        slots=slots_per_card,
+        remaining_slots=0,
+        version=1,
+        user_id=f"user-{user}",
+    )
+
+
+async def seed(
+    engine,
+    *,
+    start,
+    stop,
+    users,
+    dogs_per_user=DOGS_PER_USER,
+    slots_per_card=SLOTS_PER_CARD,
+):
+    async with engine.begin() as conn:
+        if start == 0:
+            await conn.execute(
+                insert(Dog),
+                [
+                    dict(
+                        id=f"dog-{user}-{dog}",
+                        registration_time=1,
+                        name=f"dog {dog}",
+                        user_id=f"user-{user}",
+                    )
+                    for user in range(users)
+                    for dog in range(dogs_per_user)
+                ],
+            )
+        for chunk in range(start, stop, SEED_CHUNK_SIZE):
+            indexes = range(chunk, min(chunk + SEED_CHUNK_SIZE, stop))
+            cards = [
+                card_values(index, users=users, slots_per_card=slots_per_card)
+                for index in indexes
+                if index // users % slots_per_card == 0
+            ]
+            if cards:
+                await conn.execute(insert(Card), cards)
+            await conn.execute(
+                insert(Training),
+                [
+                    training_values(
+                        index,
+                        users=users,
+                        dogs_per_user=dogs_per_user,
+                        slots_per_card=slots_per_card,
+                    )
+                    for index in indexes
+                ],
+            )
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import csv
+import math
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.dataset import MINUTE, seed
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.training_database import (
+    CardSpec,
+    TrainingDatabase,
+    TrainingSpec,
+    TrainingType,
+)
+
+parser = argparse.ArgumentParser(prog="Hot paths")
+parser.add_argument(
+    "--histories", default=[1_000, 10_000, 100_000], nargs="+", type=int
+)
+parser.add_argument("--repeat", default=30, type=int)
+parser.add_argument(
+    "--max_slope",
+    default=0.3,
+    type=float,
+    help="Exit with 1 when the time of a path grows faster than history ** max_slope, 1 is linear.",
+)
+parser.add_argument("--csv", default=None, type=Path)
+
+USER_ID = "user-0"
+PAGE_SIZE = 50
+BAR_WIDTH = 40
+
+
+async def book_training(training_database: TrainingDatabase):
+    await training_database.create_training_entry(
+        training_spec=TrainingSpec(
+            timestamp=MINUTE,
+            type=TrainingType.QUERBEET,
+            dogs=["dog-0-0"],
+            user_id=USER_ID,
+        )
+    )
+
+
+async def get_free_cards(training_database: TrainingDatabase):
+    async with training_database.unit_of_work() as session:
+        await training_database._get_free_cards(session=session, user_id=USER_ID)
+
+
+async def get_card_page(training_database: TrainingDatabase):
+    await training_database.get_all_card_entries(
+        user_id=USER_ID, limit=PAGE_SIZE, expand=("trainings.dog",)
+    )
+
+
+async def load_pages(training_database: TrainingDatabase):
+    cards = await training_database.get_all_card_entries(
+        user_id=USER_ID, limit=PAGE_SIZE, expand=("trainings.dog",)
+    )
+    trainings = await training_database.get_all_training_entries(
+        user_id=USER_ID, limit=PAGE_SIZE, expand=("dog",)
+    )
+    return cards, trainings
+
+
+PATHS = {
+    "create_training_entry": book_training,
+    "_get_free_cards": get_free_cards,
+    "get_all_card_entries": get_card_page,
+}
+
+
+async def measure(path, *, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await path()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def measure_sync(serialize, *, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def slope(curve):
+    if len(curve) < 2:
+        return 0.0
+    (smallest, first), (largest, last) = curve[0], curve[-1]
+    return math.log(last / first) / math.log(largest / smallest)
+
+
+def plot(name, curve):
+    longest = max(seconds for _, seconds in curve)
+    print(f"{name} (slope {slope(curve):.2f}):")
+    for history, seconds in curve:
+        bar = "#" * max(1, round(seconds / longest * BAR_WIDTH))
+        print(f"  {history:>9} {seconds * 1_000_000:>9.0f} us {bar}")
+
+
+async def main(*, histories, repeat, max_slope, csv_path):
+    histories = sorted(histories)
+    curves = {name: [] for name in [*PATHS, "Card.as_dict", "Training.as_dict"]}
+    with tempfile.TemporaryDirectory() as directory:
+        connection = f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade)
+        training_database = TrainingDatabase(connection=connection)
+        await training_database.create_card_entry(
+            card_spec=CardSpec(
+                timestamp=(histories[-1] + 1) * MINUTE,
+                cost=1,
+                slots=len(histories) * repeat,
+                user_id=USER_ID,
+            )
+        )
+        seeded = 0
+        for history in histories:
+            await seed(engine, start=seeded, stop=history, users=1)
+            seeded = history
+            for name, path in PATHS.items():
+                seconds = await measure(lambda: path(training_database), repeat=repeat)
+                curves[name].append((history, seconds))
+            cards, trainings = await load_pages(training_database)
+            for name, serialize in [
+                (
+                    "Card.as_dict",
+                    lambda: [card.as_dict(expand=("trainings.dog",)) for card in cards],
+                ),
+                ("Training.as_dict", lambda: [t.as_dict() for t in trainings]),
+            ]:
+                curves[name].append((history, measure_sync(serialize, repeat=repeat)))
+        await training_database.engine.dispose()
+        await engine.dispose()
+    print(f"Median of {repeat} runs per number of prior trainings:")
+    for name, curve in curves.items():
+        plot(name, curve)
+    if csv_path is not None:
+        with csv_path.open("w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["path", "history", "seconds"])
+            for name, curve in curves.items():
+                writer.writerows((name, history, seconds) for history, seconds in curve)
+    regressions = [name for name, curve in curves.items() if slope(curve) > max_slope]
+    for name in regressions:
+        print(
+            f"Regression: {name} grows with history ** {slope(curves[name]):.2f}, more than {max_slope}"
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            histories=args.histories,
+            repeat=args.repeat,
+            max_slope=args.max_slope,
+            csv_path=args.csv,
+        )
+    )
@@ -0,0 +1,502 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict
+
+import attrs
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.dataset import DOGS_PER_USER, MINUTE, SLOTS_PER_CARD, TYPES, seed
+from dogtraining.server.__main__ import create_app
+from dogtraining.server.__main__ import parser as server_parser
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.statistics import rebuild_statistics
+
+parser = argparse.ArgumentParser(prog="Load test")
+parser.add_argument("--trainings", default=10_000, type=int)
+parser.add_argument("--users", default=10, type=int)
+parser.add_argument("--dogs_per_user", default=DOGS_PER_USER, type=int)
+parser.add_argument("--slots_per_card", default=SLOTS_PER_CARD, type=int)
+parser.add_argument(
+    "--database",
+    default=None,
+    type=Path,
+    help="Keep the seeded SQLite file here and reuse it when it exists.",
+)
+parser.add_argument("--workload", default="mixed", choices=["read", "mixed", "write"])
+parser.add_argument("--requests", default=2000, type=int)
+parser.add_argument("--concurrency", default=10, type=int)
+parser.add_argument("--seed", default=0, type=int)
+parser.add_argument(
+    "--rate_limit",
+    action="store_true",
+    help="Keep the write rate limits of the server instead of turning them off.",
+)
+parser.add_argument(
+    "--repeat",
+    default=3,
+    type=int,
+    help="Run the workload this often on fresh copies of the dataset and report the medians.",
+)
+parser.add_argument("--save_baseline", default=None, type=Path)
+parser.add_argument(
+    "--baseline",
+    default=None,
+    type=Path,
+    help="Compare with a saved baseline and exit with 1 on a regression.",
+)
+parser.add_argument(
+    "--tolerance",
+    default=0.5,
+    type=float,
+    help="The relative change of throughput, queries and the p50 and p95 latency accepted by --baseline.",
+)
+parser.add_argument(
+    "--slack_ms",
+    default=1.0,
+    type=float,
+    help="Latency changes below this many milliseconds are never a regression.",
+)
+
+MIN_SAMPLES = 50
+
+
+@attrs.frozen
+class Dataset:
+    trainings: int = attrs.field()
+    users: int = attrs.field()
+    dogs_per_user: int = attrs.field()
+    slots_per_card: int = attrs.field()
+
+    def user(self, rng: random.Random):
+        return f"user-{rng.randrange(self.users)}"
+
+    def dog(self, rng: random.Random, user):
+        return f"{user.replace('user', 'dog')}-{rng.randrange(self.dogs_per_user)}"
+
+    def training(self, rng: random.Random):
+        index = rng.randrange(self.trainings)
+        return f"user-{index % self.users}", f"training-{index}"
+
+    def card(self, rng: random.Random):
+        index = rng.randrange(self.trainings)
+        booking = index // self.users
+        return (
+            f"user-{index % self.users}",
+            f"card-{index % self.users}-{booking // self.slots_per_card}",
+        )
+
+    def timestamp(self, rng: random.Random):
+        return rng.randrange(1, self.trainings // self.users + 2) * MINUTE
+
+
+@attrs.frozen
+class Operation:
+    method: str = attrs.field()
+    route: str = attrs.field()
+    request: Callable[[random.Random, Dataset], Dict] = attrs.field()
+
+    @property
+    def name(self):
+        return f"{self.method} {self.route}"
+
+
+def list_trainings(rng, dataset):
+    start = dataset.timestamp(rng)
+    params = rng.choice(
+        [
+            dict(limit=50),
+            {"from": start, "to": start + 100 * MINUTE, "limit": 50},
+            dict(type=rng.choice(TYPES).value, order="desc", limit=50),
+        ]
+    )
+    return dict(path="/trainings", params=params, user=dataset.user(rng))
+
+
+def get_training(rng, dataset):
+    user, training_id = dataset.training(rng)
+    return dict(path=f"/trainings/{training_id}", user=user)
+
+
+def book_training(rng, dataset):
+    user = dataset.user(rng)
+    return dict(
+        path="/trainings",
+        json=dict(
+            timestamp=dataset.timestamp(rng),
+            type=rng.choice(TYPES).value,
+            dogs=[dataset.dog(rng, user)],
+        ),
+        user=user,
+    )
+
+
+def book_trainings(rng, dataset):
+    user = dataset.user(rng)
+    return dict(
+        path="/trainings/batch",
+        json=[
+            dict(
+                timestamp=dataset.timestamp(rng),
+                type=rng.choice(TYPES).value,
+                dogs=[dataset.dog(rng, user)],
+            )
+            for _ in range(5)
+        ],
+        user=user,
+    )
+
+
+def get_card(rng, dataset):
+    user, card_id = dataset.card(rng)
+    return dict(path=f"/cards/{card_id}", user=user)
+
+
+def create_card(rng, dataset):
+    return dict(
+        path="/cards",
+        json=dict(timestamp=dataset.timestamp(rng), cost=100, slots=10),
+        user=dataset.user(rng),
+    )
+
+
+def create_dog(rng, dataset):
+    return dict(
+        path="/dogs",
+        json=dict(registration_time=1, name=f"dog {rng.randrange(1000)}"),
+        user=dataset.user(rng),
+    )
+
+
+def get_dog(rng, dataset):
+    user = dataset.user(rng)
+    return dict(path=f"/dogs/{dataset.dog(rng, user)}", user=user)
+
+
+def import_dogs(rng, dataset):
+    prefix = f"import-{rng.getrandbits(64):016x}"
+    rows = "".join(f"{prefix}-{dog},1,imported {dog}\n" for dog in range(10))
+    return dict(
+        path="/import/dogs",
+        params=dict(format="csv"),
+        data=f"id,registration_time,name\n{rows}".encode(),
+        user=dataset.user(rng),
+    )
+
+
+def export_entries(rng, dataset):
+    kind = rng.choice(["dogs", "cards", "trainings"])
+    return dict(path=f"/export/{kind}", user=dataset.user(rng))
+
+
+def _read(path, **params):
+    def request(rng, dataset):
+        return dict(path=path, params=params, user=dataset.user(rng))
+
+    return request
+
+
+OPERATIONS = [
+    Operation("GET", "/trainings", list_trainings),
+    Operation("GET", "/trainings/{id}", get_training),
+    Operation("POST", "/trainings", book_training),
+    Operation("POST", "/trainings/batch", book_trainings),
+    Operation("GET", "/cards", _read("/cards", limit=50)),
+    Operation("GET", "/cards/{id}", get_card),
+    Operation("POST", "/cards", create_card),
+    Operation("GET", "/training_types", _read("/training_types")),
+    Operation("POST", "/dogs", create_dog),
+    Operation("GET", "/dogs", _read("/dogs")),
+    Operation("GET", "/dogs/{id}", get_dog),
+    Operation("POST", "/import/{kind}", import_dogs),
+    Operation("GET", "/export/{kind}", export_entries),
+    Operation("GET", "/stats", _read("/stats")),
+    Operation("GET", "/metrics/pool", _read("/metrics/pool")),
+    Operation("GET", "/metrics/loop", _read("/metrics/loop")),
+    Operation("GET", "/metrics", _read("/metrics")),
+]
+
+WORKLOADS = {
+    "read": {
+        "GET /trainings": 30,
+        "GET /trainings/{id}": 15,
+        "GET /cards": 10,
+        "GET /cards/{id}": 10,
+        "GET /training_types": 5,
+        "GET /dogs": 15,
+        "GET /dogs/{id}": 10,
+        "GET /export/{kind}": 1,
+        "GET /stats": 10,
+        "GET /metrics/pool": 1,
+        "GET /metrics/loop": 1,
+        "GET /metrics": 1,
+    },
+    "mixed": {
+        "GET /trainings": 25,
+        "GET /trainings/{id}": 10,
+        "POST /trainings": 10,
+        "POST /trainings/batch": 3,
+        "GET /cards": 8,
+        "GET /cards/{id}": 8,
+        "POST /cards": 3,
+        "GET /training_types": 3,
+        "POST /dogs": 2,
+        "GET /dogs": 10,
+        "GET /dogs/{id}": 8,
+        "POST /import/{kind}": 1,
+        "GET /export/{kind}": 1,
+        "GET /stats": 8,
+        "GET /metrics/pool": 1,
+        "GET /metrics/loop": 1,
+        "GET /metrics": 1,
+    },
+    "write": {
+        "POST /trainings": 40,
+        "POST /trainings/batch": 15,
+        "POST /cards": 15,
+        "POST /dogs": 10,
+        "POST /import/{kind}": 5,
+        "GET /trainings": 10,
+        "GET /stats": 5,
+    },
+}
+
+
+def plan(dataset: Dataset, *, workload, requests, seed):
+    rng = random.Random(seed)
+    weights = WORKLOADS[workload]
+    operations = [operation for operation in OPERATIONS if operation.name in weights]
+    chosen = rng.choices(
+        operations,
+        weights=[weights[operation.name] for operation in operations],
+        k=requests,
+    )
+    return [(operation, operation.request(rng, dataset)) for operation in chosen]
+
+
+def check_coverage(app):
+    served = {
+        f"{route.method} {route.resource.canonical}"
+        for route in app.router.routes()
+        if route.method not in ("HEAD", "OPTIONS") and route.resource is not None
+    }
+    missing = served - {operation.name for operation in OPERATIONS}
+    if missing:
+        raise RuntimeError(f"The load test has no operation for: {sorted(missing)}")
+
+
+async def prepare(connection, dataset: Dataset, *, reuse):
+    engine = create_async_engine(connection)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    if not reuse:
+        await seed(
+            engine,
+            start=0,
+            stop=dataset.trainings,
+            users=dataset.users,
+            dogs_per_user=dataset.dogs_per_user,
+            slots_per_card=dataset.slots_per_card,
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(rebuild_statistics)
+    await engine.dispose()
+
+
+async def run(connection, dataset: Dataset, *, requests, concurrency, rate_limit):
+    server_args = [f"--connection={connection}"]
+    if not rate_limit:
+        server_args += ["--write_rate=0", "--max_concurrent_writes=0"]
+    app = create_app(server_parser.parse_args(server_args))
+    async with TestClient(TestServer(app)) as client:
+        check_coverage(app)
+        for user in range(dataset.users):
+            response = await client.post(
+                "/cards",
+                json=dict(timestamp=MINUTE, cost=1, slots=1_000_000),
+                headers={"user_id": f"user-{user}"},
+            )
+            response.raise_for_status()
+        queries_before = _queries(app["metrics"])
+        pending = iter(requests)
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        async def worker():
+            for operation, request in pending:
+                start = time.perf_counter()
+                async with client.request(
+                    operation.method,
+                    request["path"],
+                    params=request.get("params"),
+                    json=request.get("json"),
+                    data=request.get("data"),
+                    headers={"user_id": request["user"]},
+                ) as response:
+                    await response.read()
+                latencies[operation.name].append(time.perf_counter() - start)
+                if response.status >= 400:
+                    errors[operation.name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+        queries_after = _queries(app["metrics"])
+    routes = {}
+    for name, samples in sorted(latencies.items()):
+        samples.sort()
+        queries, count = (
+            after - before
+            for after, before in zip(queries_after[name], queries_before[name])
+        )
+        routes[name] = dict(
+            requests=len(samples),
+            errors=errors[name],
+            p50=statistics.median(samples),
+            p95=_percentile(samples, 0.95),
+            p99=_percentile(samples, 0.99),
+            queries=queries / count if count else 0.0,
+        )
+    return dict(rps=len(requests) / seconds, routes=routes)
+
+
+def _median(runs):
+    return dict(
+        rps=statistics.median(run["rps"] for run in runs),
+        routes={
+            name: {
+                key: statistics.median(run["routes"][name][key] for run in runs)
+                for key in route
+            }
+            for name, route in runs[0]["routes"].items()
+        },
+    )
+
+
+def _queries(metrics):
+    return defaultdict(
+        lambda: (0, 0),
+        {
+            f"{method} {route}": (histogram.sum, histogram.count)
+            for (method, route), histogram in metrics.request_queries.items()
+        },
+    )
+
+
+def _percentile(samples, fraction):
+    return samples[max(0, int(len(samples) * fraction + 0.5) - 1)]
+
+
+def compare(results, baseline, *, tolerance, slack_ms):
+    regressions = []
+    if baseline["config"] != results["config"]:
+        regressions.append(
+            f"The baseline was measured with {baseline['config']} but this run used {results['config']}"
+        )
+        return regressions
+    if results["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(
+            f"Throughput dropped from {baseline['rps']:.0f} to {results['rps']:.0f} requests per second"
+        )
+    for name, expected in baseline["routes"].items():
+        actual = results["routes"].get(name)
+        if actual is None:
+            continue
+        for key in ("p50", "p95"):
+            if (
+                actual["requests"] >= MIN_SAMPLES
+                and actual[key] > expected[key] * (1 + tolerance) + slack_ms / 1000
+            ):
+                regressions.append(
+                    f"{name} {key} rose from {expected[key] * 1000:.1f} ms to {actual[key] * 1000:.1f} ms"
+                )
+        if actual["queries"] > expected["queries"] * (1 + tolerance):
+            regressions.append(
+                f"{name} rose from {expected['queries']:.1f} to {actual['queries']:.1f} queries per request"
+            )
+        if actual["errors"] > expected["errors"]:
+            regressions.append(
+                f"{name} failed {actual['errors']} times instead of {expected['errors']}"
+            )
+    return regressions
+
+
+def report(results):
+    print(f"{results['rps']:.0f} requests per second")
+    print(
+        f"{'route':<24} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>7}"
+    )
+    for name, route in results["routes"].items():
+        print(
+            f"{name:<24} {route['requests']:>8} {route['errors']:>6}"
+            f" {route['p50'] * 1000:>8.1f} {route['p95'] * 1000:>8.1f}"
+            f" {route['p99'] * 1000:>8.1f} {route['queries']:>7.1f}"
+        )
+
+
+async def main(args):
+    dataset = Dataset(
+        trainings=args.trainings,
+        users=args.users,
+        dogs_per_user=args.dogs_per_user,
+        slots_per_card=args.slots_per_card,
+    )
+    config = dict(
+        attrs.asdict(dataset),
+        workload=args.workload,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        repeat=args.repeat,
+        rate_limit=args.rate_limit,
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        database = args.database or Path(directory) / "load.db"
+        reuse = database.exists()
+        if reuse:
+            print(f"Reusing {database}, the dataset options are not applied to it")
+        await prepare(f"sqlite+aiosqlite:///{database}", dataset, reuse=reuse)
+        requests = plan(
+            dataset, workload=args.workload, requests=args.requests, seed=args.seed
+        )
+        runs = []
+        for _ in range(args.repeat):
+            working_copy = Path(directory) / "working.db"
+            working_copy.write_bytes(database.read_bytes())
+            runs.append(
+                await run(
+                    f"sqlite+aiosqlite:///{working_copy}",
+                    dataset,
+                    requests=requests,
+                    concurrency=args.concurrency,
+                    rate_limit=args.rate_limit,
+                )
+            )
+            working_copy.unlink()
+    results = dict(_median(runs), config=config)
+    report(results)
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+    if args.baseline is not None:
+        regressions = compare(
+            results,
+            json.loads(args.baseline.read_text()),
+            tolerance=args.tolerance,
+            slack_ms=args.slack_ms,
+        )
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parser.parse_args()))
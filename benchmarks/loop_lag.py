@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.dataset import seed
+from dogtraining.server.loop_lag import LoopLagMetrics, loop_lag_ctx
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.offload import OFFLOAD_THRESHOLD, Offloader
+from dogtraining.server.training_database import TrainingDatabase
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    unit_of_work,
+    user_authentication,
+)
+
+parser = argparse.ArgumentParser(prog="Event loop lag")
+parser.add_argument("--trainings", default=20_000, type=int)
+parser.add_argument("--requests", default=200, type=int)
+parser.add_argument("--large_requests", default=1, type=int)
+parser.add_argument(
+    "--pause",
+    default=0.2,
+    type=float,
+    help="Seconds between two large requests of the same client.",
+)
+parser.add_argument("--threshold", default=OFFLOAD_THRESHOLD, type=int)
+
+USER_ID = "user-0"
+
+
+def create_app(training_database, *, offloader):
+    training_handler = TrainingHandler(
+        training_database=training_database, offloader=offloader
+    )
+    app = web.Application(middlewares=[user_authentication, unit_of_work])
+    app["training_database"] = training_database
+    app["loop_lag"] = LoopLagMetrics(interval=0.005)
+    app.cleanup_ctx.append(loop_lag_ctx)
+    app.add_routes(
+        [
+            web.get("/trainings", training_handler.get_all_trainings),
+            web.get("/dogs", training_handler.get_all_dogs),
+            web.get(
+                "/export/{kind:dogs|cards|trainings}", training_handler.export_entries
+            ),
+            web.get("/metrics/loop", training_handler.get_loop_lag),
+        ]
+    )
+    return app
+
+
+async def measure(training_database, *, offloader, requests, large_requests, pause):
+    app = create_app(training_database, offloader=offloader)
+    headers = {"user_id": USER_ID}
+    async with TestClient(TestServer(app)) as client:
+        running = True
+
+        async def load(path):
+            while running:
+                response = await client.get(path, headers=headers)
+                await response.read()
+                await asyncio.sleep(pause)
+
+        response = await client.get("/trainings", headers=headers)
+        await response.read()
+        app["loop_lag"].samples.clear()
+        app["loop_lag"].lag_seconds_max = 0.0
+        background = [
+            asyncio.create_task(load(path))
+            for path in ["/trainings"] * large_requests + ["/export/trainings"]
+            if large_requests
+        ]
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get("/dogs", headers=headers)
+            await response.read()
+            latencies.append(time.perf_counter() - start)
+        running = False
+        await asyncio.gather(*background)
+        loop_lag = await (await client.get("/metrics/loop", headers=headers)).json()
+    latencies.sort()
+    return dict(
+        p50=statistics.median(latencies),
+        p99=latencies[int(len(latencies) * 0.99) - 1],
+        loop_lag_p99=loop_lag["lag_seconds_p99"],
+        loop_lag_max=loop_lag["lag_seconds_max"],
+    )
+
+
+async def main(*, trainings, requests, large_requests, pause, threshold):
+    with tempfile.TemporaryDirectory() as directory:
+        connection = f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade)
+        await seed(engine, start=0, stop=trainings, users=1)
+        await engine.dispose()
+
+        training_database = TrainingDatabase(connection=connection)
+        for name, offloader, large in [
+            ("idle", Offloader(), 0),
+            ("lists encoded at once", Offloader(threshold=sys.maxsize), large_requests),
+            (
+                f"lists encoded in chunks of {threshold} on a thread pool",
+                Offloader.with_threads(threshold=threshold),
+                large_requests,
+            ),
+        ]:
+            results = await measure(
+                training_database,
+                offloader=offloader,
+                requests=requests,
+                large_requests=large,
+                pause=pause,
+            )
+            offloader.shutdown()
+            print(f"GET /dogs, {name}:")
+            for key, seconds in results.items():
+                print(f"  {key}: {seconds * 1000:.1f} ms")
+        await training_database.engine.dispose()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            trainings=args.trainings,
+            requests=args.requests,
+            large_requests=args.large_requests,
+            pause=args.pause,
+            threshold=args.threshold,
+        )
+    )
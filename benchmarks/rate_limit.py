@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from dogtraining.server.rate_limit import MemoryTokenBuckets, WriteLimiter
+from dogtraining.server.training_handler import limit_writes, user_authentication
+
+parser = argparse.ArgumentParser(prog="Rate limit")
+parser.add_argument("--users", default=1_000, type=int)
+parser.add_argument("--calls", default=100_000, type=int)
+parser.add_argument("--requests", default=2_000, type=int)
+parser.add_argument("--repeat", default=5, type=int)
+parser.add_argument(
+    "--max_overhead_us",
+    default=20.0,
+    type=float,
+    help="Exit with 1 when checking and releasing the limits of a write takes more than this many microseconds.",
+)
+
+
+def create_buckets(users):
+    return MemoryTokenBuckets(rate=1e9, burst=1e9, maxsize=users)
+
+
+async def time_take(*, users, calls):
+    buckets = create_buckets(users)
+    keys = [f"user-{i % users}" for i in range(calls)]
+    start = time.perf_counter()
+    for key in keys:
+        await buckets.take(key)
+    return (time.perf_counter() - start) / calls
+
+
+async def time_limit(*, users, calls):
+    write_limiter = WriteLimiter(create_buckets(users))
+    keys = [f"user-{i % users}" for i in range(calls)]
+    start = time.perf_counter()
+    for key in keys:
+        async with write_limiter.limit(key):
+            pass
+    return (time.perf_counter() - start) / calls
+
+
+async def ok(request):
+    return web.Response(text="ok")
+
+
+async def time_requests(*, users, requests, rate_limited):
+    middlewares = [user_authentication]
+    if rate_limited:
+        middlewares.append(limit_writes)
+    app = web.Application(middlewares=middlewares)
+    if rate_limited:
+        app["write_limiter"] = WriteLimiter(create_buckets(users))
+    app.add_routes([web.post("/write", ok)])
+    async with TestClient(TestServer(app)) as client:
+        start = time.perf_counter()
+        for i in range(requests):
+            async with client.post(
+                "/write", headers={"user_id": f"user-{i % users}"}
+            ) as response:
+                assert response.status == 200
+                await response.read()
+        return (time.perf_counter() - start) / requests
+
+
+async def main(*, users, calls, requests, repeat, max_overhead_us):
+    take = statistics.median(
+        [await time_take(users=users, calls=calls) for _ in range(repeat)]
+    )
+    limit = statistics.median(
+        [await time_limit(users=users, calls=calls) for _ in range(repeat)]
+    )
+    plain, limited = [], []
+    for _ in range(repeat):
+        plain.append(
+            await time_requests(users=users, requests=requests, rate_limited=False)
+        )
+        limited.append(
+            await time_requests(users=users, requests=requests, rate_limited=True)
+        )
+    plain, limited = statistics.median(plain), statistics.median(limited)
+    overhead_us = (limited - plain) * 1_000_000
+    print(f"Median of {repeat} runs over {users} users:")
+    print(f"  MemoryTokenBuckets.take {take * 1_000_000:>9.2f} us")
+    print(f"  WriteLimiter.limit      {limit * 1_000_000:>9.2f} us")
+    print(f"  POST without limiter    {plain * 1_000_000:>9.0f} us")
+    print(f"  POST with limiter       {limited * 1_000_000:>9.0f} us")
+    print(f"  Overhead per request    {overhead_us:>9.1f} us")
+    if limit * 1_000_000 > max_overhead_us:
+        print(
+            f"Regression: the limiter takes {limit * 1_000_000:.1f} us per write, more than {max_overhead_us}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            users=args.users,
+            calls=args.calls,
+            requests=args.requests,
+            repeat=args.repeat,
+            max_overhead_us=args.max_overhead_us,
+        )
+    )
@@ -0,0 +1,58 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+from dogtraining.server.models import Dog, Training
+from dogtraining.server.serialization import SERIALIZERS
+
+parser = argparse.ArgumentParser(prog="Serialization")
+parser.add_argument("--sizes", default=[10_000, 100_000], nargs="+", type=int)
+parser.add_argument("--repeat", default=3, type=int)
+
+
+def create_trainings(size):
+    dog = Dog(id="dog", registration_time=1, name="benchmark", user_id="benchmark")
+    return [
+        Training(
+            id=f"training-{index}",
+            timestamp=index,
+            type="querbeet",
+            dog_id=dog.id,
+            card_id=f"card-{index // 10}",
+            user_id="benchmark",
+            dog=dog,
+        )
+        for index in range(size)
+    ]
+
+
+def measure(serialize, trainings, *, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize([training.as_dict() for training in trainings])
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    serialize([training.as_dict() for training in trainings])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(*, sizes, repeat):
+    serializers = {"json.dumps (before)": lambda data: json.dumps(data).encode()}
+    serializers.update(SERIALIZERS)
+    for size in sizes:
+        trainings = create_trainings(size)
+        print(f"{size} trainings:")
+        for name, serialize in serializers.items():
+            seconds, peak = measure(serialize, trainings, repeat=repeat)
+            print(
+                f"  {name}: {seconds * 1000:.1f} ms, peak {peak / 1024 / 1024:.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(sizes=args.sizes, repeat=args.repeat)
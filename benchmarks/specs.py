@@ -0,0 +1,29 @@
+import argparse
+import json
+import time
+
+from dogtraining.server.training_database import CardSpec, DogSpec, TrainingSpec
+
+parser = argparse.ArgumentParser(prog="Request decoding")
+parser.add_argument("--count", default=100_000, type=int)
+
+PAYLOADS = {
+    TrainingSpec: {"timestamp": 1, "type": "querbeet", "dogs": ["dog-0", "dog-1"]},
+    CardSpec: {"timestamp": 1, "cost": 10, "slots": 10},
+    DogSpec: {"registration_time": 1, "name": "benchmark"},
+}
+
+
+def main(*, count):
+    for spec, payload in PAYLOADS.items():
+        body = json.dumps(payload).encode()
+        start = time.perf_counter()
+        for _ in range(count):
+            spec.from_bytes(body=body, user_id="benchmark")
+        seconds = time.perf_counter() - start
+        print(f"{spec.__name__}: {seconds / count * 1e6:.2f} µs per request body")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(count=args.count)
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.dataset import MINUTE, seed, training_values
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.training_database import TrainingDatabase, TrainingFilter
+
+parser = argparse.ArgumentParser(prog="Training filters")
+parser.add_argument("--rows", default=1_000_000, type=int)
+parser.add_argument("--steps", default=3, type=int)
+parser.add_argument("--users", default=10, type=int)
+parser.add_argument("--window", default=100, type=int)
+parser.add_argument("--repeat", default=50, type=int)
+
+
+async def measure(training_database: TrainingDatabase, *, rows, users, window, repeat):
+    bookings = rows // users
+    start = (bookings // 2 + 1) * MINUTE
+    middle = training_values(bookings // 2 * users, users=users)
+    queries = {
+        "time window": TrainingFilter(start=start, end=start + window * MINUTE),
+        "dog in window": TrainingFilter(
+            start=start, end=start + window * MINUTE, dog_id=middle["dog_id"]
+        ),
+        "type in window": TrainingFilter(
+            start=start, end=start + window * MINUTE, type=middle["type"]
+        ),
+        "card": TrainingFilter(card_id=middle["card_id"]),
+    }
+    latencies = {}
+    for name, training_filter in queries.items():
+        seconds = []
+        for _ in range(repeat):
+            before = time.perf_counter()
+            await training_database.get_all_training_entries(
+                user_id=middle["user_id"],
+                training_filter=training_filter,
+                limit=window,
+                expand=(),
+            )
+            seconds.append(time.perf_counter() - before)
+        latencies[name] = statistics.median(seconds)
+    return latencies
+
+
+async def main(*, rows, steps, users, window, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        connection = f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade)
+        training_database = TrainingDatabase(connection=connection)
+        seeded = 0
+        for step in range(steps - 1, -1, -1):
+            target = rows // 10**step
+            await seed(engine, start=seeded, stop=target, users=users)
+            seeded = target
+            latencies = await measure(
+                training_database,
+                rows=seeded,
+                users=users,
+                window=window,
+                repeat=repeat,
+            )
+            print(f"{seeded} trainings:")
+            for name, seconds in latencies.items():
+                print(f"  {name}: {seconds * 1000:.2f} ms")
+        await training_database.engine.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            rows=args.rows,
+            steps=args.steps,
+            users=args.users,
+            window=args.window,
+            repeat=args.repeat,
+        )
+    )
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import sys
+
+from dogtraining.server.bulk import BULK_FORMATS, read_entries, write_entries
+from dogtraining.server.training_database import (
+    BULK_MODELS,
+    IMPORT_CHUNK_SIZE,
+    ImportFailed,
+    InvalidPayload,
+    TrainingDatabase,
+)
+
+parser = argparse.ArgumentParser(prog="Dogtraining Bulk Data")
+parser.add_argument("command", choices=["import", "export"])
+parser.add_argument("kind", choices=list(BULK_MODELS))
+parser.add_argument(
+    "--connection",
+    required=True,
+    type=str,
+)
+parser.add_argument("--user_id", required=True, type=str)
+parser.add_argument(
+    "--file",
+    default="-",
+    type=str,
+    help="The file to import from or export to, - for stdin/stdout.",
+)
+parser.add_argument("--format", default="ndjson", choices=list(BULK_FORMATS))
+parser.add_argument(
+    "--skip",
+    default=0,
+    type=int,
+    help="The number of entries that a previous import already committed.",
+)
+parser.add_argument("--chunk_size", default=IMPORT_CHUNK_SIZE, type=int)
+
+
+async def read_lines(file):
+    for line in file:
+        yield line
+
+
+async def import_file(training_database: TrainingDatabase, *, args):
+    file = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    try:
+        imported = await training_database.import_entries(
+            kind=args.kind,
+            entries=read_entries(read_lines(file), kind=args.kind, format=args.format),
+            user_id=args.user_id,
+            skip=args.skip,
+            chunk_size=args.chunk_size,
+        )
+    except ImportFailed as e:
+        print(f"{e}, resume with --skip {e.imported}", file=sys.stderr)
+        return 1
+    except InvalidPayload as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if file is not sys.stdin.buffer:
+            file.close()
+    print(f"Imported {imported} {args.kind}")
+    return 0
+
+
+async def export_file(training_database: TrainingDatabase, *, args):
+    file = sys.stdout.buffer if args.file == "-" else open(args.file, "wb")
+    try:
+        async for chunk in write_entries(
+            training_database.export_entries(kind=args.kind, user_id=args.user_id),
+            kind=args.kind,
+            format=args.format,
+        ):
+            file.write(chunk)
+    finally:
+        if file is not sys.stdout.buffer:
+            file.close()
+    return 0
+
+
+async def main(args):
+    training_database = TrainingDatabase(connection=args.connection)
+    try:
+        if args.command == "import":
+            return await import_file(training_database, args=args)
+        return await export_file(training_database, args=args)
+    finally:
+        await training_database.engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parser.parse_args())))
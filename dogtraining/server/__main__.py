@@ -1,14 +1,46 @@
 import argparse
 import logging
+import os
+from functools import partial
+from typing import Optional
 
+import attrs
 from aiohttp import web
 
+from dogtraining.server.authentication import (
+    JWKS_REFRESH_INTERVAL,
+    Jwks,
+    TokenVerifier,
+    jwks_ctx,
+)
+from dogtraining.server.cache import MemoryCache, RedisCache
+from dogtraining.server.cors import CORS_MAX_AGE, Cors
+from dogtraining.server.engine import EngineSettings
+from dogtraining.server.index_advisor import check_indexes
+from dogtraining.server.loop_lag import LoopLagMetrics, loop_lag_ctx
+from dogtraining.server.metrics import Metrics
+from dogtraining.server.offload import OFFLOAD_THRESHOLD, Offloader
+from dogtraining.server.rate_limit import (
+    MAX_CONCURRENT_WRITES,
+    WRITE_BURST,
+    WRITE_RATE,
+    MemoryTokenBuckets,
+    RedisTokenBuckets,
+    WriteLimiter,
+)
+from dogtraining.server.serialization import SERIALIZERS, use_serializer
 from dogtraining.server.training_database import TrainingDatabase
 from dogtraining.server.training_handler import (
     TrainingHandler,
+    add_cors_headers,
+    collect_metrics,
+    compression,
     cors_handler,
+    limit_writes,
+    unit_of_work,
     user_authentication,
 )
+from dogtraining.server.workers import check_worker_settings, serve
 
 parser = argparse.ArgumentParser(prog="Dogtraining Server")
 parser.add_argument(
@@ -18,8 +50,16 @@ parser.add_argument(
 )
 parser.add_argument(
     "--frontend_host_url",
-    default="http://localhost:5173",
+    default=["http://localhost:5173"],
+    nargs="+",
     type=str,
+    help="The origins allowed to call the API, a * matches any host name or port, e.g. https://*.example.com.",
+)
+parser.add_argument(
+    "--cors_max_age",
+    default=CORS_MAX_AGE,
+    type=int,
+    help="Seconds browsers may cache the answer of a CORS preflight.",
 )
 parser.add_argument("--port", default=5000, type=int)
 parser.add_argument(
@@ -27,25 +67,235 @@ parser.add_argument(
     default=None,
     type=str,
 )
+parser.add_argument(
+    "--check_indexes",
+    action="store_true",
+    help="Log repository queries that need a full table scan at startup.",
+)
+for option, option_type in [
+    ("pool_size", int),
+    ("max_overflow", int),
+    ("pool_timeout", float),
+    ("pool_recycle", int),
+    ("statement_timeout", int),
+    ("sqlite_journal_mode", str),
+    ("sqlite_synchronous", str),
+    ("sqlite_busy_timeout", int),
+    ("sqlite_mmap_size", int),
+    ("sqlite_cache_size", int),
+    ("slow_query_ms", float),
+]:
+    parser.add_argument(
+        f"--{option}",
+        default=os.environ.get(f"DOGTRAINING_{option.upper()}"),
+        type=option_type,
+    )
+parser.add_argument(
+    "--cache_ttl",
+    default=float(os.environ.get("DOGTRAINING_CACHE_TTL", 30)),
+    type=float,
+    help="Seconds the dog and card lists of a user are cached, 0 disables the cache.",
+)
+parser.add_argument(
+    "--cache_size",
+    default=int(os.environ.get("DOGTRAINING_CACHE_SIZE", 1024)),
+    type=int,
+)
+parser.add_argument(
+    "--cache_bytes",
+    default=int(os.environ.get("DOGTRAINING_CACHE_BYTES", 64 * 1024 * 1024)),
+    type=int,
+    help="Bytes the cached bodies of the in-process cache may take up in total.",
+)
+parser.add_argument(
+    "--redis_url",
+    default=os.environ.get("DOGTRAINING_REDIS_URL"),
+    type=str,
+    help="Share the cache and the write rate limits between server instances through redis.",
+)
+parser.add_argument(
+    "--write_rate",
+    default=float(os.environ.get("DOGTRAINING_WRITE_RATE", WRITE_RATE)),
+    type=float,
+    help="The write requests per second a user may send on average, 0 disables the rate limit.",
+)
+parser.add_argument(
+    "--write_burst",
+    default=int(os.environ.get("DOGTRAINING_WRITE_BURST", WRITE_BURST)),
+    type=int,
+    help="The write requests a user may send at once before --write_rate applies.",
+)
+parser.add_argument(
+    "--max_concurrent_writes",
+    default=int(
+        os.environ.get("DOGTRAINING_MAX_CONCURRENT_WRITES", MAX_CONCURRENT_WRITES)
+    ),
+    type=int,
+    help="The write requests of a user each server process runs at the same time, 0 disables the cap.",
+)
+parser.add_argument(
+    "--serializer",
+    default=os.environ.get("DOGTRAINING_SERIALIZER"),
+    choices=list(SERIALIZERS),
+    help="The JSON serializer of the responses, the fastest installed one by default.",
+)
+parser.add_argument(
+    "--offload_threshold",
+    default=int(os.environ.get("DOGTRAINING_OFFLOAD_THRESHOLD", OFFLOAD_THRESHOLD)),
+    type=int,
+    help="Lists of at least this many entries are serialized on a thread pool, 0 serializes everything on the event loop.",
+)
+parser.add_argument(
+    "--offload_workers",
+    default=os.environ.get("DOGTRAINING_OFFLOAD_WORKERS"),
+    type=int,
+    help="The threads of the serialization pool, a default derived from the CPU count otherwise.",
+)
+parser.add_argument(
+    "--workers",
+    default=int(os.environ.get("DOGTRAINING_WORKERS", 1)),
+    type=int,
+    help="The number of server processes sharing the port, each with its own pool.",
+)
+parser.add_argument(
+    "--pool_pre_ping",
+    action="store_true",
+    default=os.environ.get("DOGTRAINING_POOL_PRE_PING", "").lower() in ("1", "true"),
+)
+parser.add_argument(
+    "--jwks_url",
+    default=os.environ.get("DOGTRAINING_JWKS_URL"),
+    type=str,
+    help="Verify bearer tokens against this JWKS, e.g. the certs endpoint of a Keycloak realm, instead of trusting the user_id header.",
+)
+for option, default in [
+    ("jwt_issuer", None),
+    ("jwt_audience", None),
+    ("jwt_user_claim", "preferred_username"),
+    ("jwt_roles_claim", "realm_access.roles"),
+    ("jwt_required_role", None),
+]:
+    parser.add_argument(
+        f"--{option}",
+        default=os.environ.get(f"DOGTRAINING_{option.upper()}", default),
+        type=str,
+    )
+parser.add_argument(
+    "--jwks_refresh_interval",
+    default=float(
+        os.environ.get("DOGTRAINING_JWKS_REFRESH_INTERVAL", JWKS_REFRESH_INTERVAL)
+    ),
+    type=float,
+)
 
 _logger = logging.getLogger(__name__)
 
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG)
-    args = parser.parse_args()
+
+def create_cache(args):
+    if args.cache_ttl <= 0:
+        return None
+    if args.workers > 1 and not args.redis_url:
+        _logger.warning(
+            "The in-process cache is disabled because several workers would keep diverging copies, use --redis_url to share one"
+        )
+        return None
+    if args.redis_url:
+        return RedisCache.from_url(args.redis_url, ttl=max(1, int(args.cache_ttl)))
+    return MemoryCache(
+        maxsize=args.cache_size, maxbytes=args.cache_bytes, ttl=args.cache_ttl
+    )
+
+
+def create_write_limiter(args) -> Optional[WriteLimiter]:
+    if args.write_rate <= 0 and args.max_concurrent_writes <= 0:
+        return None
+    buckets = None
+    if args.write_rate > 0:
+        if args.workers > 1 and not args.redis_url:
+            _logger.warning(
+                "Every worker keeps its own rate limits, use --redis_url to share them"
+            )
+        buckets = (
+            RedisTokenBuckets.from_url(
+                args.redis_url, rate=args.write_rate, burst=args.write_burst
+            )
+            if args.redis_url
+            else MemoryTokenBuckets(rate=args.write_rate, burst=args.write_burst)
+        )
+    return WriteLimiter(buckets, max_concurrent=max(0, args.max_concurrent_writes))
+
+
+def engine_settings(args) -> EngineSettings:
+    return EngineSettings(
+        **{
+            field.name: getattr(args, field.name)
+            for field in attrs.fields(EngineSettings)
+            if getattr(args, field.name) is not None
+        }
+    )
+
+
+def create_token_verifier(args) -> Optional[TokenVerifier]:
+    if not args.jwks_url:
+        return None
+    return TokenVerifier(
+        Jwks(url=args.jwks_url, refresh_interval=args.jwks_refresh_interval),
+        issuer=args.jwt_issuer,
+        audience=args.jwt_audience,
+        user_claim=args.jwt_user_claim,
+        roles_claim=args.jwt_roles_claim,
+        required_role=args.jwt_required_role,
+    )
+
+
+def create_app(args) -> web.Application:
+    if args.serializer is not None:
+        use_serializer(args.serializer)
     app = web.Application(
         middlewares=[
             cors_handler,
+            collect_metrics,
+            compression,
             user_authentication,
+            limit_writes,
+            unit_of_work,
         ]
     )
-    app["frontend_host_url"] = args.frontend_host_url
+    app["cors"] = Cors(args.frontend_host_url, max_age=args.cors_max_age)
+    app["loop_lag"] = LoopLagMetrics()
+    app["metrics"] = Metrics()
+    app.on_response_prepare.append(add_cors_headers)
+    app.cleanup_ctx.append(loop_lag_ctx)
+    write_limiter = create_write_limiter(args)
+    if write_limiter is not None:
+        app["write_limiter"] = write_limiter
+    token_verifier = create_token_verifier(args)
+    if token_verifier is not None:
+        app["token_verifier"] = token_verifier
+        app.cleanup_ctx.append(jwks_ctx)
+
     async def init_db(app):
         _logger.info("Start Initializing Database")
-        training_database = TrainingDatabase(connection=args.connection)
+        training_database = TrainingDatabase(
+            connection=args.connection,
+            engine_settings=engine_settings(args),
+            cache=create_cache(args),
+        )
+        app["training_database"] = training_database
+        if args.check_indexes:
+            await check_indexes(training_database)
         _logger.info("Finished Initializing Database")
         _logger.info("Start Initializing Routes")
-        training_handler = TrainingHandler(training_database=training_database)
+        offloader = (
+            Offloader.with_threads(
+                workers=args.offload_workers, threshold=args.offload_threshold
+            )
+            if args.offload_threshold > 0
+            else Offloader()
+        )
+        training_handler = TrainingHandler(
+            training_database=training_database, offloader=offloader
+        )
         app.add_routes(
             [
                 web.get("/trainings", training_handler.get_all_trainings),
@@ -54,18 +304,52 @@ if __name__ == "__main__":
                 web.get("/cards/{id}", training_handler.get_card_by_id),
                 web.post("/cards", training_handler.create_card_entry),
                 web.post("/trainings", training_handler.create_training_entry),
+                web.post("/trainings/batch", training_handler.create_training_entries),
                 web.get("/training_types", training_handler.get_all_training_types),
                 web.post("/dogs", training_handler.create_dog_entry),
                 web.get("/dogs", training_handler.get_all_dogs),
                 web.get("/dogs/{id}", training_handler.get_dog_by_id),
+                web.post(
+                    "/import/{kind:dogs|cards|trainings}",
+                    training_handler.import_entries,
+                ),
+                web.get(
+                    "/export/{kind:dogs|cards|trainings}",
+                    training_handler.export_entries,
+                ),
+                web.get("/stats", training_handler.get_statistics),
+                web.get("/metrics/pool", training_handler.get_pool_status),
+                web.get("/metrics/loop", training_handler.get_loop_lag),
+                web.get("/metrics", training_handler.get_metrics),
             ]
         )
         _logger.info("Finished Initializing Routes")
         yield
+        offloader.shutdown()
+        await training_database.engine.dispose()
 
     app.cleanup_ctx.append(init_db)
-    web.run_app(
-        app=app,
-        host=args.host,
-        port=args.port,
-    )
+    return app
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    args = parser.parse_args()
+    if args.workers > 1:
+        check_worker_settings(
+            connection=args.connection,
+            workers=args.workers,
+            engine_settings=engine_settings(args),
+        )
+        serve(
+            partial(create_app, args),
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+        )
+    else:
+        web.run_app(
+            app=create_app(args),
+            host=args.host,
+            port=args.port,
+        )
@@ -0,0 +1,299 @@
+import asyncio
+import base64
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import Callable, Dict, FrozenSet, Optional
+
+import aiohttp
+import attrs
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    _HASHES = {"RS256": hashes.SHA256, "RS384": hashes.SHA384, "RS512": hashes.SHA512}
+except ImportError:
+    rsa = None
+
+_logger = logging.getLogger(__name__)
+
+JWKS_REFRESH_INTERVAL = 300.0
+JWKS_REFRESH_JITTER = 0.1
+JWKS_MIN_REFRESH_INTERVAL = 30.0
+TOKEN_MEMO_SIZE = 10_000
+TOKEN_LEEWAY = 30
+MIN_KEY_BITS = 2048
+
+_PKCS1_DIGESTS = {
+    "RS256": (hashlib.sha256, bytes.fromhex("3031300d060960864801650304020105000420")),
+    "RS384": (hashlib.sha384, bytes.fromhex("3041300d060960864801650304020205000430")),
+    "RS512": (hashlib.sha512, bytes.fromhex("3051300d060960864801650304020305000440")),
+}
+
+
+@attrs.frozen
+class RsaKey:
+    n: int = attrs.field()
+    e: int = attrs.field()
+
+    @classmethod
+    def from_jwk(cls, jwk: Dict) -> "RsaKey":
+        key = cls(n=_b64_int(jwk["n"]), e=_b64_int(jwk["e"]))
+        if key.n.bit_length() < MIN_KEY_BITS:
+            raise ValueError(
+                f"RSA keys need at least {MIN_KEY_BITS} bits but the key has {key.n.bit_length()}"
+            )
+        if rsa is not None:
+            key._public_key  # raises ValueError for keys cryptography rejects
+        return key
+
+    def verify(self, algorithm, message: bytes, signature: bytes) -> bool:
+        if rsa is None:
+            return _verify_pkcs1(self, algorithm, message, signature)
+        try:
+            self._public_key.verify(
+                signature, message, padding.PKCS1v15(), _HASHES[algorithm]()
+            )
+        except InvalidSignature:
+            return False
+        return True
+
+    @cached_property
+    def _public_key(self):
+        return rsa.RSAPublicNumbers(e=self.e, n=self.n).public_key()
+
+
+@attrs.frozen
+class Claims:
+    user_id: str = attrs.field()
+    roles: FrozenSet[str] = attrs.field()
+    expires_at: float = attrs.field()
+
+
+class Jwks:
+    def __init__(
+        self,
+        *,
+        url=None,
+        keys: Optional[Dict[str, RsaKey]] = None,
+        refresh_interval=JWKS_REFRESH_INTERVAL,
+        refresh_jitter=JWKS_REFRESH_JITTER,
+        min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.refresh_jitter = refresh_jitter
+        self._keys: Dict[str, RsaKey] = dict(keys or {})
+        self._min_refresh_interval = min_refresh_interval
+        self._clock = clock
+        self._refreshed_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Future] = None
+
+    async def get(self, kid) -> Optional[RsaKey]:
+        key = self._keys.get(kid)
+        if key is not None or self.url is None:
+            return key
+        refreshing = self._refreshing is not None and not self._refreshing.done()
+        if (
+            not refreshing
+            and self._refreshed_at is not None
+            and self._clock() - self._refreshed_at < self._min_refresh_interval
+        ):
+            return None
+        try:
+            await self.refresh()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            _logger.exception(f"Reloading the JWKS from {self.url} failed")
+        return self._keys.get(kid)
+
+    async def refresh(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshed_at = self._clock()
+            self._refreshing = asyncio.ensure_future(self._fetch())
+        await asyncio.shield(self._refreshing)
+
+    async def close(self):
+        if self._refreshing is None:
+            return
+        self._refreshing.cancel()
+        with contextlib.suppress(
+            asyncio.CancelledError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            ValueError,
+        ):
+            await self._refreshing
+
+    def load(self, jwks: Dict):
+        if not isinstance(jwks, dict) or not isinstance(jwks.get("keys"), list):
+            raise ValueError("A JWKS has to be an object with a list of keys")
+        keys = {}
+        for jwk in jwks["keys"]:
+            if (
+                not isinstance(jwk, dict)
+                or jwk.get("kty") != "RSA"
+                or jwk.get("use", "sig") != "sig"
+            ):
+                continue
+            try:
+                keys[jwk.get("kid")] = RsaKey.from_jwk(jwk)
+            except (KeyError, TypeError, ValueError) as e:
+                _logger.warning(f"Skipping the JWKS key {jwk.get('kid')}: {e}")
+        self._keys = keys
+
+    async def _fetch(self):
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as session:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                self.load(json.loads(await response.read()))
+        _logger.info(f"Loaded {len(self._keys)} keys from {self.url}")
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        jwks: Jwks,
+        *,
+        issuer=None,
+        audience=None,
+        user_claim="preferred_username",
+        roles_claim="realm_access.roles",
+        required_role=None,
+        leeway=TOKEN_LEEWAY,
+        memo_size=TOKEN_MEMO_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.jwks = jwks
+        self.required_role = required_role
+        self._issuer = issuer
+        self._audience = audience
+        self._user_claim = user_claim
+        self._roles_claim = roles_claim.split(".")
+        self._leeway = leeway
+        self._memo: OrderedDict[str, Claims] = OrderedDict()
+        self._memo_size = memo_size
+        self._clock = clock
+
+    async def verify(self, token: str) -> Claims:
+        now = self._clock()
+        claims = self._memo.get(token)
+        if claims is not None:
+            if claims.expires_at + self._leeway > now:
+                self._memo.move_to_end(token)
+                return claims
+            del self._memo[token]
+            raise InvalidToken("The token has expired")
+        claims = await self._verify(token, now=now)
+        self._memo[token] = claims
+        while len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+        return claims
+
+    async def _verify(self, token: str, *, now) -> Claims:
+        try:
+            encoded_header, encoded_payload, encoded_signature = token.split(".")
+            header = json.loads(_b64decode(encoded_header))
+            payload = json.loads(_b64decode(encoded_payload))
+            signature = _b64decode(encoded_signature)
+        except (ValueError, RecursionError):
+            raise InvalidToken("The token is not a valid JWT")
+        if not isinstance(header, dict) or not isinstance(payload, dict):
+            raise InvalidToken("The token is not a valid JWT")
+        algorithm, kid = header.get("alg"), header.get("kid")
+        if not isinstance(algorithm, str) or algorithm not in _PKCS1_DIGESTS:
+            raise InvalidToken(
+                f"The token algorithm has to be one of: {list(_PKCS1_DIGESTS)} but was: {algorithm}"
+            )
+        key = await self.jwks.get(kid) if isinstance(kid, (str, type(None))) else None
+        if key is None:
+            raise InvalidToken(f"The token key: {kid} is unknown")
+        if not key.verify(
+            algorithm, f"{encoded_header}.{encoded_payload}".encode(), signature
+        ):
+            raise InvalidToken("The token signature is invalid")
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            raise InvalidToken("The token has no expiry")
+        if expires_at + self._leeway <= now:
+            raise InvalidToken("The token has expired")
+        not_before = payload.get("nbf")
+        if isinstance(not_before, (int, float)) and not_before - self._leeway > now:
+            raise InvalidToken("The token is not valid yet")
+        if self._issuer is not None and payload.get("iss") != self._issuer:
+            raise InvalidToken(f"The token was not issued by: {self._issuer}")
+        if self._audience is not None:
+            audience = payload.get("aud")
+            if self._audience not in (
+                audience if isinstance(audience, list) else [audience]
+            ):
+                raise InvalidToken(f"The token is not meant for: {self._audience}")
+        user_id = payload.get(self._user_claim)
+        if not isinstance(user_id, str) or not user_id:
+            raise InvalidToken(f"The token has no {self._user_claim} claim")
+        roles = payload
+        for name in self._roles_claim:
+            roles = roles.get(name) if isinstance(roles, dict) else None
+        return Claims(
+            user_id=user_id,
+            roles=frozenset(role for role in roles or [] if isinstance(role, str)),
+            expires_at=expires_at,
+        )
+
+
+async def refresh_jwks(jwks: Jwks):
+    while True:
+        try:
+            await jwks.refresh()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            _logger.exception(f"Reloading the JWKS from {jwks.url} failed")
+        await asyncio.sleep(
+            jwks.refresh_interval
+            * random.uniform(1 - jwks.refresh_jitter, 1 + jwks.refresh_jitter)
+        )
+
+
+async def jwks_ctx(app):
+    jwks = app["token_verifier"].jwks
+    task = asyncio.create_task(refresh_jwks(jwks))
+    yield
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    await jwks.close()
+
+
+def _verify_pkcs1(key: RsaKey, algorithm, message: bytes, signature: bytes) -> bool:
+    digest, prefix = _PKCS1_DIGESTS[algorithm]
+    size = (key.n.bit_length() + 7) // 8
+    value = int.from_bytes(signature, "big")
+    if len(signature) != size or value >= key.n:
+        return False
+    encoded = pow(value, key.e, key.n).to_bytes(size, "big")
+    digest_info = prefix + digest(message).digest()
+    expected = (
+        b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+    )
+    return hmac.compare_digest(encoded, expected)
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _b64_int(value: str) -> int:
+    return int.from_bytes(_b64decode(value), "big")
+
+
+class InvalidToken(Exception):
+    pass
@@ -0,0 +1,82 @@
+import csv
+import io
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Dict, List
+
+from dogtraining.server.offload import Offloader
+from dogtraining.server.serialization import DECODE_ERRORS, dumps, loads
+from dogtraining.server.training_database import BULK_COLUMNS, InvalidPayload
+
+BULK_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+WRITE_BATCH_SIZE = 500
+
+
+async def read_entries(
+    lines: AsyncIterable[bytes], *, kind, format
+) -> AsyncIterator[Dict]:
+    if format == "ndjson":
+        async for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield loads(line)
+            except DECODE_ERRORS:
+                raise InvalidPayload(f"The line is not valid JSON: {line[:100]!r}")
+        return
+    integer_columns = {
+        column.key for column in BULK_COLUMNS[kind] if column.type.python_type is int
+    }
+    header = None
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            (row,) = csv.reader([line.decode()])
+        except UnicodeDecodeError:
+            raise InvalidPayload(f"The line is not valid UTF-8: {line[:100]!r}")
+        if header is None:
+            header = row
+            continue
+        yield {
+            key: _read_int(key, value) if key in integer_columns and value else value
+            for key, value in zip(header, row)
+        }
+
+
+def _read_int(key, value) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidPayload(f"The column {key} has to be an int but was: {value}")
+
+
+def encode_entries(rows: List, *, format) -> bytes:
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+async def write_entries(
+    entries: AsyncIterable[Dict],
+    *,
+    kind,
+    format,
+    offloader: Offloader = Offloader(),
+) -> AsyncIterator[bytes]:
+    if format == "csv":
+        yield encode_entries(
+            [[column.key for column in BULK_COLUMNS[kind]]], format=format
+        )
+    batch = []
+    async for entry in entries:
+        batch.append(list(entry.values()) if format == "csv" else entry)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            yield await offloader.run(partial(encode_entries, batch, format=format))
+            batch = []
+    yield encode_entries(batch, format=format)
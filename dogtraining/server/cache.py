@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+_REDIS_SET_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(string.match(current, '^%d+')) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def cache_key(user_id, name):
+    return f"dogtraining:{user_id}:{name}"
+
+
+def version_of(value: bytes) -> int:
+    return int(value.partition(b" ")[0])
+
+
+class MemoryCache:
+    def __init__(
+        self,
+        *,
+        maxsize=1024,
+        maxbytes=64 * 1024 * 1024,
+        ttl=30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._maxsize = maxsize
+        self._maxbytes = maxbytes
+        self._size = 0
+        self._ttl = ttl
+        self._clock = clock
+
+    async def get(self, key) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self._clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value: bytes):
+        self._remove(key)
+        if len(value) > self._maxbytes:
+            return
+        self._entries[key] = (self._clock() + self._ttl, value)
+        self._size += len(value)
+        while len(self._entries) > self._maxsize or self._size > self._maxbytes:
+            self._remove(next(iter(self._entries)))
+
+    async def set_newer(self, key, value: bytes):
+        current = await self.get(key)
+        if current is None or version_of(current) < version_of(value):
+            await self.set(key, value)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+class RedisCache:
+    def __init__(self, client, *, ttl=30):
+        self._client = client
+        self._ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, *, ttl=30):
+        try:
+            from redis.asyncio import Redis
+        except ImportError:
+            raise RuntimeError("Install the redis package to use a redis cache")
+        return cls(Redis.from_url(url), ttl=ttl)
+
+    async def get(self, key) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key, value: bytes):
+        await self._client.set(key, value, ex=self._ttl)
+
+    async def set_newer(self, key, value: bytes):
+        await self._client.eval(
+            _REDIS_SET_NEWER, 1, key, version_of(value), value, self._ttl
+        )
+
+    async def delete(self, *keys):
+        if keys:
+            await self._client.delete(*keys)
@@ -0,0 +1,66 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from multidict import CIMultiDict, CIMultiDictProxy
+
+CORS_MAX_AGE = 86400
+ALLOWED_METHODS = ("GET", "POST", "PUT", "DELETE", "OPTIONS")
+ALLOWED_HEADERS = ("Content-Type", "Authorization", "user_id")
+MAX_MATCHED_ORIGINS = 1024
+
+HeaderBlocks = Tuple[CIMultiDictProxy, CIMultiDictProxy]
+
+
+class Cors:
+    def __init__(
+        self,
+        origins: Iterable[str],
+        *,
+        max_age=CORS_MAX_AGE,
+        methods=ALLOWED_METHODS,
+        headers=ALLOWED_HEADERS,
+    ):
+        origins = [origin.rstrip("/") for origin in origins]
+        patterns = [
+            ".+" if origin == "*" else re.escape(origin).replace(r"\*", "[^/:]+")
+            for origin in origins
+            if "*" in origin
+        ]
+        self._pattern = re.compile("|".join(patterns)) if patterns else None
+        self._preflight = (
+            ("Access-Control-Allow-Methods", ",".join(methods)),
+            ("Access-Control-Allow-Headers", ",".join(headers)),
+            ("Access-Control-Max-Age", str(max_age)),
+        )
+        self._blocks: Dict[str, HeaderBlocks] = {
+            origin: self._header_blocks(origin)
+            for origin in origins
+            if "*" not in origin
+        }
+        self._matched: Dict[str, HeaderBlocks] = {}
+
+    def preflight_headers(self, origin) -> Optional[CIMultiDictProxy]:
+        blocks = self._lookup(origin)
+        return blocks[0] if blocks is not None else None
+
+    def response_headers(self, origin) -> Optional[CIMultiDictProxy]:
+        blocks = self._lookup(origin)
+        return blocks[1] if blocks is not None else None
+
+    def _lookup(self, origin) -> Optional[HeaderBlocks]:
+        if origin is None:
+            return None
+        blocks = self._blocks.get(origin) or self._matched.get(origin)
+        if blocks is None and self._pattern is not None:
+            if self._pattern.fullmatch(origin):
+                if len(self._matched) >= MAX_MATCHED_ORIGINS:
+                    self._matched.clear()
+                blocks = self._matched[origin] = self._header_blocks(origin)
+        return blocks
+
+    def _header_blocks(self, origin) -> HeaderBlocks:
+        response = (("Access-Control-Allow-Origin", origin), ("Vary", "Origin"))
+        return (
+            CIMultiDictProxy(CIMultiDict(response + self._preflight)),
+            CIMultiDictProxy(CIMultiDict(response)),
+        )
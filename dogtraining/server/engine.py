@@ -0,0 +1,240 @@
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import attrs
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+_logger = logging.getLogger(__name__)
+
+
+@attrs.define
+class EngineSettings:
+    pool_size: Optional[int] = attrs.field(default=None)
+    max_overflow: Optional[int] = attrs.field(default=None)
+    pool_timeout: Optional[float] = attrs.field(default=None)
+    pool_pre_ping: bool = attrs.field(default=False)
+    pool_recycle: int = attrs.field(default=-1)
+    statement_timeout: Optional[int] = attrs.field(default=None)
+    sqlite_journal_mode: str = attrs.field(default="WAL")
+    sqlite_synchronous: str = attrs.field(default="NORMAL")
+    sqlite_busy_timeout: int = attrs.field(default=5000)
+    sqlite_mmap_size: int = attrs.field(default=256 * 1024 * 1024)
+    sqlite_cache_size: int = attrs.field(default=-64 * 1024)
+    slow_query_ms: Optional[float] = attrs.field(default=None)
+
+
+@attrs.define
+class PoolMetrics:
+    checkouts: int = attrs.field(default=0)
+    in_use: int = attrs.field(default=0)
+    max_in_use: int = attrs.field(default=0)
+    checkout_wait_seconds_total: float = attrs.field(default=0.0)
+    checkout_wait_seconds_max: float = attrs.field(default=0.0)
+
+    def record_checkout_wait(self, seconds):
+        self.checkout_wait_seconds_total += seconds
+        self.checkout_wait_seconds_max = max(self.checkout_wait_seconds_max, seconds)
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        self.in_use -= 1
+
+    def as_dict(self):
+        return attrs.asdict(self)
+
+
+@attrs.define
+class QueryStats:
+    count: int = attrs.field(default=0)
+    seconds: float = attrs.field(default=0.0)
+    statements: Optional[List[str]] = attrs.field(default=None)
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+_query_scopes: contextvars.ContextVar[Tuple[QueryStats, ...]] = contextvars.ContextVar(
+    "query_scopes", default=()
+)
+
+
+@contextlib.contextmanager
+def count_queries(*, statements=False) -> Iterator[QueryStats]:
+    queries = QueryStats(statements=[] if statements else None)
+    token = _query_scopes.set(_query_scopes.get() + (queries,))
+    try:
+        yield queries
+    finally:
+        _query_scopes.reset(token)
+
+
+@attrs.define
+class QueryBudgets:
+    budgets: Dict[str, int] = attrs.field()
+    exceeded: List[str] = attrs.field(factory=list)
+
+    def check(self, endpoint, queries: QueryStats):
+        budget = self.budgets.get(endpoint)
+        if budget is None or queries.count <= budget:
+            return
+        statements = "\n".join(
+            f"  {statement}" for statement in queries.statements or []
+        )
+        message = f"{endpoint} ran {queries.count} queries but its budget is {budget}:\n{statements}"
+        _logger.error(message)
+        self.exceeded.append(message)
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_checkout_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def create_engine(
+    connection,
+    *,
+    settings: EngineSettings,
+    metrics: PoolMetrics,
+    queries: Optional[QueryStats] = None,
+) -> AsyncEngine:
+    url = make_url(connection)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = dict(pool_pre_ping=settings.pool_pre_ping)
+    if not (is_sqlite and url.database in (None, "", ":memory:")):
+        options.update(poolclass=MeteredQueuePool, pool_recycle=settings.pool_recycle)
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            if getattr(settings, key) is not None:
+                options[key] = getattr(settings, key)
+    engine = create_async_engine(connection, **options)
+    pool = engine.sync_engine.pool
+    if isinstance(pool, MeteredQueuePool):
+        pool.metrics = metrics
+    event.listen(engine.sync_engine, "checkout", metrics.on_checkout)
+    event.listen(engine.sync_engine, "checkin", metrics.on_checkin)
+    after_execute, on_error = _query_recorder(settings=settings, queries=queries)
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_execute)
+    event.listen(engine.sync_engine, "handle_error", on_error)
+    if is_sqlite:
+        event.listen(engine.sync_engine, "connect", _sqlite_connect(settings=settings))
+        event.listen(engine.sync_engine, "begin", _sqlite_begin)
+    elif settings.statement_timeout is not None:
+        event.listen(
+            engine.sync_engine,
+            "connect",
+            _postgres_connect(settings=settings),
+            insert=True,
+        )
+    return engine
+
+
+def pool_status(engine: AsyncEngine, *, metrics: PoolMetrics):
+    pool = engine.sync_engine.pool
+    status = metrics.as_dict()
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return status
+
+
+def _before_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _query_recorder(*, settings: EngineSettings, queries: Optional[QueryStats]):
+    slow_seconds = (
+        settings.slow_query_ms / 1000 if settings.slow_query_ms is not None else None
+    )
+
+    def record(conn, statement, parameters):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        scopes = _query_scopes.get()
+        for stats in scopes if queries is None else (queries, *scopes):
+            stats.record(statement, seconds)
+        if slow_seconds is not None and seconds >= slow_seconds:
+            _logger.warning(
+                f"Slow query took {seconds * 1000:.1f} ms with {_redacted(parameters)}: {statement}"
+            )
+
+    def after_execute(conn, cursor, statement, parameters, context, many):
+        record(conn, statement, parameters)
+
+    def on_error(context):
+        if context.connection is not None:
+            record(context.connection, context.statement, context.parameters)
+
+    return after_execute, on_error
+
+
+def _redacted(parameters):
+    if not parameters:
+        return "no parameters"
+    if isinstance(parameters, list):
+        return f"{len(parameters)} redacted parameter sets"
+    return f"{len(parameters)} redacted parameters"
+
+
+def _sqlite_connect(*, settings: EngineSettings):
+    pragmas = dict(
+        journal_mode=settings.sqlite_journal_mode,
+        synchronous=settings.sqlite_synchronous,
+        busy_timeout=settings.sqlite_busy_timeout,
+        mmap_size=settings.sqlite_mmap_size,
+        cache_size=settings.sqlite_cache_size,
+    )
+
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    return connect
+
+
+def _sqlite_begin(connection):
+    begin = connection.get_execution_options().get("sqlite_begin", "DEFERRED")
+    connection.exec_driver_sql(f"BEGIN {begin}")
+
+
+def _postgres_connect(*, settings: EngineSettings):
+    def connect(dbapi_connection, connection_record):
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(settings.statement_timeout)}")
+        cursor.close()
+        dbapi_connection.autocommit = autocommit
+
+    return connect
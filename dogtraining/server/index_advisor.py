@@ -0,0 +1,105 @@
+import logging
+from typing import List
+
+import attrs
+from sqlalchemy import event
+
+from dogtraining.server.training_database import (
+    DatabaseException,
+    DogNotFound,
+    TrainingDatabase,
+    TrainingFilter,
+    TrainingType,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+@attrs.define
+class TableScan:
+    statement: str = attrs.field()
+    plan: str = attrs.field()
+
+
+async def find_table_scans(
+    training_database: TrainingDatabase, *, user_id="index-advisor"
+) -> List[TableScan]:
+    engine = training_database.engine
+    statements = {}
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", collect)
+    try:
+        await _run_repository_queries(training_database, user_id=user_id)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", collect)
+
+    table_scans = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements.items():
+            if engine.dialect.name == "sqlite":
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+                plan = [row[-1] for row in result]
+                scans = [line for line in plan if line.startswith("SCAN ")]
+            else:
+                result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+                plan = [row[0] for row in result]
+                scans = [line for line in plan if "Seq Scan" in line]
+            table_scans.extend(
+                TableScan(statement=statement, plan=line) for line in scans
+            )
+    return table_scans
+
+
+async def check_indexes(
+    training_database: TrainingDatabase, *, user_id="index-advisor"
+):
+    table_scans = await find_table_scans(training_database, user_id=user_id)
+    for table_scan in table_scans:
+        _logger.warning(
+            f"Full table scan: {table_scan.plan} in query: {table_scan.statement}"
+        )
+    return table_scans
+
+
+async def _run_repository_queries(training_database: TrainingDatabase, *, user_id):
+    entry_id = "index-advisor"
+    trainings = await training_database.get_all_training_entries(user_id=user_id)
+    cards = await training_database.get_all_card_entries(user_id=user_id)
+    await training_database.get_all_card_entries(
+        user_id=user_id, expand=("trainings.dog",)
+    )
+    dogs = await training_database.get_all_dogs(user_id=user_id)
+    for training_filter in [
+        TrainingFilter(start=1, end=2),
+        TrainingFilter(dog_id=dogs[0].id if dogs else entry_id),
+        TrainingFilter(card_id=cards[0].id if cards else entry_id),
+        TrainingFilter(type=TrainingType.QUERBEET),
+    ]:
+        await training_database.get_all_training_entries(
+            user_id=user_id, training_filter=training_filter, limit=1
+        )
+    for get_entry_by_id, entry_id_key, entries in [
+        (training_database.get_training_entry_by_id, "training_id", trainings),
+        (training_database.get_card_entry_by_id, "card_id", cards),
+        (training_database.get_dog_by_id, "dog_id", dogs),
+    ]:
+        try:
+            await get_entry_by_id(
+                user_id=user_id,
+                **{entry_id_key: entries[0].id if entries else entry_id},
+            )
+        except (DatabaseException, DogNotFound):
+            pass
+    async with training_database.unit_of_work() as session:
+        await training_database._get_free_cards(session=session, user_id=user_id)
+        await training_database._get_dogs_by_ids(
+            session=session,
+            dog_ids=[dog.id for dog in dogs[:1]] or [entry_id],
+            user_id=user_id,
+        )
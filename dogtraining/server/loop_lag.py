@@ -0,0 +1,52 @@
+import asyncio
+import contextlib
+from collections import deque
+from typing import Deque
+
+import attrs
+
+LAG_INTERVAL = 0.05
+
+LAG_SAMPLES = 1200
+
+
+@attrs.define
+class LoopLagMetrics:
+    interval: float = attrs.field(default=LAG_INTERVAL)
+    samples: Deque[float] = attrs.field(factory=lambda: deque(maxlen=LAG_SAMPLES))
+    lag_seconds_max: float = attrs.field(default=0.0)
+
+    def record(self, lag):
+        self.samples.append(lag)
+        self.lag_seconds_max = max(self.lag_seconds_max, lag)
+
+    def as_dict(self):
+        samples = sorted(self.samples)
+        return dict(
+            samples=len(samples),
+            lag_seconds_p50=_percentile(samples, 0.5),
+            lag_seconds_p99=_percentile(samples, 0.99),
+            lag_seconds_max=self.lag_seconds_max,
+        )
+
+
+async def watch_loop_lag(metrics: LoopLagMetrics):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(metrics.interval)
+        metrics.record(max(0.0, loop.time() - start - metrics.interval))
+
+
+async def loop_lag_ctx(app):
+    task = asyncio.create_task(watch_loop_lag(app["loop_lag"]))
+    yield
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
@@ -0,0 +1,196 @@
+import bisect
+import contextlib
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import attrs
+
+from dogtraining.server.engine import QueryStats, count_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@attrs.define
+class Histogram:
+    buckets: Tuple[float, ...] = attrs.field()
+    counts: List[int] = attrs.field()
+    sum: float = attrs.field(default=0.0)
+    count: int = attrs.field(default=0)
+
+    @classmethod
+    def with_buckets(cls, buckets):
+        return cls(buckets=buckets, counts=[0] * len(buckets))
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", dict(labels, le=_number(bound)), cumulative
+        yield f"{name}_bucket", dict(labels, le="+Inf"), self.count
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class Metrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str, str], Histogram] = defaultdict(
+            lambda: Histogram.with_buckets(LATENCY_BUCKETS)
+        )
+        self.request_queries: Dict[Tuple[str, str], Histogram] = defaultdict(
+            lambda: Histogram.with_buckets(QUERY_COUNT_BUCKETS)
+        )
+        self.request_query_seconds: Dict[Tuple[str, str], Histogram] = defaultdict(
+            lambda: Histogram.with_buckets(LATENCY_BUCKETS)
+        )
+
+    @contextlib.contextmanager
+    def track_request(self) -> Iterator[QueryStats]:
+        self.in_flight += 1
+        try:
+            with count_queries() as queries:
+                yield queries
+        finally:
+            self.in_flight -= 1
+
+    def observe_request(self, *, method, route, status, seconds, queries: QueryStats):
+        self.requests[method, route, str(status)] += 1
+        self.latency[method, route, str(status)].observe(seconds)
+        self.request_queries[method, route].observe(queries.count)
+        self.request_query_seconds[method, route].observe(queries.seconds)
+
+    def render(
+        self,
+        *,
+        pool_status: Dict,
+        queries: QueryStats,
+        loop_lag: Optional[Dict] = None,
+    ) -> str:
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_labels(labels)} {_number(value)}")
+
+        family(
+            "dogtraining_http_requests_total",
+            "counter",
+            "Finished HTTP requests.",
+            (
+                ("dogtraining_http_requests_total", _request_labels(key), count)
+                for key, count in sorted(self.requests.items())
+            ),
+        )
+        family(
+            "dogtraining_http_requests_in_flight",
+            "gauge",
+            "HTTP requests that are being handled.",
+            [("dogtraining_http_requests_in_flight", {}, self.in_flight)],
+        )
+        family(
+            "dogtraining_http_request_duration_seconds",
+            "histogram",
+            "Time to handle an HTTP request.",
+            (
+                sample
+                for key, histogram in sorted(self.latency.items())
+                for sample in histogram.samples(
+                    "dogtraining_http_request_duration_seconds", _request_labels(key)
+                )
+            ),
+        )
+        for name, description, histograms in [
+            (
+                "dogtraining_http_request_db_queries",
+                "Database queries per HTTP request.",
+                self.request_queries,
+            ),
+            (
+                "dogtraining_http_request_db_seconds",
+                "Time spent in database queries per HTTP request.",
+                self.request_query_seconds,
+            ),
+        ]:
+            family(
+                name,
+                "histogram",
+                description,
+                (
+                    sample
+                    for (method, route), histogram in sorted(histograms.items())
+                    for sample in histogram.samples(
+                        name, dict(method=method, route=route)
+                    )
+                ),
+            )
+        family(
+            "dogtraining_db_queries_total",
+            "counter",
+            "Database queries of the process.",
+            [("dogtraining_db_queries_total", {}, queries.count)],
+        )
+        family(
+            "dogtraining_db_query_seconds_total",
+            "counter",
+            "Time spent in database queries of the process.",
+            [("dogtraining_db_query_seconds_total", {}, queries.seconds)],
+        )
+        for key, value in sorted(pool_status.items()):
+            kind = (
+                "counter"
+                if key in ("checkouts", "checkout_wait_seconds_total")
+                else "gauge"
+            )
+            name = f"dogtraining_db_pool_{key}"
+            if kind == "counter" and not name.endswith("_total"):
+                name = f"{name}_total"
+            family(
+                name,
+                kind,
+                f"Connection pool {key.replace('_', ' ')}.",
+                [(name, {}, value)],
+            )
+        for key, value in sorted((loop_lag or {}).items()):
+            name = f"dogtraining_event_loop_{key}"
+            family(
+                name,
+                "gauge",
+                f"Event loop {key.replace('_', ' ')}.",
+                [(name, {}, value)],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _request_labels(key):
+    method, route, status = key
+    return dict(method=method, route=route, status=status)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,154 @@
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Integer,
+    MetaData,
+    Table,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+
+from dogtraining.server.models import (
+    Base,
+    Card,
+    Dog,
+    Training,
+    UserRevision,
+    UserStatistic,
+)
+from dogtraining.server.statistics import rebuild_statistics
+
+_logger = logging.getLogger(__name__)
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, nullable=False),
+)
+
+
+def _used_slots_per_card():
+    return (
+        select(func.count(Training.id))
+        .where(Training.card_id == Card.id)
+        .scalar_subquery()
+    )
+
+
+def _create_index(connection: Connection, *, table, name):
+    existing = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+    if name in existing:
+        return
+    (index,) = [index for index in table.indexes if index.name == name]
+    index.create(connection)
+
+
+def backfill_card_slots(connection: Connection) -> int:
+    result = connection.execute(
+        update(Card).values(remaining_slots=Card.slots - _used_slots_per_card())
+    )
+    return result.rowcount
+
+
+def find_inconsistent_cards(connection: Connection) -> List[Tuple[str, int, int]]:
+    expected = Card.slots - _used_slots_per_card()
+    result = connection.execute(
+        select(Card.id, Card.remaining_slots, expected).where(
+            Card.remaining_slots != expected
+        )
+    )
+    return result.tuples().all()
+
+
+def _0001_card_remaining_slots(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("card")}
+    if "remaining_slots" not in columns:
+        connection.execute(
+            text(
+                "ALTER TABLE card ADD COLUMN remaining_slots INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+    backfill_card_slots(connection)
+    _create_index(connection, table=Card.__table__, name="ix_card_open_slots")
+
+
+def _0002_card_version(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("card")}
+    if "version" not in columns:
+        connection.execute(
+            text("ALTER TABLE card ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        )
+
+
+def _0003_keyset_indexes(connection: Connection):
+    _create_index(
+        connection, table=Training.__table__, name="ix_training_user_timestamp"
+    )
+    _create_index(connection, table=Card.__table__, name="ix_card_user_timestamp")
+    _create_index(connection, table=Dog.__table__, name="ix_dog_user_registration_time")
+
+
+def _0004_foreign_key_indexes(connection: Connection):
+    _create_index(connection, table=Training.__table__, name="ix_training_card")
+    _create_index(connection, table=Training.__table__, name="ix_training_dog")
+
+
+def _0005_user_revision(connection: Connection):
+    UserRevision.__table__.create(connection, checkfirst=True)
+
+
+def _0006_user_statistics(connection: Connection):
+    UserStatistic.__table__.create(connection, checkfirst=True)
+    rebuild_statistics(connection)
+
+
+def _0007_training_filter_indexes(connection: Connection):
+    for name in (
+        "ix_training_user_dog_timestamp",
+        "ix_training_user_card_timestamp",
+        "ix_training_user_type_timestamp",
+    ):
+        _create_index(connection, table=Training.__table__, name=name)
+
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+    _0001_card_remaining_slots,
+    _0002_card_version,
+    _0003_keyset_indexes,
+    _0004_foreign_key_indexes,
+    _0005_user_revision,
+    _0006_user_statistics,
+    _0007_training_filter_indexes,
+]
+
+
+def upgrade(connection: Connection):
+    schema_version.create(connection, checkfirst=True)
+    version = connection.scalar(select(func.max(schema_version.c.version)))
+    if version is None:
+        if not inspect(connection).has_table(Card.__tablename__):
+            _logger.info("Creating a new database schema")
+            Base.metadata.create_all(connection)
+            _stamp(connection, version=len(MIGRATIONS))
+            return
+        version = 0
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        _logger.info(f"Applying migration {number}: {migration.__name__}")
+        migration(connection)
+        _stamp(connection, version=number)
+
+
+def reset(connection: Connection):
+    Base.metadata.drop_all(connection)
+    schema_version.drop(connection, checkfirst=True)
+
+
+def _stamp(connection: Connection, *, version):
+    connection.execute(insert(schema_version).values(version=version))
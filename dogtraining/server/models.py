@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import ForeignKey, Index, Integer, String, text
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -20,19 +20,32 @@ class Training(Base):
     card_id = mapped_column(String, ForeignKey("card.id"), nullable=False)
     dog_id = mapped_column(String, ForeignKey("dog.id"), nullable=False)
 
-    card = relationship("Card", uselist=False, back_populates="trainings", lazy="selectin")
-    dog = relationship("Dog", uselist=False, back_populates="trainings", lazy="selectin")
+    card = relationship("Card", uselist=False, back_populates="trainings", lazy="raise")
+    dog = relationship("Dog", uselist=False, back_populates="trainings", lazy="raise")
+
+    __table_args__ = (
+        Index("ix_training_user_timestamp", "user_id", "timestamp", "id"),
+        Index("ix_training_card", "card_id"),
+        Index("ix_training_dog", "dog_id"),
+        Index("ix_training_user_dog_timestamp", "user_id", "dog_id", "timestamp", "id"),
+        Index(
+            "ix_training_user_card_timestamp", "user_id", "card_id", "timestamp", "id"
+        ),
+        Index("ix_training_user_type_timestamp", "user_id", "type", "timestamp", "id"),
+    )
 
-    def as_dict(self):
-        return dict(
+    def as_dict(self, *, expand=("dog",)):
+        data = dict(
             id=self.id,
             timestamp=self.timestamp,
             type=self.type,
             dog_id=self.dog_id,
             card_id=self.card_id,
             user_id=self.user_id,
-            dog=self.dog.as_dict()
         )
+        if "dog" in expand:
+            data["dog"] = self.dog.as_dict()
+        return data
 
 
 
@@ -45,19 +58,45 @@ class Card(Base):
     timestamp: Mapped[int] = mapped_column(Integer, nullable=False)
     cost: Mapped[int] = mapped_column(Integer, nullable=False)
     slots: Mapped[int] = mapped_column(Integer, nullable=False)
+    remaining_slots: Mapped[int] = mapped_column(Integer, nullable=False)
     user_id: Mapped[str] = mapped_column(String, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
 
-    trainings = relationship("Training", back_populates="card", lazy="selectin")
+    trainings = relationship("Training", back_populates="card", lazy="raise")
 
-    def as_dict(self):
-        return dict(
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        Index("ix_card_user_timestamp", "user_id", "timestamp", "id"),
+        Index(
+            "ix_card_open_slots",
+            "user_id",
+            "timestamp",
+            sqlite_where=text("remaining_slots > 0"),
+            postgresql_where=text("remaining_slots > 0"),
+        ),
+    )
+
+    @property
+    def used_slots(self):
+        return self.slots - self.remaining_slots
+
+    def as_dict(self, *, expand=()):
+        data = dict(
             id=self.id,
             timestamp=self.timestamp,
             cost=self.cost,
             slots=self.slots,
+            used_slots=self.used_slots,
+            remaining_slots=self.remaining_slots,
             user_id=self.user_id,
-            trainings=[training.as_dict() for training in self.trainings],
         )
+        if "trainings" in expand or _nested(expand, "trainings"):
+            data["trainings"] = [
+                training.as_dict(expand=_nested(expand, "trainings"))
+                for training in self.trainings
+            ]
+        return data
 
 
 class Dog(Base):
@@ -70,7 +109,11 @@ class Dog(Base):
     name: Mapped[str] = mapped_column(String, nullable=False)
     user_id: Mapped[str] = mapped_column(String, nullable=False)
 
-    trainings = relationship("Training", back_populates="dog", lazy="selectin")
+    trainings = relationship("Training", back_populates="dog", lazy="raise")
+
+    __table_args__ = (
+        Index("ix_dog_user_registration_time", "user_id", "registration_time", "id"),
+    )
 
     def as_dict(self):
         return dict(
@@ -79,3 +122,30 @@ class Dog(Base):
             name=self.name,
             user_id=self.user_id,
         )
+
+
+class UserRevision(Base):
+    __tablename__ = "user_revision"
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    revision: Mapped[int] = mapped_column(Integer, nullable=False)
+    modified_at: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class UserStatistic(Base):
+    __tablename__ = "user_statistic"
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    dimension: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    key: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    trainings: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cards: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    spend: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    slots: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+def _nested(expand, name):
+    prefix = f"{name}."
+    return tuple(
+        item.removeprefix(prefix) for item in expand if item.startswith(prefix)
+    )
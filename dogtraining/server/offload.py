@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterable, Callable, Optional, Sequence
+
+from dogtraining.server.serialization import dumps
+
+OFFLOAD_THRESHOLD = 500
+
+
+def _dump_entries(entries: Sequence, serialize: Callable) -> bytes:
+    return dumps([serialize(entry) for entry in entries])
+
+
+class Offloader:
+    def __init__(
+        self,
+        *,
+        executor: Optional[Executor] = None,
+        threshold=OFFLOAD_THRESHOLD,
+    ):
+        self._executor = executor
+        self._threshold = threshold
+
+    @classmethod
+    def with_threads(cls, *, workers=None, threshold=OFFLOAD_THRESHOLD):
+        return cls(
+            executor=ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="dogtraining-offload"
+            ),
+            threshold=threshold,
+        )
+
+    async def run(self, job: Callable[[], Any]) -> Any:
+        if self._executor is None:
+            return job()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+
+    async def dump_entries(self, entries: Sequence, serialize: Callable) -> bytes:
+        if len(entries) < self._threshold:
+            return _dump_entries(entries, serialize)
+        return await self.run(partial(_dump_entries, entries, serialize))
+
+    async def dump_stream(self, entries: AsyncIterable, serialize: Callable) -> bytes:
+        chunks, batch = [], []
+        async for entry in entries:
+            batch.append(entry)
+            if len(batch) >= self._threshold:
+                chunks.append(await self.dump_entries(batch, serialize))
+                batch = []
+        chunks.append(_dump_entries(batch, serialize))
+        return (
+            b"[" + b",".join(chunk[1:-1] for chunk in chunks if chunk != b"[]") + b"]"
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
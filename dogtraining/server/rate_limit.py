@@ -0,0 +1,119 @@
+import contextlib
+import time
+from collections import OrderedDict, defaultdict
+from typing import AsyncIterator, Callable, Dict, Tuple
+
+WRITE_RATE = 10.0
+WRITE_BURST = 20
+MAX_CONCURRENT_WRITES = 4
+MAX_BUCKETS = 100_000
+
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+def rate_limit_key(user_id):
+    return f"dogtraining:{user_id}:write_tokens"
+
+
+class MemoryTokenBuckets:
+    def __init__(
+        self,
+        *,
+        rate=WRITE_RATE,
+        burst=WRITE_BURST,
+        maxsize=MAX_BUCKETS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+        self._rate = rate
+        self._burst = burst
+        self._maxsize = maxsize
+        self._clock = clock
+
+    async def take(self, key) -> float:
+        now = self._clock()
+        tokens, updated = self._buckets.pop(key, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - updated) * self._rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self._rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self._maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisTokenBuckets:
+    def __init__(self, client, *, rate=WRITE_RATE, burst=WRITE_BURST):
+        self._client = client
+        self._rate = rate
+        self._burst = burst
+
+    @classmethod
+    def from_url(cls, url, *, rate=WRITE_RATE, burst=WRITE_BURST):
+        try:
+            from redis.asyncio import Redis
+        except ImportError:
+            raise RuntimeError("Install the redis package to share the rate limits")
+        return cls(Redis.from_url(url), rate=rate, burst=burst)
+
+    async def take(self, key) -> float:
+        wait = await self._client.eval(
+            _REDIS_TOKEN_BUCKET, 1, key, self._rate, self._burst
+        )
+        return float(wait)
+
+
+class WriteLimiter:
+    def __init__(self, buckets, *, max_concurrent=MAX_CONCURRENT_WRITES):
+        self._buckets = buckets
+        self._max_concurrent = max_concurrent
+        self._active: Dict[str, int] = defaultdict(int)
+
+    @contextlib.asynccontextmanager
+    async def limit(self, user_id) -> AsyncIterator[None]:
+        if self._max_concurrent and self._active[user_id] >= self._max_concurrent:
+            raise RateLimited(
+                f"The user: {user_id} already runs {self._max_concurrent} write requests",
+                retry_after=1,
+            )
+        self._active[user_id] += 1
+        try:
+            if self._buckets is not None:
+                wait = await self._buckets.take(rate_limit_key(user_id))
+                if wait > 0:
+                    raise RateLimited(
+                        f"The user: {user_id} sends write requests too fast",
+                        retry_after=wait,
+                    )
+            yield
+        finally:
+            self._active[user_id] -= 1
+            if not self._active[user_id]:
+                del self._active[user_id]
+
+
+class RateLimited(Exception):
+    def __init__(self, message, *, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
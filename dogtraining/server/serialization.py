@@ -0,0 +1,60 @@
+import json
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _stdlib_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+SERIALIZERS: Dict[str, Callable[[Any], bytes]] = {"json": _stdlib_dumps}
+if msgspec is not None:
+    SERIALIZERS["msgspec"] = msgspec.json.Encoder().encode
+if orjson is not None:
+    SERIALIZERS["orjson"] = orjson.dumps
+
+_dumps = SERIALIZERS.get("orjson") or SERIALIZERS.get("msgspec") or _stdlib_dumps
+
+if orjson is not None:
+    loads: Callable[[bytes], Any] = orjson.loads
+elif msgspec is not None:
+    loads = msgspec.json.Decoder().decode
+else:
+    loads = json.loads
+
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec else (ValueError,)
+
+
+def use_serializer(name: str):
+    global _dumps
+    if name not in SERIALIZERS:
+        raise ValueError(
+            f"The serializer {name} is not installed, available are: {list(SERIALIZERS)}"
+        )
+    _dumps = SERIALIZERS[name]
+
+
+def dumps(data: Any) -> bytes:
+    return _dumps(data)
+
+
+def json_response(
+    data: Any, *, status: int = 200, headers: Optional[Dict[str, str]] = None
+) -> web.Response:
+    return web.Response(
+        body=_dumps(data),
+        status=status,
+        headers=headers,
+        content_type="application/json",
+    )
@@ -0,0 +1,107 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Connection, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from dogtraining.server.models import Card, Training, UserStatistic
+
+COUNTERS = ("trainings", "cards", "spend", "slots")
+
+REBUILD_CHUNK_SIZE = 1000
+
+
+def month_of(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def statistic_values(
+    *,
+    trainings: Iterable[Tuple[str, int, str, str]] = (),
+    cards: Iterable[Tuple[str, int, int, int]] = (),
+) -> List[Dict]:
+    counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for user_id, timestamp, training_type, dog_id in trainings:
+        for dimension, key in [
+            ("total", ""),
+            ("month", month_of(timestamp)),
+            ("type", training_type),
+            ("dog", dog_id),
+        ]:
+            counters[user_id, dimension, key]["trainings"] += 1
+    for user_id, timestamp, cost, slots in cards:
+        for dimension, key in [("total", ""), ("month", month_of(timestamp))]:
+            counter = counters[user_id, dimension, key]
+            counter["cards"] += 1
+            counter["spend"] += cost
+            counter["slots"] += slots
+    return [
+        dict(user_id=user_id, dimension=dimension, key=key, **counter)
+        for (user_id, dimension, key), counter in counters.items()
+    ]
+
+
+def upsert_statistics(dialect_name, values: List[Dict]):
+    if dialect_name == "postgresql":
+        upsert = postgresql_insert(UserStatistic)
+    else:
+        upsert = sqlite_insert(UserStatistic)
+    upsert = upsert.values(values)
+    return upsert.on_conflict_do_update(
+        index_elements=[
+            UserStatistic.user_id,
+            UserStatistic.dimension,
+            UserStatistic.key,
+        ],
+        set_={
+            counter: getattr(UserStatistic, counter) + getattr(upsert.excluded, counter)
+            for counter in COUNTERS
+        },
+    )
+
+
+def rebuild_statistics(connection: Connection) -> int:
+    connection.execute(delete(UserStatistic))
+    for query, argument in [
+        (
+            select(
+                Training.user_id, Training.timestamp, Training.type, Training.dog_id
+            ),
+            "trainings",
+        ),
+        (select(Card.user_id, Card.timestamp, Card.cost, Card.slots), "cards"),
+    ]:
+        result = connection.execute(
+            query.execution_options(yield_per=REBUILD_CHUNK_SIZE)
+        )
+        for rows in result.partitions():
+            values = statistic_values(**{argument: rows})
+            connection.execute(upsert_statistics(connection.dialect.name, values))
+    return connection.scalar(select(func.count()).select_from(UserStatistic))
+
+
+def statistics_as_dict(rows) -> Dict:
+    total = dict.fromkeys(COUNTERS, 0)
+    months, types, dogs = [], [], []
+    for row in rows:
+        counters = {counter: getattr(row, counter) for counter in COUNTERS}
+        if row.dimension == "total":
+            total = counters
+        elif row.dimension == "month":
+            months.append(dict(month=row.key, **counters))
+        elif row.dimension == "type":
+            types.append(dict(type=row.key, trainings=row.trainings))
+        elif row.dimension == "dog":
+            dogs.append(dict(dog_id=row.key, name=row.name, trainings=row.trainings))
+    return dict(
+        total=dict(
+            total,
+            used_slots=total["trainings"],
+            utilization=total["trainings"] / total["slots"] if total["slots"] else 0,
+        ),
+        months=months,
+        types=types,
+        dogs=dogs,
+    )
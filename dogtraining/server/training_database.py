@@ -1,14 +1,81 @@
+import asyncio
+import random
+import time
 import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from enum import StrEnum
-from typing import List
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import attrs
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError, IntegrityError, NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
-from dogtraining.server.models import Card, Dog, Training
+from dogtraining.server.cache import cache_key
+from dogtraining.server.engine import (
+    EngineSettings,
+    PoolMetrics,
+    QueryStats,
+    create_engine,
+    pool_status,
+)
+from dogtraining.server.models import (
+    Card,
+    Dog,
+    Training,
+    UserRevision,
+    UserStatistic,
+)
+from dogtraining.server.serialization import DECODE_ERRORS, loads
+from dogtraining.server.statistics import (
+    COUNTERS,
+    statistic_values,
+    statistics_as_dict,
+    upsert_statistics,
+)
+
+STREAM_CHUNK_SIZE = 500
+
+CARD_EXPANSIONS = ("trainings", "trainings.dog")
+
+TRAINING_EXPANSIONS = ("dog",)
+
+CARD_COLUMNS = (
+    Card.id,
+    Card.timestamp,
+    Card.cost,
+    Card.slots,
+    (Card.slots - Card.remaining_slots).label("used_slots"),
+    Card.remaining_slots,
+    Card.user_id,
+)
+
+DOG_COLUMNS = (Dog.id, Dog.registration_time, Dog.name, Dog.user_id)
+
+IMPORT_CHUNK_SIZE = 1000
+
+# 9999-12-31T23:59:59.999Z, the last millisecond a datetime can represent
+MAX_TIMESTAMP = 253402300799999
+
+BULK_MODELS = {"dogs": Dog, "cards": Card, "trainings": Training}
+
+BULK_COLUMNS = {
+    "dogs": (Dog.id, Dog.registration_time, Dog.name),
+    "cards": (Card.id, Card.timestamp, Card.cost, Card.slots),
+    "trainings": (
+        Training.id,
+        Training.timestamp,
+        Training.type,
+        Training.dog_id,
+        Training.card_id,
+    ),
+}
 
 
 class TrainingType(StrEnum):
@@ -17,6 +84,11 @@ class TrainingType(StrEnum):
     ALLTAGSSPAZIERGANG = "alltagsspaziergang"
 
 
+TRAINING_TYPES = frozenset(TrainingType)
+
+_TRAINING_TYPE_VALUES = [v.value for v in TrainingType]
+
+
 @attrs.define
 class TrainingSpec:
     timestamp: int = attrs.field()
@@ -26,9 +98,9 @@ class TrainingSpec:
 
     @type.validator
     def check_type(self, attribute, value):
-        if value not in list(TrainingType):
+        if not isinstance(value, str) or value not in TRAINING_TYPES:
             raise TrainingSpecInvalid(
-                f"The training type: {value}, is invalid, please use one of the valid types: {[v.value for v in TrainingType]}"
+                f"The training type: {value}, is invalid, please use one of the valid types: {_TRAINING_TYPE_VALUES}"
             )
 
     @timestamp.validator
@@ -37,6 +109,10 @@ class TrainingSpec:
             raise TrainingSpecInvalid(
                 f"The timestamp of a training can not be below 0 and has to be of the type int but was: {value} and of type: {type(value)}",
             )
+        if value > MAX_TIMESTAMP:
+            raise TrainingSpecInvalid(
+                f"The timestamp of a training can not be after {MAX_TIMESTAMP} but was: {value}",
+            )
 
     @dogs.validator
     def check_dogs(self, attribute, value):
@@ -58,18 +134,52 @@ class TrainingSpec:
 
     @classmethod
     def from_json(cls, *, data, user_id):
-        keys = ["timestamp", "type", "dogs"]
-        for k in keys:
-            if k not in data:
-                raise InvalidPayload(
-                    f"You have to provide a payload with the following keys: {keys}"
-                )
-        return cls(
-            timestamp=data["timestamp"],
-            type=data["type"],
-            dogs=data["dogs"],
-            user_id=user_id,
-        )
+        try:
+            timestamp, training_type, dogs = (
+                data["timestamp"],
+                data["type"],
+                data["dogs"],
+            )
+        except (KeyError, TypeError):
+            raise _missing_keys(["timestamp", "type", "dogs"])
+        return cls(timestamp=timestamp, type=training_type, dogs=dogs, user_id=user_id)
+
+    @classmethod
+    def batch_from_bytes(cls, *, body: bytes, user_id, max_size):
+        data = _decode_payload(body)
+        if not isinstance(data, list) or not 0 < len(data) <= max_size:
+            raise InvalidPayload(
+                f"You have to provide a list of 1 to {max_size} trainings as payload"
+            )
+        return [cls.from_json(data=entry, user_id=user_id) for entry in data]
+
+    @classmethod
+    def from_bytes(cls, *, body: bytes, user_id):
+        return cls.from_json(data=_decode_payload(body), user_id=user_id)
+
+
+@attrs.frozen
+class TrainingFilter:
+    start: Optional[int] = attrs.field(default=None)
+    end: Optional[int] = attrs.field(default=None)
+    dog_id: Optional[str] = attrs.field(default=None)
+    card_id: Optional[str] = attrs.field(default=None)
+    type: Optional[TrainingType] = attrs.field(default=None)
+
+    def criteria(self):
+        criteria = []
+        if self.start is not None:
+            criteria.append(Training.timestamp >= self.start)
+        if self.end is not None:
+            criteria.append(Training.timestamp < self.end)
+        for column, value in [
+            (Training.dog_id, self.dog_id),
+            (Training.card_id, self.card_id),
+            (Training.type, self.type),
+        ]:
+            if value is not None:
+                criteria.append(column == value)
+        return criteria
 
 
 @attrs.define
@@ -85,6 +195,10 @@ class CardSpec:
             raise CardSpecInvalid(
                 f"The timestamp of a card can not be below 0 and has to be of the type int but was: {value} and of type: {type(value)}",
             )
+        if value > MAX_TIMESTAMP:
+            raise CardSpecInvalid(
+                f"The timestamp of a card can not be after {MAX_TIMESTAMP} but was: {value}",
+            )
 
     @cost.validator
     def check_cost(self, attribute, value):
@@ -109,18 +223,15 @@ class CardSpec:
 
     @classmethod
     def from_json(cls, *, data, user_id):
-        keys = ["timestamp", "cost", "slots"]
-        for k in keys:
-            if k not in data:
-                raise InvalidPayload(
-                    f"You have to provide a payload with the following keys: {keys}"
-                )
-        return cls(
-            timestamp=data["timestamp"],
-            cost=data["cost"],
-            slots=data["slots"],
-            user_id=user_id,
-        )
+        try:
+            timestamp, cost, slots = data["timestamp"], data["cost"], data["slots"]
+        except (KeyError, TypeError):
+            raise _missing_keys(["timestamp", "cost", "slots"])
+        return cls(timestamp=timestamp, cost=cost, slots=slots, user_id=user_id)
+
+    @classmethod
+    def from_bytes(cls, *, body: bytes, user_id):
+        return cls.from_json(data=_decode_payload(body), user_id=user_id)
 
 
 @attrs.define
@@ -135,6 +246,10 @@ class DogSpec:
             raise DogSpecInvalid(
                 f"The registration_time of a dog can not be below 0 and has to be of the type int but was: {value} and of type: {type(value)}",
             )
+        if value > MAX_TIMESTAMP:
+            raise DogSpecInvalid(
+                f"The registration_time of a dog can not be after {MAX_TIMESTAMP} but was: {value}",
+            )
 
     @name.validator
     def check_name(self, attribute, value):
@@ -152,168 +267,749 @@ class DogSpec:
 
     @classmethod
     def from_json(cls, *, data, user_id):
-        keys = ["registration_time", "name"]
-        for k in keys:
-            if k not in data:
-                raise InvalidPayload(
-                    f"You have to provide a payload with the following keys: {keys}"
-                )
-        return cls(
-            registration_time=data["registration_time"],
-            name=data["name"],
-            user_id=user_id,
-        )
+        try:
+            registration_time, name = data["registration_time"], data["name"]
+        except (KeyError, TypeError):
+            raise _missing_keys(["registration_time", "name"])
+        return cls(registration_time=registration_time, name=name, user_id=user_id)
+
+    @classmethod
+    def from_bytes(cls, *, body: bytes, user_id):
+        return cls.from_json(data=_decode_payload(body), user_id=user_id)
+
+
+@attrs.define
+class BookingResult:
+    trainings: List[Training] = attrs.field(factory=list)
+    error: Optional[str] = attrs.field(default=None)
+
+    def as_dict(self):
+        if self.error is not None:
+            return dict(error=self.error)
+        return dict(trainings=[training.as_dict() for training in self.trainings])
 
 
 class TrainingDatabase:
-    def __init__(self, connection):
-        engine = create_async_engine(connection)
+    def __init__(
+        self,
+        connection,
+        *,
+        engine_settings: Optional[EngineSettings] = None,
+        booking_retries=5,
+        booking_backoff=0.01,
+        cache=None,
+    ):
+        self.pool_metrics = PoolMetrics()
+        self.query_stats = QueryStats()
+        engine = create_engine(
+            connection,
+            settings=engine_settings or EngineSettings(),
+            metrics=self.pool_metrics,
+            queries=self.query_stats,
+        )
+        self.engine = engine
         self.async_session = async_sessionmaker(engine, expire_on_commit=False)
+        self._current_session: ContextVar[Optional[AsyncSession]] = ContextVar(
+            "current_session", default=None
+        )
+        self.cache = cache
+        self._booking_retries = booking_retries
+        self._booking_backoff = booking_backoff
+
+    def pool_status(self):
+        return pool_status(self.engine, metrics=self.pool_metrics)
+
+    @asynccontextmanager
+    async def unit_of_work(self, *, write=False) -> AsyncIterator[AsyncSession]:
+        session = self._current_session.get()
+        if session is not None:
+            if write and not session.in_transaction():
+                await _begin_write(session)
+            yield session
+            return
+        async with self.async_session() as session:
+            async with session.begin():
+                if write:
+                    await _begin_write(session)
+                token = self._current_session.set(session)
+                try:
+                    yield session
+                    await self._bump_revisions(session)
+                finally:
+                    self._current_session.reset(token)
+            await self._publish_revisions(session)
+
+    @asynccontextmanager
+    async def lazy_unit_of_work(self) -> AsyncIterator[AsyncSession]:
+        async with self.async_session() as session:
+            token = self._current_session.set(session)
+            try:
+                yield session
+                if session.in_transaction():
+                    await self._bump_revisions(session)
+                    await session.commit()
+                    await self._publish_revisions(session)
+            finally:
+                self._current_session.reset(token)
+
+    async def _publish_revisions(self, session):
+        revisions = session.info.pop("revisions", None)
+        if not revisions or self.cache is None:
+            return
+        for user_id, revision, modified_at in revisions:
+            await self.cache.set_newer(
+                cache_key(user_id, "revision"),
+                _encode_revision(revision, modified_at),
+            )
+
+    async def _bump_revisions(self, session):
+        user_ids = session.info.pop("revised_users", None)
+        if not user_ids or not session.in_transaction():
+            return
+        if self.engine.dialect.name == "postgresql":
+            upsert = postgresql_insert(UserRevision)
+        else:
+            upsert = sqlite_insert(UserRevision)
+        upsert = upsert.values(
+            [
+                dict(user_id=user_id, revision=1, modified_at=int(time.time()))
+                for user_id in sorted(user_ids)
+            ]
+        )
+        result = await session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[UserRevision.user_id],
+                set_=dict(
+                    revision=UserRevision.revision + 1,
+                    modified_at=upsert.excluded.modified_at,
+                ),
+            ).returning(
+                UserRevision.user_id, UserRevision.revision, UserRevision.modified_at
+            )
+        )
+        session.info["revisions"] = result.all()
+
+    async def _record_statistics(self, session, *, trainings=(), cards=()):
+        values = statistic_values(trainings=trainings, cards=cards)
+        if values:
+            await session.execute(upsert_statistics(self.engine.dialect.name, values))
+
+    async def get_statistics(self, *, user_id) -> Dict:
+        async with self.unit_of_work() as session:
+            result = await session.execute(
+                select(
+                    *(
+                        getattr(UserStatistic, column)
+                        for column in ("dimension", "key", *COUNTERS)
+                    ),
+                    Dog.name,
+                )
+                .outerjoin(
+                    Dog,
+                    (UserStatistic.dimension == "dog") & (Dog.id == UserStatistic.key),
+                )
+                .where(UserStatistic.user_id == user_id)
+                .order_by(UserStatistic.dimension, UserStatistic.key)
+            )
+            return statistics_as_dict(result)
+
+    async def get_revision(self, *, user_id) -> Tuple[int, Optional[int]]:
+        key = cache_key(user_id, "revision")
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return _decode_revision(cached)
+        async with self.unit_of_work() as session:
+            result = await session.execute(
+                select(UserRevision.revision, UserRevision.modified_at).where(
+                    UserRevision.user_id == user_id
+                )
+            )
+            revision, modified_at = result.one_or_none() or (0, None)
+        if self.cache is not None:
+            await self.cache.set_newer(key, _encode_revision(revision, modified_at))
+        return revision, modified_at
 
     async def create_training_entry(
         self, *, training_spec: TrainingSpec
     ) -> List[Training]:
-        cards: List[Card] = await self._get_all_free_cards(
+        return await self._retry_booking(
+            partial(self._book_trainings, training_spec=training_spec),
             user_id=training_spec.user_id,
         )
-        free_slots_per_card = [
-            card.id for card in cards for _ in range(card.slots - len(card.trainings))
-        ]
-        free_slots = len(free_slots_per_card)
-        if len(training_spec.dogs) > free_slots:
-            raise CardFull(
-                f"Only {free_slots} slot available but {len(training_spec.dogs)} amount of slots are required, register a new card first before trying this operation again."
-            )
-        async with self.async_session() as session:
-            async with session.begin():
-                trainings: List[Training] = []
-                for dog_id in training_spec.dogs:
-                    trainings.append(
-                        Training(
-                            id=str(uuid.uuid4()),
-                            timestamp=training_spec.timestamp,
-                            type=str(training_spec.type),
-                            dog_id=dog_id,
-                            card_id=free_slots_per_card.pop(0),
-                            user_id=training_spec.user_id,
-                        )
-                    )
-                session.add_all(trainings)
-                await session.flush()
-                await session.commit()
-                returnable_trainings = [
-                    await self.get_training_entry_by_id(
-                        training_id=training.id, user_id=training_spec.user_id
-                    )
-                    for training in trainings
-                ]
-            return returnable_trainings
 
-    async def get_training_entry_by_id(self, *, training_id, user_id) -> Training:
-        async with self.async_session() as session:
-            async with session.begin():
-                try:
-                    result = await session.execute(
-                        select(Training)
-                        .where(Training.user_id == user_id)
-                        .where(Training.id == training_id)
-                    )
-                    return result.scalars().one()
-                except NoResultFound:
-                    raise TrainingNotFound(
-                        f"The requested training entry with id: {training_id} does not exist"
+    async def create_training_entries(
+        self, *, training_specs: List[TrainingSpec], best_effort=False
+    ) -> List[BookingResult]:
+        return await self._retry_booking(
+            partial(
+                self._book_batch,
+                training_specs=training_specs,
+                best_effort=best_effort,
+            ),
+            user_id=training_specs[0].user_id,
+        )
+
+    async def _retry_booking(self, book, *, user_id):
+        request_session = self._current_session.get()
+        restartable = request_session is None or not request_session.in_transaction()
+        for attempt in range(self._booking_retries):
+            try:
+                async with self.unit_of_work(write=True) as session:
+                    async with session.begin_nested():
+                        return await book(session=session)
+            except (StaleDataError, CardsLocked):
+                pass
+            except DBAPIError as e:
+                if not _is_transient(e) or not restartable:
+                    raise
+                if request_session is not None:
+                    await request_session.rollback()
+            await asyncio.sleep(random.uniform(0, self._booking_backoff * 2**attempt))
+        raise BookingConflict(
+            f"The cards of the user: {user_id} are booked concurrently, please try this operation again."
+        )
+
+    async def _book_trainings(
+        self, *, session, training_spec: TrainingSpec
+    ) -> List[Training]:
+        (result,) = await self._book_batch(
+            session=session, training_specs=[training_spec], best_effort=False
+        )
+        return result.trainings
+
+    async def _book_batch(
+        self, *, session, training_specs: List[TrainingSpec], best_effort
+    ) -> List[BookingResult]:
+        user_id = training_specs[0].user_id
+        dogs = await self._get_dogs_by_ids(
+            session=session,
+            dog_ids=[dog_id for spec in training_specs for dog_id in spec.dogs],
+            user_id=user_id,
+        )
+        missing = {
+            index: _dogs_not_found(set(spec.dogs) - dogs.keys())
+            for index, spec in enumerate(training_specs)
+            if not set(spec.dogs) <= dogs.keys()
+        }
+        if missing and not best_effort:
+            raise next(iter(missing.values()))
+        cards = await self._get_free_cards(session=session, user_id=user_id)
+        free_slots = sum(card.remaining_slots for card in cards)
+        required_slots = sum(
+            len(spec.dogs)
+            for index, spec in enumerate(training_specs)
+            if index not in missing
+        )
+        if required_slots > free_slots:
+            try:
+                await self._raise_card_full(
+                    session=session, user_id=user_id, required_slots=required_slots
+                )
+            except CardFull:
+                if not best_effort:
+                    raise
+        free_cards = (card for card in cards for _ in range(card.remaining_slots))
+        results: List[BookingResult] = []
+        for index, spec in enumerate(training_specs):
+            if index in missing:
+                results.append(BookingResult(error=str(missing[index])))
+                continue
+            if len(spec.dogs) > free_slots:
+                results.append(
+                    BookingResult(
+                        error=str(_card_full(free_slots, required_slots=len(spec.dogs)))
                     )
+                )
+                continue
+            free_slots -= len(spec.dogs)
+            trainings: List[Training] = []
+            for dog_id, card in zip(spec.dogs, free_cards):
+                training = Training(
+                    id=str(uuid.uuid4()),
+                    timestamp=spec.timestamp,
+                    type=str(spec.type),
+                    dog_id=dog_id,
+                    card_id=card.id,
+                    user_id=user_id,
+                )
+                training.dog = dogs[dog_id]
+                card.remaining_slots -= 1
+                trainings.append(training)
+            results.append(BookingResult(trainings=trainings))
+        session.add_all(training for result in results for training in result.trainings)
+        await self._record_statistics(
+            session,
+            trainings=[
+                (user_id, training.timestamp, training.type, training.dog_id)
+                for result in results
+                for training in result.trainings
+            ],
+        )
+        _invalidate(session, user_id)
+        return results
 
-    async def get_all_training_entries(self, *, user_id) -> List[Training]:
-        async with self.async_session() as session:
-            async with session.begin():
+    async def get_training_entry_by_id(
+        self, *, training_id, user_id, expand=("dog", "card")
+    ) -> Training:
+        async with self.unit_of_work() as session:
+            try:
                 result = await session.execute(
                     select(Training)
+                    .options(*_training_loader_options(expand))
                     .where(Training.user_id == user_id)
+                    .where(Training.id == training_id)
                 )
-                return result.scalars().all()
-
-    async def create_card_entry(self, *, card_spec: CardSpec) -> Card:
-        async with self.async_session() as session:
-            async with session.begin():
-                card = Card(
-                    id=str(uuid.uuid4()),
-                    timestamp=card_spec.timestamp,
-                    cost=card_spec.cost,
-                    slots=card_spec.slots,
-                    user_id=card_spec.user_id,
-                )
-                session.add(card)
-                await session.flush()
-                await session.commit()
-                return await self.get_card_entry_by_id(
-                    card_id=card.id, user_id=card_spec.user_id
+                return result.scalars().one()
+            except NoResultFound:
+                raise TrainingNotFound(
+                    f"The requested training entry with id: {training_id} does not exist"
                 )
 
-    async def get_card_entry_by_id(self, *, card_id, user_id) -> Card:
-        async with self.async_session() as session:
-            async with session.begin():
-                try:
-                    result = await session.execute(
-                        select(Card)
-                        .where(Card.user_id == user_id)
-                        .where(Card.id == card_id)
-                    )
-                    return result.scalars().one()
-                except NoResultFound:
-                    raise CardNotFound(
-                        f"The requested card entry with id: {card_id} does not exist"
-                    )
+    async def get_all_training_entries(
+        self,
+        *,
+        user_id,
+        after=None,
+        limit=None,
+        expand=("dog",),
+        training_filter: TrainingFilter = TrainingFilter(),
+        descending=False,
+    ) -> List[Training]:
+        return await self._fetch_all(
+            self._training_entries_query(
+                user_id=user_id,
+                after=after,
+                limit=limit,
+                expand=expand,
+                training_filter=training_filter,
+                descending=descending,
+            ),
+            scalars=True,
+        )
 
-    async def get_all_card_entries(self, *, user_id) -> List[Card]:
-        async with self.async_session() as session:
-            async with session.begin():
+    def stream_training_entries(
+        self,
+        *,
+        user_id,
+        after=None,
+        limit=None,
+        expand=("dog",),
+        training_filter: TrainingFilter = TrainingFilter(),
+        descending=False,
+    ) -> AsyncIterator[Training]:
+        return self._stream_all(
+            self._training_entries_query(
+                user_id=user_id,
+                after=after,
+                limit=limit,
+                expand=expand,
+                training_filter=training_filter,
+                descending=descending,
+            ),
+            scalars=True,
+        )
+
+    def _training_entries_query(
+        self, *, user_id, after, limit, expand, training_filter, descending
+    ):
+        return _paginate(
+            select(Training)
+            .options(*_training_loader_options(expand))
+            .where(Training.user_id == user_id, *training_filter.criteria()),
+            order_by=(Training.timestamp, Training.id),
+            after=after,
+            limit=limit,
+            descending=descending,
+        )
+
+    async def create_card_entry(self, *, card_spec: CardSpec) -> Card:
+        async with self.unit_of_work(write=True) as session:
+            card = Card(
+                id=str(uuid.uuid4()),
+                timestamp=card_spec.timestamp,
+                cost=card_spec.cost,
+                slots=card_spec.slots,
+                remaining_slots=card_spec.slots,
+                user_id=card_spec.user_id,
+                trainings=[],
+            )
+            session.add(card)
+            await self._record_statistics(
+                session,
+                cards=[(card.user_id, card.timestamp, card.cost, card.slots)],
+            )
+            _invalidate(session, card_spec.user_id)
+            await session.flush()
+            return card
+
+    async def get_card_entry_by_id(
+        self, *, card_id, user_id, expand=("trainings",)
+    ) -> Card:
+        async with self.unit_of_work() as session:
+            try:
                 result = await session.execute(
                     select(Card)
+                    .options(*_card_loader_options(expand))
                     .where(Card.user_id == user_id)
+                    .where(Card.id == card_id)
+                )
+                return result.scalars().one()
+            except NoResultFound:
+                raise CardNotFound(
+                    f"The requested card entry with id: {card_id} does not exist"
                 )
-                return result.scalars().all()
 
-    async def _get_all_free_cards(self, *, user_id) -> List[Card]:
-        cards: List[Card] = await self.get_all_card_entries(user_id=user_id)
-        return [card for card in cards for _ in range(card.slots - len(card.trainings))]
+    async def get_all_card_entries(
+        self, *, user_id, after=None, limit=None, expand=()
+    ) -> List[Card]:
+        return await self._fetch_all(
+            self._card_entries_query(
+                user_id=user_id, after=after, limit=limit, expand=expand
+            ),
+            scalars=bool(expand),
+        )
+
+    def stream_card_entries(
+        self, *, user_id, after=None, limit=None, expand=()
+    ) -> AsyncIterator[Card]:
+        return self._stream_all(
+            self._card_entries_query(
+                user_id=user_id, after=after, limit=limit, expand=expand
+            ),
+            scalars=bool(expand),
+        )
+
+    def _card_entries_query(self, *, user_id, after, limit, expand):
+        if expand:
+            query = select(Card).options(*_card_loader_options(expand))
+        else:
+            query = select(*CARD_COLUMNS)
+        return _paginate(
+            query.where(Card.user_id == user_id),
+            order_by=(Card.timestamp, Card.id),
+            after=after,
+            limit=limit,
+        )
+
+    async def _get_free_cards(self, *, session, user_id) -> List[Card]:
+        result = await session.execute(
+            select(Card)
+            .where(Card.user_id == user_id)
+            .where(Card.remaining_slots > 0)
+            .order_by(Card.timestamp)
+            .with_for_update(skip_locked=True)
+        )
+        return result.scalars().all()
+
+    async def _raise_card_full(self, *, session, user_id, required_slots):
+        free_slots = await session.scalar(
+            select(func.coalesce(func.sum(Card.remaining_slots), 0))
+            .where(Card.user_id == user_id)
+            .where(Card.remaining_slots > 0)
+        )
+        if required_slots <= free_slots:
+            raise CardsLocked(
+                f"{free_slots} slots are available but some of them are locked by a concurrent booking"
+            )
+        raise _card_full(free_slots, required_slots=required_slots)
+
+    async def _get_dogs_by_ids(self, *, session, dog_ids, user_id) -> Dict[str, Dog]:
+        result = await session.execute(
+            select(Dog).where(Dog.user_id == user_id).where(Dog.id.in_(set(dog_ids)))
+        )
+        return {dog.id: dog for dog in result.scalars()}
 
     async def create_dog_entry(self, *, dog_spec: DogSpec) -> Dog:
-        async with self.async_session() as session:
-            async with session.begin():
-                dog = Dog(
-                    id=str(uuid.uuid4()),
-                    registration_time=dog_spec.registration_time,
-                    name=dog_spec.name,
-                    user_id=dog_spec.user_id,
-                )
-                session.add(dog)
-                await session.flush()
-                await session.commit()
-                return dog
+        async with self.unit_of_work(write=True) as session:
+            dog = Dog(
+                id=str(uuid.uuid4()),
+                registration_time=dog_spec.registration_time,
+                name=dog_spec.name,
+                user_id=dog_spec.user_id,
+            )
+            session.add(dog)
+            _invalidate(session, dog_spec.user_id)
+            await session.flush()
+            return dog
 
     async def get_dog_by_id(self, *, dog_id, user_id):
-        async with self.async_session() as session:
-            async with session.begin():
-                try:
-                    result = await session.execute(
-                        select(Dog)
-                        .where(Dog.user_id == user_id)
-                        .where(Dog.id == dog_id)
-                    )
-                    return result.scalars().one()
-                except NoResultFound:
-                    raise DogNotFound(
-                        f"The requested dog entry with id: {dog_id} does not exist"
+        async with self.unit_of_work() as session:
+            try:
+                result = await session.execute(
+                    select(Dog).where(Dog.user_id == user_id).where(Dog.id == dog_id)
+                )
+                return result.scalars().one()
+            except NoResultFound:
+                raise DogNotFound(
+                    f"The requested dog entry with id: {dog_id} does not exist"
+                )
+
+    async def get_all_dogs(self, *, user_id, after=None, limit=None):
+        return await self._fetch_all(
+            self._dogs_query(user_id=user_id, after=after, limit=limit),
+            scalars=False,
+        )
+
+    def stream_dogs(self, *, user_id, after=None, limit=None) -> AsyncIterator[Dog]:
+        return self._stream_all(
+            self._dogs_query(user_id=user_id, after=after, limit=limit),
+            scalars=False,
+        )
+
+    def _dogs_query(self, *, user_id, after, limit):
+        return _paginate(
+            select(*DOG_COLUMNS).where(Dog.user_id == user_id),
+            order_by=(Dog.registration_time, Dog.id),
+            after=after,
+            limit=limit,
+        )
+
+    async def import_entries(
+        self,
+        *,
+        kind,
+        entries: AsyncIterator[dict],
+        user_id,
+        skip=0,
+        chunk_size=IMPORT_CHUNK_SIZE,
+    ) -> int:
+        imported = skip
+        chunk = []
+        position = 0
+        try:
+            async for entry in entries:
+                if position >= skip:
+                    chunk.append(_import_values(kind, entry, user_id=user_id))
+                position += 1
+                if len(chunk) == chunk_size:
+                    await self._import_chunk(
+                        kind, chunk, user_id=user_id, imported=imported
                     )
+                    imported += len(chunk)
+                    chunk = []
+        except (
+            InvalidPayload,
+            TrainingSpecInvalid,
+            CardSpecInvalid,
+            DogSpecInvalid,
+        ) as e:
+            raise ImportFailed(
+                f"The entry {position + 1} is invalid: {e}", imported=imported
+            )
+        if chunk:
+            await self._import_chunk(kind, chunk, user_id=user_id, imported=imported)
+            imported += len(chunk)
+        return imported
 
-    async def get_all_dogs(self, *, user_id):
-        async with self.async_session() as session:
-            async with session.begin():
-                result = await session.execute(
-                    select(Dog).where(Dog.user_id == user_id)
+    async def _import_chunk(self, kind, chunk, *, user_id, imported):
+        async with self.unit_of_work(write=True) as session:
+            if kind == "trainings":
+                card_ids = {values["card_id"] for values in chunk}
+                dog_ids = {values["dog_id"] for values in chunk}
+                missing = sorted(
+                    card_ids - await _owned_ids(session, Card, card_ids, user_id)
+                ) + sorted(dog_ids - await _owned_ids(session, Dog, dog_ids, user_id))
+                if missing:
+                    raise ImportFailed(
+                        f"The cards or dogs: {missing} referenced after entry {imported} do not exist",
+                        imported=imported,
+                    )
+            try:
+                await session.execute(insert(BULK_MODELS[kind]), chunk)
+            except IntegrityError:
+                raise ImportFailed(
+                    f"The ids of the entries after entry {imported} are already taken",
+                    imported=imported,
                 )
-                return result.scalars().all()
+            if kind == "trainings":
+                await self._record_statistics(
+                    session,
+                    trainings=[
+                        (user_id, v["timestamp"], v["type"], v["dog_id"]) for v in chunk
+                    ],
+                )
+            elif kind == "cards":
+                await self._record_statistics(
+                    session,
+                    cards=[
+                        (user_id, v["timestamp"], v["cost"], v["slots"]) for v in chunk
+                    ],
+                )
+            _invalidate(session, user_id)
+            if kind == "trainings":
+                await session.execute(
+                    update(Card)
+                    .where(Card.id.in_(card_ids))
+                    .values(
+                        remaining_slots=Card.slots - _used_slots(),
+                        version=Card.version + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                overbooked = await _owned_ids(
+                    session,
+                    Card,
+                    card_ids,
+                    user_id,
+                    Card.remaining_slots < 0,
+                )
+                if overbooked:
+                    raise ImportFailed(
+                        f"The cards: {sorted(overbooked)} have more trainings than slots after entry {imported}",
+                        imported=imported,
+                    )
+
+    async def export_entries(self, *, kind, user_id) -> AsyncIterator[dict]:
+        model, columns = BULK_MODELS[kind], BULK_COLUMNS[kind]
+        async for row in self._stream_all(
+            select(*columns)
+            .where(model.user_id == user_id)
+            .order_by(columns[1], model.id),
+            scalars=False,
+        ):
+            yield row._asdict()
+
+    async def _fetch_all(self, query, *, scalars):
+        async with self.unit_of_work() as session:
+            result = await session.execute(query)
+            return (result.scalars() if scalars else result).all()
+
+    async def _stream_all(self, query, *, scalars):
+        async with self.unit_of_work() as session:
+            result = await session.stream(
+                query.execution_options(yield_per=STREAM_CHUNK_SIZE)
+            )
+            async for partition in (
+                result.scalars() if scalars else result
+            ).partitions():
+                for entry in partition:
+                    yield entry
+
+
+def _training_loader_options(expand):
+    options = []
+    if "dog" in expand:
+        options.append(selectinload(Training.dog))
+    if "card" in expand:
+        options.append(selectinload(Training.card))
+    return options
+
+
+def _card_loader_options(expand):
+    if "trainings.dog" in expand:
+        return [selectinload(Card.trainings).selectinload(Training.dog)]
+    if "trainings" in expand:
+        return [selectinload(Card.trainings)]
+    return []
+
+
+def _paginate(query, *, order_by, after, limit, descending=False):
+    if after is not None:
+        if descending:
+            query = query.where(tuple_(*order_by) < tuple_(*after))
+        else:
+            query = query.where(tuple_(*order_by) > tuple_(*after))
+    if descending:
+        order_by = [column.desc() for column in order_by]
+    query = query.order_by(*order_by)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _decode_payload(body: bytes):
+    try:
+        return loads(body)
+    except DECODE_ERRORS:
+        raise InvalidPayload("The payload has to be a valid JSON object")
+
+
+async def _begin_write(session):
+    await session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def _invalidate(session, user_id):
+    session.info.setdefault("revised_users", set()).add(user_id)
+
+
+def _encode_revision(revision, modified_at) -> bytes:
+    return f"{revision} {modified_at or ''}".encode()
+
+
+def _decode_revision(value: bytes) -> Tuple[int, Optional[int]]:
+    revision, _, modified_at = value.partition(b" ")
+    return int(revision), int(modified_at) if modified_at else None
+
+
+async def _owned_ids(session, model, ids, user_id, *criteria):
+    result = await session.scalars(
+        select(model.id)
+        .where(model.user_id == user_id)
+        .where(model.id.in_(ids))
+        .where(*criteria)
+    )
+    return set(result)
+
+
+def _used_slots():
+    return (
+        select(func.count(Training.id))
+        .where(Training.card_id == Card.id)
+        .scalar_subquery()
+    )
+
+
+def _import_values(kind, entry, *, user_id):
+    if not isinstance(entry, dict):
+        raise _missing_keys([column.key for column in BULK_COLUMNS[kind][1:]])
+    entry_id = entry.get("id") or str(uuid.uuid4())
+    if not isinstance(entry_id, str):
+        raise InvalidPayload(f"The id has to be a string but was: {entry_id!r}")
+    if kind == "dogs":
+        spec = DogSpec.from_json(data=entry, user_id=user_id)
+        return dict(attrs.asdict(spec), id=entry_id)
+    if kind == "cards":
+        spec = CardSpec.from_json(data=entry, user_id=user_id)
+        return dict(
+            attrs.asdict(spec), id=entry_id, remaining_slots=spec.slots, version=1
+        )
+    try:
+        dog_id, card_id = entry["dog_id"], entry["card_id"]
+    except KeyError:
+        raise _missing_keys(["timestamp", "type", "dog_id", "card_id"])
+    spec = TrainingSpec.from_json(data=dict(entry, dogs=[dog_id]), user_id=user_id)
+    return dict(
+        id=entry_id,
+        timestamp=spec.timestamp,
+        type=str(spec.type),
+        dog_id=dog_id,
+        card_id=card_id,
+        user_id=user_id,
+    )
+
+
+def _dogs_not_found(dog_ids):
+    return DogNotFound(f"The dogs: {sorted(dog_ids)} do not exist")
+
+
+def _card_full(free_slots, *, required_slots):
+    return CardFull(
+        f"Only {free_slots} slot available but {required_slots} amount of slots are required, register a new card first before trying this operation again."
+    )
+
+
+def _missing_keys(keys):
+    return InvalidPayload(
+        f"You have to provide a payload with the following keys: {keys}"
+    )
+
+
+def _is_transient(error: DBAPIError) -> bool:
+    sqlite_error = getattr(error.orig, "sqlite_errorname", "")
+    return sqlite_error.startswith(("SQLITE_BUSY", "SQLITE_LOCKED")) or getattr(
+        error.orig, "pgcode", None
+    ) in ("40001", "40P01", "55P03")
 
 
 class TrainingSpecInvalid(Exception):
@@ -344,9 +1040,23 @@ class CardFull(Exception):
     pass
 
 
+class CardsLocked(Exception):
+    pass
+
+
+class BookingConflict(DatabaseException):
+    pass
+
+
 class DogSpecInvalid(Exception):
     pass
 
 
-class DogNotFound(Exception):
+class DogNotFound(DatabaseException):
     pass
+
+
+class ImportFailed(Exception):
+    def __init__(self, message, *, imported):
+        super().__init__(message)
+        self.imported = imported
@@ -1,24 +1,101 @@
-from aiohttp import web
+import asyncio
+import hashlib
+import math
+import time
+from functools import partial, wraps
+from typing import Optional
 
+from aiohttp import ETag, web
+from multidict import CIMultiDict
+from sqlalchemy import Row
+
+from dogtraining.server.authentication import InvalidToken, TokenVerifier
+from dogtraining.server.bulk import BULK_FORMATS, read_entries, write_entries
+from dogtraining.server.cache import cache_key
+from dogtraining.server.cors import Cors
+from dogtraining.server.engine import QueryBudgets, count_queries
+from dogtraining.server.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from dogtraining.server.metrics import Metrics
+from dogtraining.server.models import Card, Training
+from dogtraining.server.offload import Offloader
+from dogtraining.server.rate_limit import RateLimited, WriteLimiter
+from dogtraining.server.serialization import dumps, json_response
 from dogtraining.server.training_database import (
+    CARD_EXPANSIONS,
+    TRAINING_EXPANSIONS,
+    TRAINING_TYPES,
+    BookingConflict,
     CardFull,
     CardNotFound,
     CardSpec,
+    CardSpecInvalid,
     DatabaseException,
+    DogNotFound,
     DogSpec,
     DogSpecInvalid,
+    ImportFailed,
     InvalidPayload,
     TrainingDatabase,
+    TrainingFilter,
     TrainingSpec,
+    TrainingSpecInvalid,
     TrainingType,
 )
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAX_PAGE_SIZE = 1000
+
+MAX_BATCH_SIZE = 500
+
+COMPRESSION_MIN_SIZE = 1024
+
+BATCH_MODES = ("all_or_nothing", "best_effort")
+
+ORDERS = ("asc", "desc")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+TRAINING_TYPES_BODY = dumps([type.value for type in TrainingType])
+
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
 
 @web.middleware
 async def user_authentication(request, handler):
+    if getattr(handler, "without_authentication", False):
+        return await handler(request)
+    token_verifier: Optional[TokenVerifier] = request.app.get("token_verifier")
+    if token_verifier is not None:
+        try:
+            claims = await token_verifier.verify(_bearer_token(request))
+        except InvalidToken as e:
+            return json_response(
+                status=401,
+                data={"error": str(e)},
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if (
+            token_verifier.required_role is not None
+            and token_verifier.required_role not in claims.roles
+        ):
+            return json_response(
+                status=403,
+                data={"error": f"The role: {token_verifier.required_role} is required"},
+            )
+        headers = CIMultiDict(request.headers)
+        headers["user_id"] = claims.user_id
+        request = request.clone(headers=headers)
+        request["claims"] = claims
     user_id = request.headers.get("user_id")
     if not user_id:
-        return web.json_response(
+        return json_response(
             status=401,
             data={
                 "error": "Unauthorized access, provide the correct authorization header."
@@ -30,121 +107,370 @@ async def user_authentication(request, handler):
 
 @web.middleware
 async def cors_handler(request: web.Request, handler):
-    cors_headers = {
-        "Access-Control-Allow-Origin": request.app["frontend_host_url"],
-        "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization,user_id",
-    }
-    cors_handler = {
-        "Access-Control-Allow-Origin": request.app["frontend_host_url"],  # or specific origin
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
-        "Access-Control-Max-Age": "86400",
-    }
-
+    cors: Cors = request.app["cors"]
+    origin = request.headers.get("Origin")
     if request.method == "OPTIONS":
-        return web.Response(status=204, headers=cors_headers)
+        headers = cors.preflight_headers(origin)
+        if headers is None:
+            return json_response(
+                status=403,
+                data={"error": f"The origin: {origin} is not allowed"},
+            )
+        return web.Response(status=204, headers=headers)
+    headers = cors.response_headers(origin)
+    if headers is not None:
+        request["cors_headers"] = headers
+    return await handler(request)
 
-    response = await handler(request)
 
-    for key, value in cors_headers.items():
-        response.headers[key] = value
+@web.middleware
+async def collect_metrics(request: web.Request, handler):
+    metrics: Metrics = request.app["metrics"]
+    status = 500
+    start = time.perf_counter()
+    with metrics.track_request() as queries:
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            metrics.observe_request(
+                method=request.method,
+                route=_route_name(request),
+                status=status,
+                seconds=time.perf_counter() - start,
+                queries=queries,
+            )
+
+
+@web.middleware
+async def enforce_query_budgets(request: web.Request, handler):
+    query_budgets: QueryBudgets = request.app["query_budgets"]
+    with count_queries(statements=True) as queries:
+        try:
+            return await handler(request)
+        finally:
+            query_budgets.check(f"{request.method} {_route_name(request)}", queries)
+
+
+@web.middleware
+async def limit_writes(request: web.Request, handler):
+    write_limiter: Optional[WriteLimiter] = request.app.get("write_limiter")
+    user_id = request.headers.get("user_id")
+    if write_limiter is None or user_id is None or request.method in SAFE_METHODS:
+        return await handler(request)
+    try:
+        async with write_limiter.limit(user_id):
+            return await handler(request)
+    except RateLimited as e:
+        return json_response(
+            status=429,
+            data={"error": str(e)},
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+
+
+def _bearer_token(request: web.Request):
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise InvalidToken(
+            "Unauthorized access, provide a bearer token in the Authorization header."
+        )
+    return token.strip()
+
 
+def _route_name(request: web.Request):
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else "unmatched"
+
+
+def without_unit_of_work(handler):
+    handler.without_unit_of_work = True
+    return handler
+
+
+def without_authentication(handler):
+    handler.without_authentication = True
+    return handler
+
+
+@web.middleware
+async def unit_of_work(request: web.Request, handler):
+    if getattr(handler, "without_unit_of_work", False):
+        return await handler(request)
+    training_database: TrainingDatabase = request.app["training_database"]
+    async with training_database.lazy_unit_of_work() as session:
+        response = await handler(request)
+        if response.status >= 400:
+            await session.rollback()
+        return response
+
+
+async def add_cors_headers(request: web.Request, response: web.StreamResponse):
+    headers = request.get("cors_headers")
+    if headers is not None:
+        response.headers.extend(headers)
+
+
+def conditional(handler):
+    @wraps(handler)
+    async def wrapper(self, request: web.Request):
+        user_id = request.headers.get("user_id")
+        revision, modified_at = await self._training_database.get_revision(
+            user_id=user_id
+        )
+        etag = hashlib.blake2b(
+            f"{user_id}:{revision}:{request.path_qs}".encode(), digest_size=16
+        ).hexdigest()
+        if modified_at is not None and modified_at >= int(time.time()):
+            # a second write within this second would keep the same Last-Modified
+            modified_at = None
+        request["revision"] = revision
+        request["validators"] = dict(etag=etag, modified_at=modified_at)
+        if _not_modified(request, etag=etag, modified_at=modified_at):
+            response = web.Response(status=304)
+        else:
+            response = await handler(self, request)
+        if response.status in (200, 304) and not response.prepared:
+            _set_validators(response, **request["validators"])
+        return response
+
+    return wrapper
+
+
+@web.middleware
+async def compression(request: web.Request, handler):
+    response = await handler(request)
+    if (
+        not isinstance(response, web.Response)
+        or response.prepared
+        or response.body is None
+        or len(response.body) < COMPRESSION_MIN_SIZE
+    ):
+        return response
+    _add_vary(response, "Accept-Encoding")
+    accept_encoding = request.headers.get("Accept-Encoding", "").lower()
+    if brotli is not None and "br" in accept_encoding:
+        response.body = await asyncio.get_running_loop().run_in_executor(
+            None, brotli.compress, response.body
+        )
+        response.headers["Content-Encoding"] = "br"
+    else:
+        response.enable_compression()
     return response
 
 
 class TrainingHandler:
-    def __init__(self, *, training_database):
+    def __init__(self, *, training_database, offloader: Optional[Offloader] = None):
         self._training_database: TrainingDatabase = training_database
+        self._offloader = offloader or Offloader()
 
+    @conditional
     async def get_all_trainings(self, request: web.Request):
-        return web.json_response(
-            data=[
-                training.as_dict()
-                for training in await self._training_database.get_all_training_entries(
-                    user_id=request.headers.get("user_id"),
-                )
-            ]
+        try:
+            after, limit, stream = _parse_list_query(request)
+            expand = _parse_expand(
+                request, expansions=TRAINING_EXPANSIONS, default=("dog",)
+            )
+            training_filter, descending = _parse_training_filter(request)
+        except InvalidPayload as e:
+            return json_response(status=400, data={"error": str(e)})
+        query = dict(
+            user_id=request.headers.get("user_id"),
+            after=after,
+            limit=limit,
+            expand=expand,
+            training_filter=training_filter,
+            descending=descending,
+        )
+        serialize = partial(Training.as_dict, expand=expand)
+        if stream:
+            return await _stream_response(
+                request,
+                stream=stream,
+                entries=self._training_database.stream_training_entries(**query),
+                serialize=serialize,
+            )
+        if limit is None:
+            return await self._offloaded_response(
+                entries=self._training_database.stream_training_entries(**query),
+                serialize=serialize,
+            )
+        trainings = await self._training_database.get_all_training_entries(**query)
+        return await _page_response(
+            request,
+            entries=trainings,
+            limit=limit,
+            cursor=lambda training: (training.timestamp, training.id),
+            serialize=serialize,
+            offloader=self._offloader,
         )
 
     async def get_training_by_id(self, request: web.Request):
         training_id = request.match_info["id"]
         try:
+            expand = _parse_expand(
+                request, expansions=TRAINING_EXPANSIONS, default=("dog",)
+            )
             training = await self._training_database.get_training_entry_by_id(
-                training_id=training_id, user_id=request.headers.get("user_id")
+                training_id=training_id,
+                user_id=request.headers.get("user_id"),
+                expand=expand,
             )
-            return web.json_response(data=training.as_dict())
-        except DatabaseException as e:
-            return web.json_response(
+            return json_response(data=training.as_dict(expand=expand))
+        except (DatabaseException, InvalidPayload) as e:
+            return json_response(
                 status=400,
                 data={
                     "error": str(e),
                 },
             )
 
+    @conditional
     async def get_all_cards(self, request: web.Request):
+        try:
+            after, limit, stream = _parse_list_query(request)
+            expand = _parse_expand(request, expansions=CARD_EXPANSIONS, default=())
+        except InvalidPayload as e:
+            return json_response(status=400, data={"error": str(e)})
+        user_id = request.headers.get("user_id")
+        if expand:
+            serialize = partial(Card.as_dict, expand=expand)
+        else:
+            serialize = Row._asdict
+        if stream:
+            return await _stream_response(
+                request,
+                stream=stream,
+                entries=self._training_database.stream_card_entries(
+                    user_id=user_id, after=after, limit=limit, expand=expand
+                ),
+                serialize=serialize,
+            )
+        if after is None and limit is None and not expand:
+            return await self._cached_response(
+                request,
+                name="cards",
+                load=partial(
+                    self._training_database.get_all_card_entries, user_id=user_id
+                ),
+            )
+        if limit is None:
+            return await self._offloaded_response(
+                entries=self._training_database.stream_card_entries(
+                    user_id=user_id, after=after, expand=expand
+                ),
+                serialize=serialize,
+            )
         cards = await self._training_database.get_all_card_entries(
-            user_id=request.headers.get("user_id"),
+            user_id=user_id, after=after, limit=limit, expand=expand
+        )
+        return await _page_response(
+            request,
+            entries=cards,
+            limit=limit,
+            cursor=lambda card: (card.timestamp, card.id),
+            serialize=serialize,
+            offloader=self._offloader,
         )
-        return web.json_response(data=[card.as_dict() for card in cards])
 
     async def get_card_by_id(self, request: web.Request):
         card_id = request.match_info["id"]
         try:
+            expand = _parse_expand(request, expansions=CARD_EXPANSIONS, default=())
             card = await self._training_database.get_card_entry_by_id(
                 card_id=card_id,
                 user_id=request.headers.get("user_id"),
+                expand=expand,
             )
-            return web.json_response(data=card.as_dict())
-        except DatabaseException as e:
-            return web.json_response(status=400, data={"error": str(e)})
+            return json_response(data=card.as_dict(expand=expand))
+        except (DatabaseException, InvalidPayload) as e:
+            return json_response(status=400, data={"error": str(e)})
 
     async def create_card_entry(self, request: web.Request):
         try:
-            card_spec = CardSpec.from_json(
-                data=await request.json(), user_id=request.headers.get("user_id")
+            card_spec = CardSpec.from_bytes(
+                body=await request.read(), user_id=request.headers.get("user_id")
             )
             card = await self._training_database.create_card_entry(card_spec=card_spec)
-            return web.json_response(data=card.as_dict())
-        except InvalidPayload as e:
-            return web.json_response(
+            return json_response(data=card.as_dict())
+        except (InvalidPayload, CardSpecInvalid) as e:
+            return json_response(
                 status=400,
                 data={"error": str(e)},
             )
 
     async def create_training_entry(self, request: web.Request):
         try:
-            training_spec = TrainingSpec.from_json(
-                data=await request.json(), user_id=request.headers.get("user_id")
+            training_spec = TrainingSpec.from_bytes(
+                body=await request.read(), user_id=request.headers.get("user_id")
             )
             trainings = await self._training_database.create_training_entry(
                 training_spec=training_spec
             )
-            return web.json_response(
-                data=[training.as_dict() for training in trainings]
-            )
-        except (InvalidPayload, CardNotFound, CardFull) as e:
-            return web.json_response(
+            return json_response(data=[training.as_dict() for training in trainings])
+        except (
+            InvalidPayload,
+            TrainingSpecInvalid,
+            CardNotFound,
+            CardFull,
+            DogNotFound,
+        ) as e:
+            return json_response(
                 status=400,
                 data={
                     "error": str(e),
                 },
             )
+        except BookingConflict as e:
+            return json_response(status=409, data={"error": str(e)})
+
+    async def create_training_entries(self, request: web.Request):
+        try:
+            mode = request.query.get("mode", "all_or_nothing")
+            if mode not in BATCH_MODES:
+                raise InvalidPayload(
+                    f"The query parameter mode has to be one of: {list(BATCH_MODES)} but was: {mode}"
+                )
+            training_specs = TrainingSpec.batch_from_bytes(
+                body=await request.read(),
+                user_id=request.headers.get("user_id"),
+                max_size=MAX_BATCH_SIZE,
+            )
+            results = await self._training_database.create_training_entries(
+                training_specs=training_specs, best_effort=mode == "best_effort"
+            )
+            return json_response(data=[result.as_dict() for result in results])
+        except (
+            InvalidPayload,
+            TrainingSpecInvalid,
+            CardNotFound,
+            CardFull,
+            DogNotFound,
+        ) as e:
+            return json_response(status=400, data={"error": str(e)})
+        except BookingConflict as e:
+            return json_response(status=409, data={"error": str(e)})
 
     async def get_all_training_types(self, request: web.Request):
-        return web.json_response(data=[type.value for type in TrainingType])
+        return _etag_response(
+            request, body=TRAINING_TYPES_BODY, etag=_etag(TRAINING_TYPES_BODY)
+        )
 
     async def create_dog_entry(self, request: web.Request):
         try:
-            dog_spec = DogSpec.from_json(
-                data=await request.json(), user_id=request.headers.get("user_id")
+            dog_spec = DogSpec.from_bytes(
+                body=await request.read(), user_id=request.headers.get("user_id")
             )
             dog = await self._training_database.create_dog_entry(
                 dog_spec=dog_spec,
             )
-            return web.json_response(data=dog.as_dict())
+            return json_response(data=dog.as_dict())
         except (InvalidPayload, DogSpecInvalid) as e:
-            return web.json_response(
+            return json_response(
                 status=400,
                 data={
                     "error": str(e),
@@ -158,12 +484,282 @@ class TrainingHandler:
                 dog_id=dog_id,
                 user_id=request.headers.get("user_id"),
             )
-            return web.json_response(data=dog.as_dict())
+            return json_response(data=dog.as_dict())
         except DatabaseException as e:
-            return web.json_response(status=400, data={"error": str(e)})
+            return json_response(status=400, data={"error": str(e)})
 
+    @conditional
     async def get_all_dogs(self, request: web.Request):
+        try:
+            after, limit, stream = _parse_list_query(request)
+        except InvalidPayload as e:
+            return json_response(status=400, data={"error": str(e)})
+        user_id = request.headers.get("user_id")
+        if stream:
+            return await _stream_response(
+                request,
+                stream=stream,
+                entries=self._training_database.stream_dogs(
+                    user_id=user_id, after=after, limit=limit
+                ),
+                serialize=Row._asdict,
+            )
+        if after is None and limit is None:
+            return await self._cached_response(
+                request,
+                name="dogs",
+                load=partial(self._training_database.get_all_dogs, user_id=user_id),
+            )
         dogs = await self._training_database.get_all_dogs(
+            user_id=user_id, after=after, limit=limit
+        )
+        return await _page_response(
+            request,
+            entries=dogs,
+            limit=limit,
+            cursor=lambda dog: (dog.registration_time, dog.id),
+            serialize=Row._asdict,
+            offloader=self._offloader,
+        )
+
+    @conditional
+    async def get_statistics(self, request: web.Request):
+        statistics = await self._training_database.get_statistics(
             user_id=request.headers.get("user_id")
         )
-        return web.json_response(data=[dog.as_dict() for dog in dogs])
+        return json_response(data=statistics)
+
+    @without_unit_of_work
+    async def import_entries(self, request: web.Request):
+        kind = request.match_info["kind"]
+        try:
+            bulk_format = _parse_bulk_format(request)
+            skip = request.query.get("skip", "0")
+            if not skip.isdecimal():
+                raise InvalidPayload(
+                    f"The query parameter skip has to be a positive int but was: {skip}"
+                )
+            imported = await self._training_database.import_entries(
+                kind=kind,
+                entries=read_entries(request.content, kind=kind, format=bulk_format),
+                user_id=request.headers.get("user_id"),
+                skip=int(skip),
+            )
+        except InvalidPayload as e:
+            return json_response(status=400, data={"error": str(e)})
+        except ImportFailed as e:
+            return json_response(
+                status=400, data={"error": str(e), "imported": e.imported}
+            )
+        return json_response(data={"imported": imported})
+
+    async def export_entries(self, request: web.Request):
+        kind = request.match_info["kind"]
+        try:
+            bulk_format = _parse_bulk_format(request)
+        except InvalidPayload as e:
+            return json_response(status=400, data={"error": str(e)})
+        response = web.StreamResponse(
+            headers={"Content-Type": BULK_FORMATS[bulk_format]}
+        )
+        await response.prepare(request)
+        async for chunk in write_entries(
+            self._training_database.export_entries(
+                kind=kind, user_id=request.headers.get("user_id")
+            ),
+            kind=kind,
+            format=bulk_format,
+            offloader=self._offloader,
+        ):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    async def _cached_response(self, request: web.Request, *, name, load):
+        cache = self._training_database.cache
+        revision = request["revision"]
+        key = cache_key(request.headers.get("user_id"), f"{name}:{revision}")
+        body = await cache.get(key) if cache is not None else None
+        if body is None:
+            body = await self._offloader.dump_entries(await load(), Row._asdict)
+            if cache is not None:
+                await cache.set(key, body)
+        return web.Response(body=body, content_type="application/json")
+
+    async def _offloaded_response(self, *, entries, serialize):
+        body = await self._offloader.dump_stream(entries, serialize)
+        return web.Response(body=body, content_type="application/json")
+
+    async def get_pool_status(self, request: web.Request):
+        return json_response(data=self._training_database.pool_status())
+
+    async def get_loop_lag(self, request: web.Request):
+        return json_response(data=request.app["loop_lag"].as_dict())
+
+    @without_authentication
+    @without_unit_of_work
+    async def get_metrics(self, request: web.Request):
+        loop_lag = request.app.get("loop_lag")
+        body = request.app["metrics"].render(
+            pool_status=self._training_database.pool_status(),
+            queries=self._training_database.query_stats,
+            loop_lag=loop_lag.as_dict() if loop_lag is not None else None,
+        )
+        return web.Response(
+            body=body.encode(), headers={"Content-Type": METRICS_CONTENT_TYPE}
+        )
+
+
+def _parse_list_query(request: web.Request):
+    after = request.query.get("after")
+    if after is not None:
+        timestamp, _, entry_id = after.partition(",")
+        if not timestamp.isdecimal() or not entry_id:
+            raise InvalidPayload(
+                f"The query parameter after has to be of the form <timestamp>,<id> but was: {after}"
+            )
+        after = (int(timestamp), entry_id)
+    limit = request.query.get("limit")
+    if limit is not None:
+        if not limit.isdecimal() or not 0 < int(limit) <= MAX_PAGE_SIZE:
+            raise InvalidPayload(
+                f"The query parameter limit has to be an int between 1 and {MAX_PAGE_SIZE} but was: {limit}"
+            )
+        limit = int(limit)
+    stream = request.query.get("stream")
+    if stream is not None and stream not in STREAM_CONTENT_TYPES:
+        raise InvalidPayload(
+            f"The query parameter stream has to be one of: {list(STREAM_CONTENT_TYPES)} but was: {stream}"
+        )
+    return after, limit, stream
+
+
+def _parse_training_filter(request: web.Request):
+    timestamps = []
+    for name in ("from", "to"):
+        value = request.query.get(name)
+        if value is not None and not value.isdecimal():
+            raise InvalidPayload(
+                f"The query parameter {name} has to be a timestamp but was: {value}"
+            )
+        timestamps.append(None if value is None else int(value))
+    training_type = request.query.get("type")
+    if training_type is not None and training_type not in TRAINING_TYPES:
+        raise InvalidPayload(
+            f"The query parameter type has to be one of: {sorted(TRAINING_TYPES)} but was: {training_type}"
+        )
+    order = request.query.get("order", "asc")
+    if order not in ORDERS:
+        raise InvalidPayload(
+            f"The query parameter order has to be one of: {list(ORDERS)} but was: {order}"
+        )
+    start, end = timestamps
+    training_filter = TrainingFilter(
+        start=start,
+        end=end,
+        dog_id=request.query.get("dog_id"),
+        card_id=request.query.get("card_id"),
+        type=training_type,
+    )
+    return training_filter, order == "desc"
+
+
+def _not_modified(request: web.Request, *, etag, modified_at):
+    if request.if_none_match is not None:
+        return any(match.value in (etag, "*") for match in request.if_none_match)
+    if_modified_since = request.if_modified_since
+    return (
+        modified_at is not None
+        and if_modified_since is not None
+        and if_modified_since.timestamp() >= modified_at
+    )
+
+
+def _set_validators(response: web.StreamResponse, *, etag, modified_at):
+    response.etag = ETag(value=etag, is_weak=True)
+    if modified_at is not None:
+        response.last_modified = modified_at
+    response.headers["Cache-Control"] = "no-cache"
+    _add_vary(response, "user_id")
+    _add_vary(response, "Accept-Encoding")
+
+
+def _add_vary(response: web.StreamResponse, name):
+    varied = {
+        value.strip().lower()
+        for header in response.headers.getall("Vary", ())
+        for value in header.split(",")
+    }
+    if name.lower() not in varied:
+        response.headers.add("Vary", name)
+
+
+def _etag(body: bytes):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _etag_response(request: web.Request, *, body: bytes, etag):
+    if_none_match = request.if_none_match or ()
+    if any(match.value in (etag, "*") for match in if_none_match):
+        response = web.Response(status=304)
+    else:
+        response = web.Response(body=body, content_type="application/json")
+    response.etag = etag
+    return response
+
+
+def _parse_bulk_format(request: web.Request):
+    bulk_format = request.query.get("format", "ndjson")
+    if bulk_format not in BULK_FORMATS:
+        raise InvalidPayload(
+            f"The query parameter format has to be one of: {list(BULK_FORMATS)} but was: {bulk_format}"
+        )
+    return bulk_format
+
+
+def _parse_expand(request: web.Request, *, expansions, default):
+    expand = request.query.get("expand")
+    if expand is None:
+        return default
+    expand = tuple(item for item in expand.split(",") if item)
+    if not set(expand) <= set(expansions):
+        raise InvalidPayload(
+            f"The query parameter expand can only contain: {list(expansions)} but was: {list(expand)}"
+        )
+    return expand
+
+
+async def _page_response(
+    request: web.Request, *, entries, limit, cursor, serialize, offloader: Offloader
+):
+    headers = {}
+    if limit is not None and len(entries) == limit:
+        timestamp, entry_id = cursor(entries[-1])
+        next_url = request.rel_url.update_query(after=f"{timestamp},{entry_id}")
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    return web.Response(
+        body=await offloader.dump_entries(entries, serialize),
+        headers=headers,
+        content_type="application/json",
+    )
+
+
+async def _stream_response(request: web.Request, *, stream, entries, serialize):
+    response = web.StreamResponse(
+        headers={"Content-Type": STREAM_CONTENT_TYPES[stream]}
+    )
+    if "validators" in request:
+        _set_validators(response, **request["validators"])
+    response.enable_compression()
+    await response.prepare(request)
+    if stream == "ndjson":
+        async for entry in entries:
+            await response.write(dumps(serialize(entry)) + b"\n")
+    else:
+        separator = b"["
+        async for entry in entries:
+            await response.write(separator + dumps(serialize(entry)))
+            separator = b","
+        await response.write(b"[]" if separator == b"[" else b"]")
+    await response.write_eof()
+    return response
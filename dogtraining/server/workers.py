@@ -0,0 +1,91 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+from typing import Callable
+
+from aiohttp import web
+from sqlalchemy import make_url
+
+from dogtraining.server.engine import EngineSettings
+
+_logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0
+
+
+def check_worker_settings(*, connection, workers, engine_settings: EngineSettings):
+    if workers < 1:
+        raise ValueError(f"At least one worker is required but was: {workers}")
+    url = make_url(connection)
+    if workers == 1 or url.get_backend_name() != "sqlite":
+        return
+    if url.database in (None, "", ":memory:"):
+        raise ValueError("An in-memory SQLite database can not be shared by workers")
+    if engine_settings.sqlite_journal_mode.upper() != "WAL":
+        raise ValueError(
+            f"Several workers need the SQLite journal mode WAL but was: {engine_settings.sqlite_journal_mode}"
+        )
+
+
+def serve(
+    app_factory: Callable[[], web.Application],
+    *,
+    host,
+    port,
+    workers,
+    restart_delay=RESTART_DELAY,
+):
+    sock = socket.create_server((host, port))
+    _logger.info(f"Serving on http://{host}:{port} with {workers} workers")
+    context = multiprocessing.get_context()
+    processes = {}
+    stopping = False
+
+    def start(index):
+        process = context.Process(
+            target=_run_worker,
+            args=(app_factory, sock),
+            name=f"dogtraining-worker-{index}",
+        )
+        process.start()
+        processes[index] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            process.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for index in range(workers):
+            if not stopping:
+                start(index)
+        while processes:
+            multiprocessing.connection.wait(
+                [process.sentinel for process in processes.values()]
+            )
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                del processes[index]
+                if not stopping:
+                    _logger.warning(
+                        f"{process.name} exited with {process.exitcode}, restarting it"
+                    )
+                    time.sleep(restart_delay)
+                    start(index)
+    finally:
+        sock.close()
+
+
+def _run_worker(app_factory, sock):
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    web.run_app(app_factory(), sock=sock, print=None)
@@ -1,10 +1,19 @@
 import argparse
 import asyncio
+import sys
 
-from sqlalchemy import sql
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 
-from dogtraining.server.models import Base
+from dogtraining.server.index_advisor import check_indexes
+from dogtraining.server.migrations import (
+    backfill_card_slots,
+    find_inconsistent_cards,
+    reset,
+    upgrade,
+)
+from dogtraining.server.statistics import rebuild_statistics
+from dogtraining.server.training_database import TrainingDatabase
 
 parser = argparse.ArgumentParser(prog="Dogtraining Server")
 parser.add_argument(
@@ -18,22 +27,90 @@ parser.add_argument(
     required=True,
     type=str,
 )
+parser.add_argument(
+    "--reset",
+    action="store_true",
+    help="Drop all tables and data before creating the schema.",
+)
+parser.add_argument(
+    "--check_consistency",
+    action="store_true",
+    help="Report cards whose remaining slots do not match their trainings.",
+)
+parser.add_argument(
+    "--repair",
+    action="store_true",
+    help="Recompute the remaining slots of all cards from their trainings.",
+)
+parser.add_argument(
+    "--check_indexes",
+    action="store_true",
+    help="Explain the repository queries and report full table scans.",
+)
+parser.add_argument(
+    "--rebuild_statistics",
+    action="store_true",
+    help="Recompute the per-user statistics from all trainings and cards.",
+)
+parser.add_argument(
+    "--user_id",
+    default="index-advisor",
+    type=str,
+    help="The user whose data is used to explain the repository queries.",
+)
 if __name__ == "__main__":
     args = parser.parse_args()
 
-    async def init_db(*, connection, db_type=None, schema_name=None):
+    async def init_db(*, connection, db_type=None, schema_name=None, reset_db=False):
         engine = create_async_engine(connection)
         async with engine.begin() as conn:
             if db_type == "postgres":
-                await conn.execute(sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}"))
+                await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema_name}"))
 
-            await conn.run_sync(Base.metadata.drop_all)
-            await conn.run_sync(Base.metadata.create_all)
+            if reset_db:
+                await conn.run_sync(reset)
+            await conn.run_sync(upgrade)
+
+    async def check_consistency(*, connection, repair=False):
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            if repair:
+                repaired = await conn.run_sync(backfill_card_slots)
+                print(f"Recomputed the remaining slots of {repaired} cards")
+            for card_id, remaining_slots, expected in await conn.run_sync(
+                find_inconsistent_cards
+            ):
+                print(
+                    f"Card {card_id} has {remaining_slots} remaining slots"
+                    f" but {expected} are expected"
+                )
+
+    async def rebuild(*, connection):
+        engine = create_async_engine(connection)
+        async with engine.begin() as conn:
+            rebuilt = await conn.run_sync(rebuild_statistics)
+            print(f"Rebuilt {rebuilt} statistics")
+
+    async def explain(*, connection, user_id):
+        table_scans = await check_indexes(
+            TrainingDatabase(connection=connection), user_id=user_id
+        )
+        for table_scan in table_scans:
+            print(f"{table_scan.plan}: {table_scan.statement}")
+        return 1 if table_scans else 0
 
-    asyncio.run(
-        init_db(
-            connection=args.connection,
-            db_type=args.db_type,
-            schema_name=args.schema_name,
+    if args.check_indexes:
+        sys.exit(asyncio.run(explain(connection=args.connection, user_id=args.user_id)))
+    elif args.rebuild_statistics:
+        asyncio.run(rebuild(connection=args.connection))
+    elif args.check_consistency or args.repair:
+        asyncio.run(check_consistency(connection=args.connection, repair=args.repair))
+    else:
+        asyncio.run(
+            init_db(
+                connection=args.connection,
+                db_type=args.db_type,
+                schema_name=args.schema_name,
+                reset_db=args.reset,
+            )
         )
-    )
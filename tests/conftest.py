@@ -1,6 +1,7 @@
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine
 
+from dogtraining.server.engine import QueryBudgets
 from dogtraining.server.models import Base, Card, Dog, Training
 from dogtraining.server.training_database import (
     CardSpec,
@@ -50,6 +51,28 @@ async def training_database(init_db, connection):
     return TrainingDatabase(connection=connection)
 
 
+@pytest.fixture
+def query_budgets():
+    budgets = QueryBudgets(
+        {
+            "GET /trainings": 4,
+            "GET /trainings/{id}": 3,
+            "POST /trainings": 10,
+            "POST /trainings/batch": 10,
+            "GET /cards": 6,
+            "GET /cards/{id}": 4,
+            "POST /cards": 4,
+            "GET /dogs": 3,
+            "GET /dogs/{id}": 2,
+            "POST /import/{kind}": 3,
+            "GET /export/{kind}": 2,
+            "GET /stats": 3,
+        }
+    )
+    yield budgets
+    assert not budgets.exceeded, "\n".join(budgets.exceeded)
+
+
 @pytest.fixture
 def dog_name():
     return "test"
@@ -74,6 +97,23 @@ def create_dog_entry(training_database, user_id, dog_name, dog_registration_time
     return create_entry
 
 
+@pytest.fixture
+def create_dogs(training_database, user_id, dog_name, dog_registration_time):
+    async def create_entries(*dog_ids, user_id=user_id):
+        async with training_database.unit_of_work(write=True) as session:
+            session.add_all(
+                Dog(
+                    id=dog_id,
+                    registration_time=dog_registration_time,
+                    name=dog_name,
+                    user_id=user_id,
+                )
+                for dog_id in dog_ids
+            )
+
+    return create_entries
+
+
 @pytest.fixture
 def create_card_entry(training_database: TrainingDatabase, user_id):
     async def create_entry() -> Card:
@@ -0,0 +1,370 @@
+import asyncio
+import base64
+import hashlib
+import json
+
+import pytest
+from aiohttp import web
+
+from dogtraining.server import authentication
+from dogtraining.server.authentication import (
+    Claims,
+    InvalidToken,
+    Jwks,
+    RsaKey,
+    TokenVerifier,
+    jwks_ctx,
+)
+from dogtraining.server.training_handler import user_authentication
+
+TEST_KEY_N = int(
+    "a6b181d4885a2f22d2809663b92ee9fb1b0ee50bc1b2aa74b23f7150af401ea6"
+    "c08bea20f6f31d4f996fb661a4b7a76fea5f3a785237a3f6721831fc673b4a04"
+    "0fd2ce56cff5f00b7b1cf4e6a07ef435de55a89255074d2ef4e00c2fd544455e"
+    "6b3430defd2f039380f5954cc133cc0d2e2f21e96693da0d66dd6c6bbbc76379"
+    "e9bab4497a90778eea90e3a5cffdbd637b0096a61954fe24a28d47c2e19ceb74"
+    "101bfdb147eb2c6dc654c61adca54cff430dfc841b94d9a803d04c9f1be556bf"
+    "68e3cd63b9c54741bf709afb3f0ff0dce9af291481443b8c69b4632c370e7f8f"
+    "6420ac8ab514edcd202145a4d421eef9dac652ce172678960223d078f5c6b339",
+    16,
+)
+TEST_KEY_D = int(
+    "40c67bb816204d6ecfb40e3cc44a59bc2d60955b0333258fe1704bdd59aca5fc"
+    "90980e2c2f2a7bfa619a8a99d90350fa696e05ef99ab6b78aa0f82e51d4c69cf"
+    "b84267d24e4fb8af0d714c2d8eb2a6bd841f6f3925f78763b6de957dc4f719a9"
+    "be28f2d0c43c0fbcb3013bba2eddacee7642f47f994fdd0d162af725ca3b8a08"
+    "c5dbb136dc26437207b89da86c3363212beccc8229801767b8bbb323dbb65ef0"
+    "ea5c6a6667ea1dcae7899e1d003da658a8fb5e80681af891de255e5e4dbc635a"
+    "0d9b94d16cbcab0c7f43d9f4f94dd53bb12e31a1c23ae4340ffaffc74c9ae842"
+    "81f4227cb0415c537b019bdfcb31fd1647d9819b24dd84daca1b198e2480b03d",
+    16,
+)
+TEST_KEY = RsaKey(n=TEST_KEY_N, e=65537)
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+NOW = 1_700_000_000
+
+
+def b64encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64_int(value: int):
+    return b64encode(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+KEY_SIZE = (TEST_KEY_N.bit_length() + 7) // 8
+
+
+def pkcs1_encode(message: bytes, *, digest_info=SHA256_DIGEST_INFO):
+    digest_info = digest_info + hashlib.sha256(message).digest()
+    return (
+        b"\x00\x01"
+        + b"\xff" * (KEY_SIZE - len(digest_info) - 3)
+        + b"\x00"
+        + digest_info
+    )
+
+
+def raw_sign(encoded: bytes):
+    signature = pow(int.from_bytes(encoded, "big"), TEST_KEY_D, TEST_KEY_N)
+    return signature.to_bytes(KEY_SIZE, "big")
+
+
+def sign(payload, *, kid="test-key", alg="RS256"):
+    header = b64encode(json.dumps(dict(alg=alg, kid=kid, typ="JWT")).encode())
+    body = b64encode(json.dumps(payload).encode())
+    signature = raw_sign(pkcs1_encode(f"{header}.{body}".encode()))
+    return f"{header}.{body}.{b64encode(signature)}"
+
+
+def claims(**overrides):
+    return dict(
+        dict(
+            iss="https://keycloak.test/realms/dogs",
+            aud="dogtraining",
+            exp=NOW + 300,
+            preferred_username="thie",
+            realm_access=dict(roles=["trainer", "offline_access"]),
+        ),
+        **overrides,
+    )
+
+
+def jwks_document():
+    return dict(
+        keys=[
+            dict(
+                kty="RSA",
+                use="sig",
+                kid="test-key",
+                alg="RS256",
+                n=b64_int(TEST_KEY_N),
+                e=b64_int(65537),
+            )
+        ]
+    )
+
+
+@pytest.fixture
+def clock():
+    return [NOW]
+
+
+@pytest.fixture
+def token_verifier(clock):
+    return TokenVerifier(
+        Jwks(keys={"test-key": TEST_KEY}),
+        issuer="https://keycloak.test/realms/dogs",
+        audience="dogtraining",
+        memo_size=2,
+        clock=lambda: clock[0],
+    )
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    calls = []
+    verify = RsaKey.verify
+
+    def counting_verify(self, *args):
+        calls.append(args)
+        return verify(self, *args)
+
+    monkeypatch.setattr(RsaKey, "verify", counting_verify)
+    return calls
+
+
+async def test_verify_maps_claims(token_verifier):
+    assert await token_verifier.verify(sign(claims())) == Claims(
+        user_id="thie",
+        roles=frozenset(["trainer", "offline_access"]),
+        expires_at=NOW + 300,
+    )
+
+
+async def test_verified_tokens_are_memoized_until_expiry(
+    token_verifier, verifications, clock
+):
+    token = sign(claims())
+    await token_verifier.verify(token)
+    await token_verifier.verify(token)
+    assert len(verifications) == 1
+
+    clock[0] = NOW + 400
+    with pytest.raises(InvalidToken, match="expired"):
+        await token_verifier.verify(token)
+
+
+async def test_memo_is_bounded(token_verifier, verifications):
+    tokens = [sign(claims(preferred_username=f"user-{index}")) for index in range(3)]
+    for token in tokens:
+        await token_verifier.verify(token)
+    await token_verifier.verify(tokens[2])
+    await token_verifier.verify(tokens[0])
+    assert len(verifications) == 4
+
+
+@pytest.mark.parametrize(
+    "token, error",
+    [
+        ("not-a-token", "not a valid JWT"),
+        (sign(claims(), alg="HS256"), "algorithm"),
+        (sign(claims(), alg="none"), "algorithm"),
+        (sign(claims(), kid="other-key"), "unknown"),
+        (sign(claims(exp=NOW - 60)), "expired"),
+        (sign(claims(nbf=NOW + 60)), "not valid yet"),
+        (sign(claims(iss="https://evil.test")), "issued"),
+        (sign(claims(aud=["account"])), "meant for"),
+        (sign(claims(preferred_username=None)), "preferred_username"),
+        (
+            sign(claims()).rsplit(".", 2)[0]
+            + "."
+            + b64encode(json.dumps(claims(preferred_username="admin")).encode())
+            + "."
+            + sign(claims()).rsplit(".", 1)[1],
+            "signature",
+        ),
+    ],
+)
+async def test_verify_rejects_invalid_tokens(token_verifier, token, error):
+    with pytest.raises(InvalidToken, match=error):
+        await token_verifier.verify(token)
+
+
+async def test_verify_rejects_deeply_nested_tokens(token_verifier):
+    with pytest.raises(InvalidToken, match="not a valid JWT"):
+        await token_verifier.verify(f"{b64encode(b'[' * 3000)}.e30.")
+
+
+@pytest.fixture(params=["cryptography", "python"])
+def rsa_backend(request, monkeypatch):
+    if request.param == "cryptography":
+        pytest.importorskip("cryptography")
+    else:
+        monkeypatch.setattr(authentication, "rsa", None)
+    return request.param
+
+
+def _bad_signatures(message):
+    encoded = pkcs1_encode(message)
+    digest_info = encoded[-51:]
+    valid = raw_sign(encoded)
+    return {
+        "block type 2": raw_sign(b"\x00\x02" + encoded[2:]),
+        "short padding": raw_sign(
+            b"\x00\x01\xff\xff\x00" + b"\x00" * (KEY_SIZE - 56) + digest_info
+        ),
+        "garbage after the digest": raw_sign(
+            b"\x00\x01"
+            + b"\xff" * 8
+            + b"\x00"
+            + digest_info
+            + b"\xab" * (KEY_SIZE - 62)
+        ),
+        "sha1 digest info": raw_sign(
+            pkcs1_encode(
+                message, digest_info=bytes.fromhex("3021300906052b0e03021a05000414")
+            )
+        ),
+        "sha512 digest info": raw_sign(
+            pkcs1_encode(
+                message,
+                digest_info=bytes.fromhex("3051300d060960864801650304020305000440"),
+            )
+        ),
+        "digest info without null parameters": raw_sign(
+            b"\x00\x01"
+            + b"\xff" * (KEY_SIZE - 52)
+            + b"\x00"
+            + bytes.fromhex("302f300b06096086480165030402010420")
+            + digest_info[-32:]
+        ),
+        "other message": raw_sign(pkcs1_encode(message + b".")),
+        "n": TEST_KEY_N.to_bytes(KEY_SIZE, "big"),
+        "n plus one": (TEST_KEY_N + 1).to_bytes(KEY_SIZE, "big"),
+        "all ones": b"\xff" * KEY_SIZE,
+        "leading zero": b"\x00" + valid,
+        "truncated": valid[1:],
+        "empty": b"",
+    }
+
+
+MESSAGE = b"header.payload"
+BAD_SIGNATURES = _bad_signatures(MESSAGE)
+
+
+async def test_rsa_key_verifies_a_valid_signature(rsa_backend):
+    assert TEST_KEY.verify("RS256", MESSAGE, raw_sign(pkcs1_encode(MESSAGE)))
+
+
+@pytest.mark.parametrize("name", list(BAD_SIGNATURES))
+async def test_rsa_key_rejects_bad_signatures(rsa_backend, name):
+    assert not TEST_KEY.verify("RS256", MESSAGE, BAD_SIGNATURES[name])
+
+
+@pytest.fixture
+async def jwks_server(aiohttp_server):
+    requests = []
+
+    async def certs(request):
+        requests.append(request)
+        return web.json_response(jwks_document())
+
+    app = web.Application()
+    app.add_routes([web.get("/certs", certs)])
+    server = await aiohttp_server(app)
+    server.requests = requests
+    return server
+
+
+async def test_unknown_keys_reload_the_jwks_at_most_once_per_interval(
+    jwks_server, clock
+):
+    token_verifier = TokenVerifier(
+        Jwks(url=str(jwks_server.make_url("/certs"))), clock=lambda: clock[0]
+    )
+
+    assert (await token_verifier.verify(sign(claims()))).user_id == "thie"
+    with pytest.raises(InvalidToken, match="unknown"):
+        await token_verifier.verify(sign(claims(), kid="rotated-key"))
+    assert len(jwks_server.requests) == 1
+
+
+async def test_jwks_is_reloaded_in_the_background(aiohttp_client, jwks_server):
+    app = web.Application()
+    app["token_verifier"] = TokenVerifier(
+        Jwks(url=str(jwks_server.make_url("/certs")), refresh_interval=0.01)
+    )
+    app.cleanup_ctx.append(jwks_ctx)
+    await aiohttp_client(app)
+
+    for _ in range(100):
+        if len(jwks_server.requests) >= 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert len(jwks_server.requests) >= 3
+    assert await app["token_verifier"].jwks.get("test-key") == TEST_KEY
+
+
+@pytest.fixture
+async def token_client(aiohttp_client, clock):
+    async def whoami(request):
+        return web.json_response(
+            dict(
+                user_id=request.headers["user_id"],
+                roles=sorted(request["claims"].roles),
+            )
+        )
+
+    app = web.Application(middlewares=[user_authentication])
+    app["token_verifier"] = TokenVerifier(
+        Jwks(keys={"test-key": TEST_KEY}),
+        required_role="trainer",
+        clock=lambda: clock[0],
+    )
+    app.add_routes([web.get("/whoami", whoami)])
+    return await aiohttp_client(app)
+
+
+async def test_middleware_takes_the_user_from_the_token(token_client):
+    response = await token_client.get(
+        "/whoami",
+        headers={"Authorization": f"Bearer {sign(claims())}", "user_id": "spoofed"},
+    )
+    assert response.status == 200
+    assert await response.json() == dict(
+        user_id="thie", roles=["offline_access", "trainer"]
+    )
+
+
+async def test_middleware_rejects_requests_without_a_valid_token(token_client):
+    response = await token_client.get("/whoami", headers={"user_id": "thie"})
+    assert response.status == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    response = await token_client.get(
+        "/whoami",
+        headers={"Authorization": f"Bearer {sign(claims(exp=NOW - 60))}"},
+    )
+    assert response.status == 401
+    assert await response.json() == {"error": "The token has expired"}
+
+
+async def test_middleware_rejects_deeply_nested_tokens(token_client):
+    token = f"{b64encode(b'[' * 3000)}.{b64encode(b'{}')}.signature"
+    response = await token_client.get(
+        "/whoami", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status == 401
+    assert await response.json() == {"error": "The token is not a valid JWT"}
+
+
+async def test_middleware_requires_the_role(token_client):
+    response = await token_client.get(
+        "/whoami",
+        headers={
+            "Authorization": f"Bearer {sign(claims(realm_access=dict(roles=[])))}"
+        },
+    )
+    assert response.status == 403
@@ -0,0 +1,217 @@
+import pytest
+
+from dogtraining.server import bulk
+from dogtraining.server.bulk import read_entries, write_entries
+from dogtraining.server.offload import Offloader
+from dogtraining.server.training_database import ImportFailed, InvalidPayload
+
+
+async def _lines(*lines):
+    for line in lines:
+        yield line
+
+
+async def _collect(entries):
+    return [entry async for entry in entries]
+
+
+async def test_read_csv_entries_converts_integer_columns():
+    entries = read_entries(
+        _lines(b"id,registration_time,name\n", b'd-0,1,"Rex, Jr"\n', b"\n"),
+        kind="dogs",
+        format="csv",
+    )
+
+    assert await _collect(entries) == [
+        {"id": "d-0", "registration_time": 1, "name": "Rex, Jr"}
+    ]
+
+
+async def test_read_ndjson_entries_fails_on_invalid_json():
+    with pytest.raises(InvalidPayload, match="The line is not valid JSON"):
+        await _collect(read_entries(_lines(b"{\n"), kind="dogs", format="ndjson"))
+
+
+async def test_read_csv_entries_fails_on_invalid_utf8():
+    with pytest.raises(InvalidPayload, match="The line is not valid UTF-8"):
+        await _collect(
+            read_entries(
+                _lines(b"id,registration_time,name\n", b"d-0,1,R\xe9x\n"),
+                kind="dogs",
+                format="csv",
+            )
+        )
+
+
+@pytest.mark.parametrize("registration_time", ["abc", "²", "--1"])
+async def test_read_csv_entries_fails_on_invalid_integers(registration_time):
+    with pytest.raises(
+        InvalidPayload, match="The column registration_time has to be an int"
+    ):
+        await _collect(
+            read_entries(
+                _lines(
+                    b"id,registration_time,name\n",
+                    f"d-0,{registration_time},Rex\n".encode(),
+                ),
+                kind="dogs",
+                format="csv",
+            )
+        )
+
+
+@pytest.mark.parametrize("entry_id", [1, ["d-0"], {"id": "d-0"}])
+async def test_import_fails_for_ids_that_are_not_strings(
+    training_database, user_id, entry_id
+):
+    entry = {"id": entry_id, "registration_time": 1, "name": "Rex"}
+
+    with pytest.raises(ImportFailed, match="The id has to be a string"):
+        await training_database.import_entries(
+            kind="dogs", entries=_lines(entry), user_id=user_id
+        )
+
+    assert await training_database.get_all_dogs(user_id=user_id) == []
+
+
+@pytest.mark.parametrize("bulk_format", ["csv", "ndjson"])
+async def test_import_and_export_round_trip(training_database, user_id, bulk_format):
+    dogs = [
+        {"id": f"d-{i}", "registration_time": i + 1, "name": "Rex"} for i in range(3)
+    ]
+    cards = [{"id": "c-0", "timestamp": 1, "cost": 10, "slots": 5}]
+    trainings = [
+        {
+            "id": f"t-{i}",
+            "timestamp": i + 1,
+            "type": "querbeet",
+            "dog_id": f"d-{i}",
+            "card_id": "c-0",
+        }
+        for i in range(3)
+    ]
+    for kind, entries in [("dogs", dogs), ("cards", cards), ("trainings", trainings)]:
+        exported = b"".join(
+            await _collect(
+                write_entries(_lines(*entries), kind=kind, format=bulk_format)
+            )
+        )
+        imported = await training_database.import_entries(
+            kind=kind,
+            entries=read_entries(
+                _lines(*exported.splitlines(keepends=True)),
+                kind=kind,
+                format=bulk_format,
+            ),
+            user_id=user_id,
+            chunk_size=2,
+        )
+
+        assert imported == len(entries)
+        assert (
+            await _collect(training_database.export_entries(kind=kind, user_id=user_id))
+            == entries
+        )
+    card = await training_database.get_card_entry_by_id(card_id="c-0", user_id=user_id)
+    assert card.remaining_slots == 2
+
+
+async def test_import_commits_chunks_and_resumes(training_database, user_id):
+    entries = [
+        {"timestamp": 1, "cost": 1, "slots": 1},
+        {"timestamp": 2, "cost": 1, "slots": 1},
+        {"timestamp": 3, "cost": 1, "slots": "some"},
+        {"timestamp": 4, "cost": 1, "slots": 1},
+    ]
+    with pytest.raises(ImportFailed, match="The entry 3 is invalid") as e:
+        await training_database.import_entries(
+            kind="cards", entries=_lines(*entries), user_id=user_id, chunk_size=2
+        )
+    assert e.value.imported == 2
+
+    entries[2]["slots"] = 1
+    imported = await training_database.import_entries(
+        kind="cards",
+        entries=_lines(*entries),
+        user_id=user_id,
+        skip=e.value.imported,
+        chunk_size=2,
+    )
+
+    assert imported == 4
+    cards = await training_database.get_all_card_entries(user_id=user_id)
+    assert [card.timestamp for card in cards] == [1, 2, 3, 4]
+
+
+async def test_import_trainings_fails_for_foreign_or_overbooked_cards(
+    training_database, create_card_entry, create_dog_entry, user_id
+):
+    card = await create_card_entry()
+    dog = await create_dog_entry()
+    training = {"timestamp": 1, "type": "querbeet", "dog_id": dog.id}
+
+    with pytest.raises(ImportFailed, match="do not exist"):
+        await training_database.import_entries(
+            kind="trainings",
+            entries=_lines(dict(training, card_id="some")),
+            user_id=user_id,
+        )
+    with pytest.raises(ImportFailed, match="have more trainings than slots"):
+        await training_database.import_entries(
+            kind="trainings",
+            entries=_lines(*[dict(training, card_id=card.id)] * 2),
+            user_id=user_id,
+        )
+
+    assert await training_database.get_all_training_entries(user_id=user_id) == []
+
+
+@pytest.mark.parametrize("taken_id", ["d-0", "d-1", "d-2"])
+async def test_import_fails_for_taken_ids_without_naming_them(
+    training_database, user_id, taken_id
+):
+    def dog(dog_id):
+        return {"id": dog_id, "registration_time": 1, "name": "Rex"}
+
+    await training_database.import_entries(
+        kind="dogs", entries=_lines(dog("d-0")), user_id="other"
+    )
+    await training_database.import_entries(
+        kind="dogs", entries=_lines(dog("d-1")), user_id=user_id
+    )
+
+    with pytest.raises(ImportFailed) as e:
+        await training_database.import_entries(
+            kind="dogs",
+            entries=_lines(dog("d-3"), dog("d-4"), dog(taken_id), dog("d-2")),
+            user_id=user_id,
+            chunk_size=2,
+        )
+
+    assert str(e.value) == "The ids of the entries after entry 2 are already taken"
+    assert e.value.imported == 2
+    dogs = await training_database.get_all_dogs(user_id=user_id)
+    assert [dog.id for dog in dogs] == ["d-1", "d-3", "d-4"]
+
+
+@pytest.mark.parametrize("bulk_format", ["csv", "ndjson"])
+async def test_write_entries_in_batches_on_a_thread_pool(monkeypatch, bulk_format):
+    monkeypatch.setattr(bulk, "WRITE_BATCH_SIZE", 2)
+    entries = [
+        {"id": f"d-{i}", "registration_time": i + 1, "name": "Rex"} for i in range(5)
+    ]
+    offloader = Offloader.with_threads(workers=1)
+    try:
+        chunks = await _collect(
+            write_entries(
+                _lines(*entries), kind="dogs", format=bulk_format, offloader=offloader
+            )
+        )
+    finally:
+        offloader.shutdown()
+    inline = await _collect(
+        write_entries(_lines(*entries), kind="dogs", format=bulk_format)
+    )
+
+    assert b"".join(chunks) == b"".join(inline)
+    assert len([chunk for chunk in chunks if chunk]) >= 3
@@ -0,0 +1,261 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from dogtraining.server.cache import MemoryCache, RedisCache, cache_key, version_of
+from dogtraining.server.engine import EngineSettings
+from dogtraining.server.training_database import TrainingDatabase
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    unit_of_work,
+    user_authentication,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key, (None,))[0]
+
+    async def set(self, key, value, *, ex):
+        self.entries[key] = (value, ex)
+
+    async def eval(self, script, numkeys, key, version, value, ex):
+        current = await self.get(key)
+        if current is None or version_of(current) < version:
+            await self.set(key, value, ex=ex)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return MemoryCache()
+    return RedisCache(FakeRedis())
+
+
+@pytest.fixture
+async def cached_database(init_db, connection, cache):
+    return TrainingDatabase(connection=connection, cache=cache)
+
+
+@pytest.fixture
+async def client(aiohttp_client, cached_database):
+    training_handler = TrainingHandler(training_database=cached_database)
+    app = web.Application(middlewares=[user_authentication, unit_of_work])
+    app["training_database"] = cached_database
+    app.add_routes(
+        [
+            web.get("/cards", training_handler.get_all_cards),
+            web.post("/cards", training_handler.create_card_entry),
+            web.post("/trainings", training_handler.create_training_entry),
+            web.get("/dogs", training_handler.get_all_dogs),
+            web.post("/dogs", training_handler.create_dog_entry),
+            web.get("/training_types", training_handler.get_all_training_types),
+        ]
+    )
+    return await aiohttp_client(app)
+
+
+async def test_memory_cache_evicts_least_recently_used_and_expired_entries():
+    now = [0.0]
+    cache = MemoryCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    await cache.set("a", b"a")
+    await cache.set("b", b"b")
+    await cache.get("a")
+    await cache.set("c", b"c")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"a"
+
+    now[0] = 10
+    assert await cache.get("a") is None
+    assert await cache.get("c") is None
+
+
+async def test_memory_cache_evicts_least_recently_used_entries_over_maxbytes():
+    cache = MemoryCache(maxbytes=10)
+    await cache.set("a", b"aaaa")
+    await cache.set("b", b"bbbb")
+    await cache.get("a")
+    await cache.set("c", b"cccc")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"aaaa"
+    assert await cache.get("c") == b"cccc"
+
+    await cache.set("a", b"a")
+    await cache.set("b", b"bbbbb")
+    assert [await cache.get(key) for key in "abc"] == [b"a", b"bbbbb", b"cccc"]
+
+    await cache.set("c", b"c" * 11)
+    assert await cache.get("c") is None
+    assert await cache.get("a") == b"a"
+    assert await cache.get("b") == b"bbbbb"
+
+
+async def test_repeated_polls_are_answered_without_the_database(
+    client, cached_database, user_id
+):
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    assert response.status == 200
+    etag = response.headers["ETag"]
+    checkouts = cached_database.pool_metrics.checkouts
+
+    response = await client.get(
+        "/dogs", headers={"user_id": user_id, "If-None-Match": etag}
+    )
+    assert response.status == 304
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    assert response.status == 200
+    assert await response.json() == []
+    assert cached_database.pool_metrics.checkouts == checkouts
+
+
+async def test_create_methods_invalidate_the_cache_of_the_user(
+    client, cached_database, cache, user_id
+):
+    other_key = cache_key("other", "revision")
+    await cache.set(other_key, b"7 1")
+    for path in ("/dogs", "/cards"):
+        await client.get(path, headers={"user_id": user_id})
+    assert await cache.get(cache_key(user_id, "dogs:0")) == b"[]"
+
+    response = await client.post(
+        "/dogs",
+        json={"registration_time": 1, "name": "Rex"},
+        headers={"user_id": user_id},
+    )
+    dog = await response.json()
+    assert version_of(await cache.get(cache_key(user_id, "revision"))) == 1
+    assert await cache.get(other_key) == b"7 1"
+
+    await client.post(
+        "/cards",
+        json={"timestamp": 1, "cost": 1, "slots": 1},
+        headers={"user_id": user_id},
+    )
+    response = await client.get("/cards", headers={"user_id": user_id})
+    (card,) = await response.json()
+    assert card["remaining_slots"] == 1
+
+    await client.post(
+        "/trainings",
+        json={"timestamp": 1, "type": "querbeet", "dogs": [dog["id"]]},
+        headers={"user_id": user_id},
+    )
+    response = await client.get("/cards", headers={"user_id": user_id})
+    (card,) = await response.json()
+    assert card["remaining_slots"] == 0
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    assert [dog["name"] for dog in await response.json()] == ["Rex"]
+
+
+async def test_failed_write_does_not_invalidate_the_cache(client, cache, user_id):
+    await client.get("/cards", headers={"user_id": user_id})
+
+    response = await client.post(
+        "/trainings",
+        json={"timestamp": 1, "type": "querbeet", "dogs": ["some"]},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 400
+    assert await cache.get(cache_key(user_id, "revision")) is not None
+
+
+async def test_cached_revisions_only_move_forward(cache):
+    await cache.set_newer("key", b"2 20")
+    await cache.set_newer("key", b"1 10")
+    assert await cache.get("key") == b"2 20"
+
+    await cache.set_newer("key", b"3 30")
+    assert await cache.get("key") == b"3 30"
+
+
+async def test_cold_reads_use_the_connection_of_the_request(
+    aiohttp_client, init_db, connection, cache, user_id
+):
+    training_database = TrainingDatabase(
+        connection=connection,
+        cache=cache,
+        engine_settings=EngineSettings(pool_size=1, max_overflow=0, pool_timeout=1),
+    )
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(middlewares=[user_authentication, unit_of_work])
+    app["training_database"] = training_database
+    app.add_routes(
+        [
+            web.get("/dogs", training_handler.get_all_dogs),
+            web.post("/dogs", training_handler.create_dog_entry),
+        ]
+    )
+    client = await aiohttp_client(app)
+
+    response = await client.post(
+        "/dogs",
+        json={"registration_time": 1, "name": "Rex"},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    responses = await asyncio.gather(
+        *[
+            client.get("/dogs", headers={"user_id": f"user-{index}"})
+            for index in range(3)
+        ],
+        client.get("/dogs", headers={"user_id": user_id}),
+    )
+
+    assert [response.status for response in responses] == [200] * 4
+    assert [dog["name"] for dog in await responses[-1].json()] == ["Rex"]
+    assert training_database.pool_metrics.max_in_use == 1
+
+
+@pytest.mark.parametrize("method, name", [("set_newer", "revision"), ("set", "dogs")])
+async def test_write_during_a_slow_read_does_not_leave_a_stale_cache_entry(
+    client, cache, user_id, method, name
+):
+    paused, resume = asyncio.Event(), asyncio.Event()
+    cache_set = getattr(cache, method)
+
+    async def slow_set(key, value):
+        if key.startswith(cache_key(user_id, name)) and not paused.is_set():
+            paused.set()
+            await resume.wait()
+        await cache_set(key, value)
+
+    setattr(cache, method, slow_set)
+    slow_read = asyncio.create_task(client.get("/dogs", headers={"user_id": user_id}))
+    await asyncio.wait_for(paused.wait(), timeout=5)
+    response = await client.post(
+        "/dogs",
+        json={"registration_time": 1, "name": "Rex"},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    resume.set()
+    assert await (await slow_read).json() == []
+
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    assert [dog["name"] for dog in await response.json()] == ["Rex"]
+    response = await client.get(
+        "/dogs",
+        headers={"user_id": user_id, "If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status == 304
+
+
+async def test_get_all_training_types_supports_etags(client, user_id):
+    response = await client.get("/training_types", headers={"user_id": user_id})
+    assert response.status == 200
+
+    response = await client.get(
+        "/training_types",
+        headers={"user_id": user_id, "If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status == 304
@@ -0,0 +1,96 @@
+import pytest
+from aiohttp import web
+
+from dogtraining.server.cors import Cors
+from dogtraining.server.training_handler import (
+    add_cors_headers,
+    cors_handler,
+    unit_of_work,
+    user_authentication,
+)
+
+
+@pytest.fixture
+def cors():
+    return Cors(["http://localhost:5173", "https://*.dogtraining.example"], max_age=600)
+
+
+@pytest.mark.parametrize(
+    "origin, allowed",
+    [
+        ("http://localhost:5173", True),
+        ("https://preview-12.dogtraining.example", True),
+        ("https://dogtraining.example", False),
+        ("https://evil.example/.dogtraining.example", False),
+        ("http://localhost:5174", False),
+        (None, False),
+    ],
+)
+def test_origins_are_matched(cors, origin, allowed):
+    assert (cors.response_headers(origin) is not None) == allowed
+
+
+def test_any_origin_is_allowed_with_a_star():
+    assert Cors(["*"]).response_headers("https://anywhere.example") == {
+        "Access-Control-Allow-Origin": "https://anywhere.example",
+        "Vary": "Origin",
+    }
+
+
+@pytest.fixture
+async def cors_client(aiohttp_client, training_database, cors):
+    async def get_dogs(request):
+        return web.json_response([])
+
+    app = web.Application(middlewares=[cors_handler, user_authentication, unit_of_work])
+    app["cors"] = cors
+    app["training_database"] = training_database
+    app.on_response_prepare.append(add_cors_headers)
+    app.add_routes([web.get("/dogs", get_dogs)])
+    return await aiohttp_client(app)
+
+
+async def test_preflight_is_answered_before_authentication(cors_client):
+    response = await cors_client.options(
+        "/dogs",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "GET",
+            "Access-Control-Request-Headers": "user_id",
+        },
+    )
+
+    assert response.status == 204
+    assert response.headers["Access-Control-Allow-Origin"] == "http://localhost:5173"
+    assert response.headers["Access-Control-Max-Age"] == "600"
+    assert "user_id" in response.headers["Access-Control-Allow-Headers"]
+
+
+async def test_preflight_from_an_unknown_origin_is_rejected(cors_client):
+    response = await cors_client.options(
+        "/dogs",
+        headers={
+            "Origin": "https://evil.example",
+            "Access-Control-Request-Method": "GET",
+        },
+    )
+
+    assert response.status == 403
+    assert "Access-Control-Allow-Origin" not in response.headers
+
+
+async def test_responses_carry_the_origin(cors_client, user_id):
+    response = await cors_client.get(
+        "/dogs",
+        headers={"Origin": "https://a.dogtraining.example", "user_id": user_id},
+    )
+
+    assert response.status == 200
+    assert (
+        response.headers["Access-Control-Allow-Origin"]
+        == "https://a.dogtraining.example"
+    )
+    assert response.headers.getall("Vary") == ["Origin"]
+
+    response = await cors_client.get("/dogs", headers={"user_id": user_id})
+    assert "Access-Control-Allow-Origin" not in response.headers
@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from dogtraining.server.engine import EngineSettings, _postgres_connect
+from dogtraining.server.training_database import TrainingDatabase
+
+
+@pytest.fixture
+def engine_settings():
+    return EngineSettings(
+        pool_size=2,
+        max_overflow=1,
+        sqlite_busy_timeout=1234,
+        sqlite_cache_size=-1000,
+    )
+
+
+@pytest.fixture
+async def configured_training_database(init_db, connection, engine_settings):
+    return TrainingDatabase(connection=connection, engine_settings=engine_settings)
+
+
+@pytest.mark.parametrize(
+    "pragma, expected",
+    [
+        ("journal_mode", "wal"),
+        ("synchronous", 1),
+        ("busy_timeout", 1234),
+        ("cache_size", -1000),
+    ],
+)
+async def test_sqlite_pragmas_are_applied_on_connect(
+    configured_training_database, pragma, expected
+):
+    async with configured_training_database.engine.connect() as conn:
+        assert await conn.scalar(text(f"PRAGMA {pragma}")) == expected
+
+
+def test_postgres_statement_timeout_is_set_outside_of_a_transaction():
+    class Connection:
+        autocommit = False
+        executed = []
+
+        def cursor(self):
+            return self
+
+        def execute(self, statement):
+            self.executed.append((statement, self.autocommit))
+
+        def close(self):
+            pass
+
+    dbapi_connection = Connection()
+    connect = _postgres_connect(settings=EngineSettings(statement_timeout=5000))
+
+    connect(dbapi_connection, None)
+
+    assert dbapi_connection.executed == [("SET statement_timeout = 5000", True)]
+    assert dbapi_connection.autocommit is False
+
+
+async def test_pool_status_counts_checkouts(configured_training_database, user_id):
+    await configured_training_database.get_all_dogs(user_id=user_id)
+    await configured_training_database.get_all_dogs(user_id=user_id)
+
+    pool_status = configured_training_database.pool_status()
+
+    assert pool_status["checkouts"] == 2
+    assert pool_status["in_use"] == 0
+    assert pool_status["max_in_use"] == 1
+    assert pool_status["checked_out"] == 0
+    assert pool_status["size"] == 2
+    assert pool_status["checkout_wait_seconds_total"] > 0
+
+
+async def test_in_memory_database_uses_default_pool():
+    training_database = TrainingDatabase(connection="sqlite+aiosqlite://")
+
+    assert "size" not in training_database.pool_status()
+
+
+async def test_slow_queries_are_logged_without_parameters(init_db, connection, caplog):
+    training_database = TrainingDatabase(
+        connection=connection, engine_settings=EngineSettings(slow_query_ms=0)
+    )
+
+    with caplog.at_level(logging.WARNING, logger="dogtraining.server.engine"):
+        await training_database.get_all_dogs(user_id="secret-user")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("FROM dog" in message for message in messages)
+    assert any("1 redacted parameters" in message for message in messages)
+    assert not any("secret-user" in message for message in messages)
+    assert training_database.query_stats.count >= 2
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+from dogtraining.server.index_advisor import find_table_scans
+
+
+async def test_find_table_scans_of_indexed_database(
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id])
+
+    assert await find_table_scans(training_database, user_id=user_id) == []
+
+
+async def test_find_table_scans_reports_missing_index(
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id])
+    async with training_database.engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_dog_user_registration_time"))
+
+    table_scans = await find_table_scans(training_database, user_id=user_id)
+
+    assert {table_scan.plan for table_scan in table_scans} == {"SCAN dog"}
+    assert all("FROM dog" in table_scan.statement for table_scan in table_scans)
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from dogtraining.server.loop_lag import LoopLagMetrics, loop_lag_ctx
+from dogtraining.server.training_handler import TrainingHandler
+
+
+def test_loop_lag_metrics_percentiles():
+    metrics = LoopLagMetrics()
+    for lag in range(100):
+        metrics.record(lag / 1000)
+
+    assert metrics.as_dict() == dict(
+        samples=100, lag_seconds_p50=0.05, lag_seconds_p99=0.099, lag_seconds_max=0.099
+    )
+
+
+async def test_loop_lag_is_reported_while_the_loop_is_blocked(
+    aiohttp_client, training_database
+):
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application()
+    app["loop_lag"] = LoopLagMetrics(interval=0.01)
+    app.cleanup_ctx.append(loop_lag_ctx)
+    app.add_routes([web.get("/metrics/loop", training_handler.get_loop_lag)])
+    client = await aiohttp_client(app)
+
+    await asyncio.sleep(0.05)
+    time.sleep(0.1)
+    await asyncio.sleep(0.05)
+    response = await client.get("/metrics/loop")
+
+    assert response.status == 200
+    loop_lag = await response.json()
+    assert loop_lag["samples"] > 0
+    assert loop_lag["lag_seconds_max"] >= 0.05
@@ -0,0 +1,113 @@
+import pytest
+from aiohttp import web
+
+from dogtraining.server.loop_lag import LoopLagMetrics
+from dogtraining.server.metrics import Histogram, Metrics
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    collect_metrics,
+    unit_of_work,
+    user_authentication,
+)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram.with_buckets((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert list(histogram.samples("latency", {"route": "/"})) == [
+        ("latency_bucket", {"route": "/", "le": "0.1"}, 2),
+        ("latency_bucket", {"route": "/", "le": "1.0"}, 3),
+        ("latency_bucket", {"route": "/", "le": "+Inf"}, 4),
+        ("latency_sum", {"route": "/"}, 2.65),
+        ("latency_count", {"route": "/"}, 4),
+    ]
+
+
+@pytest.fixture
+async def metrics_client(aiohttp_client, training_database):
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(
+        middlewares=[collect_metrics, user_authentication, unit_of_work]
+    )
+    app["training_database"] = training_database
+    app["metrics"] = Metrics()
+    app["loop_lag"] = LoopLagMetrics()
+    app.add_routes(
+        [
+            web.get("/cards", training_handler.get_all_cards),
+            web.get("/cards/{id}", training_handler.get_card_by_id),
+            web.post("/cards", training_handler.create_card_entry),
+            web.get("/metrics", training_handler.get_metrics),
+        ]
+    )
+    return await aiohttp_client(app)
+
+
+async def scrape(client):
+    response = await client.get("/metrics")
+    assert response.status == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in (await response.text()).splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+async def test_metrics_per_route_and_status(metrics_client, user_id):
+    headers = {"user_id": user_id}
+    response = await metrics_client.post(
+        "/cards", json={"timestamp": 1, "cost": 1, "slots": 1}, headers=headers
+    )
+    card = await response.json()
+    await metrics_client.get(f"/cards/{card['id']}", headers=headers)
+    await metrics_client.get("/cards")
+    await metrics_client.get("/missing", headers=headers)
+
+    samples = await scrape(metrics_client)
+
+    assert (
+        samples[
+            'dogtraining_http_requests_total{method="GET",route="/cards/{id}",status="200"}'
+        ]
+        == 1
+    )
+    assert (
+        samples[
+            'dogtraining_http_requests_total{method="GET",route="/cards",status="401"}'
+        ]
+        == 1
+    )
+    assert (
+        samples[
+            'dogtraining_http_requests_total{method="GET",route="unmatched",status="404"}'
+        ]
+        == 1
+    )
+    assert (
+        samples[
+            'dogtraining_http_request_duration_seconds_bucket{method="POST",route="/cards",status="200",le="+Inf"}'
+        ]
+        == 1
+    )
+    assert (
+        samples[
+            'dogtraining_http_request_db_queries_count{method="POST",route="/cards"}'
+        ]
+        == 1
+    )
+    assert (
+        samples['dogtraining_http_request_db_queries_sum{method="POST",route="/cards"}']
+        >= 1
+    )
+    assert (
+        samples['dogtraining_http_request_db_queries_sum{method="GET",route="/cards"}']
+        == 0
+    )
+    assert samples["dogtraining_db_queries_total"] >= 2
+    assert samples["dogtraining_http_requests_in_flight"] == 1
+    assert samples["dogtraining_db_pool_checkouts_total"] >= 2
+    assert "dogtraining_event_loop_lag_seconds_max" in samples
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from dogtraining.server.migrations import (
+    MIGRATIONS,
+    backfill_card_slots,
+    find_inconsistent_cards,
+    schema_version,
+    upgrade,
+)
+from dogtraining.server.models import Card, UserStatistic
+
+
+@pytest.fixture
+def engine(connection):
+    return create_async_engine(connection)
+
+
+@pytest.fixture
+async def legacy_database(engine):
+    async with engine.begin() as conn:
+        for statement in [
+            "CREATE TABLE card (id VARCHAR NOT NULL PRIMARY KEY, timestamp INTEGER NOT NULL, cost INTEGER NOT NULL, slots INTEGER NOT NULL, user_id VARCHAR NOT NULL)",
+            "CREATE TABLE dog (id VARCHAR NOT NULL PRIMARY KEY, registration_time INTEGER NOT NULL, name VARCHAR NOT NULL, user_id VARCHAR NOT NULL)",
+            "CREATE TABLE training (id VARCHAR NOT NULL PRIMARY KEY, timestamp INTEGER NOT NULL, type VARCHAR NOT NULL, user_id VARCHAR NOT NULL, card_id VARCHAR NOT NULL REFERENCES card (id), dog_id VARCHAR NOT NULL REFERENCES dog (id))",
+            "INSERT INTO card VALUES ('card-0', 1, 10, 3, 'thie')",
+            "INSERT INTO card VALUES ('card-1', 2, 10, 2, 'thie')",
+            "INSERT INTO dog VALUES ('dog-0', 1, 'test', 'thie')",
+            "INSERT INTO training VALUES ('training-0', 1, 'querbeet', 'thie', 'card-0', 'dog-0')",
+            "INSERT INTO training VALUES ('training-1', 1, 'querbeet', 'thie', 'card-0', 'dog-0')",
+        ]:
+            await conn.execute(text(statement))
+
+
+async def test_upgrade_creates_new_database(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        version = await conn.scalar(select(schema_version.c.version))
+        tables = await conn.run_sync(lambda conn: inspect(conn).get_table_names())
+
+    assert version == len(MIGRATIONS)
+    assert {"card", "dog", "training"} <= set(tables)
+
+
+async def test_upgrade_backfills_remaining_slots_of_legacy_database(
+    engine,
+    legacy_database,
+):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        remaining_slots = dict(
+            (await conn.execute(select(Card.id, Card.remaining_slots))).tuples().all()
+        )
+        indexes = await conn.run_sync(lambda conn: inspect(conn).get_indexes("card"))
+
+    assert remaining_slots == {"card-0": 1, "card-1": 2}
+    assert "ix_card_open_slots" in {index["name"] for index in indexes}
+
+
+async def test_upgrade_twice_does_not_apply_migrations_again(engine, legacy_database):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        await conn.run_sync(upgrade)
+        versions = (await conn.execute(select(schema_version.c.version))).all()
+
+    assert len(versions) == len(MIGRATIONS)
+
+
+async def test_find_inconsistent_cards_and_repair(engine, legacy_database):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        await conn.execute(
+            update(Card).where(Card.id == "card-0").values(remaining_slots=3)
+        )
+
+        assert await conn.run_sync(find_inconsistent_cards) == [("card-0", 3, 1)]
+
+        await conn.run_sync(backfill_card_slots)
+
+        assert await conn.run_sync(find_inconsistent_cards) == []
+
+
+async def test_booking_keeps_remaining_slots_consistent(
+    engine,
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+):
+    await create_card_entry()
+    await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id, dog.id])
+
+    async with engine.begin() as conn:
+        assert await conn.run_sync(find_inconsistent_cards) == []
+        assert (await conn.execute(select(Card.remaining_slots))).scalars().all() == [
+            0,
+            0,
+        ]
+
+
+async def test_upgrade_builds_statistics_of_legacy_database(engine, legacy_database):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+        total = (
+            await conn.execute(
+                select(UserStatistic).where(UserStatistic.dimension == "total")
+            )
+        ).one()
+
+    assert (total.trainings, total.cards, total.spend, total.slots) == (2, 2, 20, 5)
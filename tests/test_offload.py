@@ -0,0 +1,76 @@
+import threading
+
+from aiohttp import web
+
+from dogtraining.server.offload import Offloader
+from dogtraining.server.serialization import loads
+from dogtraining.server.training_handler import TrainingHandler, user_authentication
+
+
+def serialize_with_thread(threads):
+    def serialize(entry):
+        threads.add(threading.current_thread().name)
+        return entry
+
+    return serialize
+
+
+async def test_dump_entries_below_threshold_stays_on_the_loop():
+    offloader = Offloader.with_threads(workers=1, threshold=3)
+    threads = set()
+    try:
+        body = await offloader.dump_entries([1, 2], serialize_with_thread(threads))
+    finally:
+        offloader.shutdown()
+
+    assert loads(body) == [1, 2]
+    assert threads == {threading.current_thread().name}
+
+
+async def test_dump_entries_above_threshold_runs_on_the_pool():
+    offloader = Offloader.with_threads(workers=1, threshold=3)
+    threads = set()
+    try:
+        body = await offloader.dump_entries([1, 2, 3], serialize_with_thread(threads))
+    finally:
+        offloader.shutdown()
+
+    assert loads(body) == [1, 2, 3]
+    assert len(threads) == 1
+    assert threads.pop().startswith("dogtraining-offload")
+
+
+async def test_offloaded_lists_match_inline_lists(
+    aiohttp_client,
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+    user_id,
+):
+    await create_card_entry()
+    await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id, dog.id])
+    offloader = Offloader.with_threads(workers=1, threshold=1)
+    bodies = []
+    for handler_offloader in (None, offloader):
+        training_handler = TrainingHandler(
+            training_database=training_database, offloader=handler_offloader
+        )
+        app = web.Application(middlewares=[user_authentication])
+        app.add_routes(
+            [
+                web.get("/trainings", training_handler.get_all_trainings),
+                web.get("/cards", training_handler.get_all_cards),
+                web.get("/dogs", training_handler.get_all_dogs),
+            ]
+        )
+        client = await aiohttp_client(app)
+        for path in ("/trainings", "/cards?limit=1", "/dogs"):
+            response = await client.get(path, headers={"user_id": user_id})
+            assert response.status == 200
+            bodies.append(await response.read())
+    offloader.shutdown()
+
+    assert bodies[:3] == bodies[3:]
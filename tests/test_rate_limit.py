@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from dogtraining.server.rate_limit import (
+    MemoryTokenBuckets,
+    RateLimited,
+    RedisTokenBuckets,
+    WriteLimiter,
+    rate_limit_key,
+)
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    limit_writes,
+    unit_of_work,
+    user_authentication,
+)
+
+
+class FakeRedis:
+    def __init__(self, wait, *, latency=0):
+        self.wait = wait
+        self.latency = latency
+        self.calls = []
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append((numkeys, *args))
+        await asyncio.sleep(self.latency)
+        return self.wait
+
+
+@pytest.fixture
+def now():
+    return [0.0]
+
+
+@pytest.fixture
+async def client(aiohttp_client, training_database, now):
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(middlewares=[user_authentication, limit_writes, unit_of_work])
+    app["training_database"] = training_database
+    app["write_limiter"] = WriteLimiter(
+        MemoryTokenBuckets(rate=1, burst=2, clock=lambda: now[0])
+    )
+    app.add_routes(
+        [
+            web.get("/dogs", training_handler.get_all_dogs),
+            web.post("/dogs", training_handler.create_dog_entry),
+        ]
+    )
+    return await aiohttp_client(app)
+
+
+async def test_memory_buckets_allow_a_burst_and_then_the_rate():
+    now = [0.0]
+    buckets = MemoryTokenBuckets(rate=2, burst=3, clock=lambda: now[0])
+
+    assert [await buckets.take("a") for _ in range(4)] == [0, 0, 0, 0.5]
+    assert await buckets.take("b") == 0
+
+    now[0] = 0.5
+    assert await buckets.take("a") == 0
+    assert await buckets.take("a") == 0.5
+
+    now[0] = 100
+    assert [await buckets.take("a") for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+async def test_memory_buckets_forget_the_least_recently_used_keys():
+    buckets = MemoryTokenBuckets(rate=1, burst=1, maxsize=2, clock=lambda: 0.0)
+    await buckets.take("a")
+    await buckets.take("b")
+    await buckets.take("c")
+
+    assert await buckets.take("a") == 0
+    assert await buckets.take("c") == 1
+
+
+async def test_redis_buckets_take_a_token_in_one_script_call():
+    redis = FakeRedis(b"0.25")
+    buckets = RedisTokenBuckets(redis, rate=4, burst=8)
+
+    assert await buckets.take("key") == 0.25
+    assert redis.calls == [(1, "key", 4, 8)]
+
+
+async def test_write_limiter_caps_the_concurrent_writes_of_a_user():
+    write_limiter = WriteLimiter(None, max_concurrent=2)
+    release = asyncio.Event()
+    running = []
+
+    async def write():
+        async with write_limiter.limit("user"):
+            running.append(1)
+            await release.wait()
+
+    tasks = [asyncio.create_task(write()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert len(running) == 2
+
+    with pytest.raises(RateLimited) as e:
+        async with write_limiter.limit("user"):
+            pass
+    assert e.value.retry_after == 1
+    async with write_limiter.limit("other"):
+        pass
+
+    release.set()
+    await asyncio.gather(*tasks)
+    async with write_limiter.limit("user"):
+        pass
+
+
+async def test_write_limiter_reserves_a_slot_before_awaiting_the_buckets():
+    write_limiter = WriteLimiter(
+        RedisTokenBuckets(FakeRedis(b"0", latency=0.01)), max_concurrent=2
+    )
+    release = asyncio.Event()
+    running = [0]
+    peak = [0]
+
+    async def write():
+        async with write_limiter.limit("user"):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await release.wait()
+            running[0] -= 1
+
+    tasks = [asyncio.create_task(write()) for _ in range(10)]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert peak[0] == 2
+    assert sum(isinstance(result, RateLimited) for result in results) == 8
+
+
+async def test_write_limiter_releases_the_slot_when_the_buckets_reject():
+    write_limiter = WriteLimiter(RedisTokenBuckets(FakeRedis("1.5")), max_concurrent=1)
+
+    for _ in range(2):
+        with pytest.raises(RateLimited, match="too fast"):
+            async with write_limiter.limit("user"):
+                pass
+
+
+async def test_write_limiter_checks_the_buckets_of_the_user():
+    redis = FakeRedis("1.5")
+    write_limiter = WriteLimiter(RedisTokenBuckets(redis))
+
+    with pytest.raises(RateLimited) as e:
+        async with write_limiter.limit("user"):
+            pass
+    assert e.value.retry_after == 1.5
+    assert redis.calls[0][1] == rate_limit_key("user")
+
+
+async def test_writes_over_the_rate_are_answered_with_429(client, user_id, now):
+    async def create_dog():
+        return await client.post(
+            "/dogs",
+            json={"registration_time": 1, "name": "Rex"},
+            headers={"user_id": user_id},
+        )
+
+    assert [(await create_dog()).status for _ in range(2)] == [200, 200]
+    response = await create_dog()
+    assert response.status == 429
+    assert response.headers["Retry-After"] == "1"
+    assert "too fast" in (await response.json())["error"]
+
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    assert len(await response.json()) == 2
+    response = await client.post(
+        "/dogs",
+        json={"registration_time": 1, "name": "Rex"},
+        headers={"user_id": "other"},
+    )
+    assert response.status == 200
+
+    now[0] = 1
+    assert (await create_dog()).status == 200
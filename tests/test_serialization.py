@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from dogtraining.server import serialization
+from dogtraining.server.serialization import (
+    SERIALIZERS,
+    dumps,
+    json_response,
+    use_serializer,
+)
+
+
+@pytest.fixture
+def stdlib_serializer():
+    previous = serialization._dumps
+    use_serializer("json")
+    yield
+    serialization._dumps = previous
+
+
+@pytest.mark.parametrize("name", list(SERIALIZERS))
+def test_serializers_encode_the_same_json(name):
+    data = [{"id": "some", "timestamp": 1, "dog": {"name": "test"}}, None, 1.5]
+
+    assert json.loads(SERIALIZERS[name](data)) == data
+
+
+def test_stdlib_serializer_writes_compact_json(stdlib_serializer):
+    assert dumps({"id": "some", "slots": [1, 2]}) == b'{"id":"some","slots":[1,2]}'
+
+
+def test_use_serializer_that_is_not_installed_raises():
+    with pytest.raises(ValueError, match="The serializer some is not installed"):
+        use_serializer("some")
+
+
+def test_json_response(stdlib_serializer):
+    response = json_response(
+        data={"error": "some"}, status=400, headers={"Link": "<some>"}
+    )
+
+    assert response.status == 400
+    assert response.content_type == "application/json"
+    assert response.headers["Link"] == "<some>"
+    assert response.body == b'{"error":"some"}'
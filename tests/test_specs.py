@@ -1,10 +1,15 @@
+import json
 import re
 
 import pytest
 
 from dogtraining.server.training_database import (
+    MAX_TIMESTAMP,
     CardSpec,
     CardSpecInvalid,
+    DogSpec,
+    DogSpecInvalid,
+    InvalidPayload,
     TrainingSpec,
     TrainingSpecInvalid,
     TrainingType,
@@ -230,3 +235,92 @@ def test_create_card_spec_fails_because_of_invalid_user_id(
             cost=1,
             user_id=user_id,
         )
+
+
+@pytest.mark.parametrize("training_type", [list(), dict(), 1])
+def test_create_training_spec_fails_because_of_unhashable_or_non_str_type(
+    training_timestamp,
+    training_dogs,
+    training_type,
+    user_id,
+):
+    with pytest.raises(
+        TrainingSpecInvalid,
+        match=re.escape(f"The training type: {training_type}, is invalid"),
+    ):
+        TrainingSpec(
+            timestamp=training_timestamp,
+            type=training_type,
+            dogs=training_dogs,
+            user_id=user_id,
+        )
+
+
+def test_decode_training_spec_from_bytes(training_dogs, user_id):
+    body = json.dumps(
+        {"timestamp": 1, "type": TrainingType.QUERBEET.value, "dogs": training_dogs}
+    ).encode()
+
+    assert TrainingSpec.from_bytes(body=body, user_id=user_id) == TrainingSpec(
+        timestamp=1,
+        type=TrainingType.QUERBEET,
+        dogs=training_dogs,
+        user_id=user_id,
+    )
+
+
+@pytest.mark.parametrize(
+    "spec, body",
+    [
+        (TrainingSpec, b'{"timestamp": 1, "type": "querbeet"}'),
+        (CardSpec, b'{"timestamp": 1, "cost": 1}'),
+        (DogSpec, b'{"name": "test"}'),
+        (DogSpec, b'["registration_time", "name"]'),
+    ],
+)
+def test_decode_spec_fails_because_of_missing_keys(spec, body, user_id):
+    with pytest.raises(
+        InvalidPayload,
+        match="You have to provide a payload with the following keys",
+    ):
+        spec.from_bytes(body=body, user_id=user_id)
+
+
+@pytest.mark.parametrize("body", [b"", b"{", b"\xff"])
+def test_decode_spec_fails_because_of_invalid_json(body, user_id):
+    with pytest.raises(
+        InvalidPayload, match="The payload has to be a valid JSON object"
+    ):
+        CardSpec.from_bytes(body=body, user_id=user_id)
+
+
+@pytest.mark.parametrize(
+    "spec, error",
+    [
+        (
+            lambda timestamp: TrainingSpec(
+                timestamp=timestamp,
+                type=TrainingType.QUERBEET,
+                dogs=["some-dog"],
+                user_id="thie",
+            ),
+            TrainingSpecInvalid,
+        ),
+        (
+            lambda timestamp: CardSpec(
+                timestamp=timestamp, slots=1, cost=1, user_id="thie"
+            ),
+            CardSpecInvalid,
+        ),
+        (
+            lambda timestamp: DogSpec(
+                registration_time=timestamp, name="test", user_id="thie"
+            ),
+            DogSpecInvalid,
+        ),
+    ],
+)
+def test_spec_fails_because_of_a_timestamp_after_the_last_date(spec, error):
+    spec(MAX_TIMESTAMP)
+    with pytest.raises(error, match=f"can not be after {MAX_TIMESTAMP}"):
+        spec(MAX_TIMESTAMP + 1)
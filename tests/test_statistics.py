@@ -0,0 +1,123 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from dogtraining.server.models import UserStatistic
+from dogtraining.server.statistics import (
+    month_of,
+    rebuild_statistics,
+    statistic_values,
+)
+from dogtraining.server.training_database import (
+    CardSpec,
+    TrainingSpec,
+    TrainingType,
+)
+
+JANUARY = 1704067200000
+FEBRUARY = 1706745600000
+
+
+async def read_statistics(connection):
+    engine = create_async_engine(connection)
+    async with engine.begin() as conn:
+        rows = (await conn.execute(select(UserStatistic))).all()
+    await engine.dispose()
+    return sorted(rows)
+
+
+async def entries(*values):
+    for value in values:
+        yield value
+
+
+def test_month_of_buckets_timestamps_in_utc():
+    assert month_of(JANUARY) == "2024-01"
+    assert month_of(FEBRUARY - 1) == "2024-01"
+    assert month_of(FEBRUARY) == "2024-02"
+
+
+def test_statistic_values_sums_per_dimension(user_id):
+    values = statistic_values(
+        trainings=[
+            (user_id, JANUARY, "querbeet", "dog-0"),
+            (user_id, FEBRUARY, "querbeet", "dog-1"),
+        ],
+        cards=[(user_id, JANUARY, 10, 3)],
+    )
+    by_key = {(value["dimension"], value["key"]): value for value in values}
+
+    assert by_key["total", ""]["trainings"] == 2
+    assert by_key["total", ""]["spend"] == 10
+    assert by_key["month", "2024-01"]["trainings"] == 1
+    assert by_key["month", "2024-01"]["slots"] == 3
+    assert by_key["month", "2024-02"]["cards"] == 0
+    assert by_key["type", "querbeet"]["trainings"] == 2
+    assert by_key["dog", "dog-1"]["trainings"] == 1
+
+
+async def test_incremental_statistics_match_rebuild(
+    training_database, connection, create_dog_entry, user_id
+):
+    dog = await create_dog_entry()
+    await training_database.create_card_entry(
+        card_spec=CardSpec(timestamp=JANUARY, cost=50, slots=3, user_id=user_id)
+    )
+    await training_database.create_training_entries(
+        training_specs=[
+            TrainingSpec(
+                timestamp=timestamp,
+                type=TrainingType.QUERBEET,
+                dogs=[dog.id],
+                user_id=user_id,
+            )
+            for timestamp in (JANUARY, FEBRUARY)
+        ]
+    )
+    await training_database.import_entries(
+        kind="cards",
+        entries=entries({"timestamp": FEBRUARY, "cost": 20, "slots": 2}),
+        user_id=user_id,
+    )
+    await training_database.import_entries(
+        kind="trainings",
+        entries=entries(
+            {
+                "timestamp": FEBRUARY,
+                "type": "alltagsspaziergang",
+                "dog_id": dog.id,
+                "card_id": (
+                    await training_database.get_all_card_entries(user_id=user_id)
+                )[-1].id,
+            }
+        ),
+        user_id=user_id,
+    )
+    incremental = await read_statistics(connection)
+
+    engine = create_async_engine(connection)
+    async with engine.begin() as conn:
+        await conn.run_sync(rebuild_statistics)
+    await engine.dispose()
+
+    assert incremental == await read_statistics(connection)
+    statistics = await training_database.get_statistics(user_id=user_id)
+    assert statistics["total"] == dict(
+        trainings=3, cards=2, spend=70, slots=5, used_slots=3, utilization=0.6
+    )
+    assert statistics["months"] == [
+        dict(month="2024-01", trainings=1, cards=1, spend=50, slots=3),
+        dict(month="2024-02", trainings=2, cards=1, spend=20, slots=2),
+    ]
+    assert statistics["types"] == [
+        dict(type="alltagsspaziergang", trainings=1),
+        dict(type="querbeet", trainings=2),
+    ]
+    assert statistics["dogs"] == [dict(dog_id=dog.id, name=dog.name, trainings=3)]
+
+
+async def test_statistics_without_history(training_database, user_id):
+    statistics = await training_database.get_statistics(user_id=user_id)
+
+    assert statistics["total"]["trainings"] == 0
+    assert statistics["total"]["utilization"] == 0
+    assert statistics["months"] == []
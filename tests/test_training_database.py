@@ -1,15 +1,20 @@
+import asyncio
 import re
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.orm.exc import StaleDataError
 
 from dogtraining.server.models import Card, Training
 from dogtraining.server.training_database import (
+    BookingConflict,
     CardFull,
     CardNotFound,
     CardSpec,
     DogNotFound,
     DogSpec,
     DogSpecInvalid,
+    TrainingFilter,
     TrainingNotFound,
     TrainingSpec,
     TrainingType,
@@ -103,10 +108,12 @@ async def test_get_training_entry_by_id_fails_if_not_existing(
 
 
 async def test_get_all_training_entries(
+    create_dogs,
     training_database,
     training_type,
     user_id,
 ):
+    await create_dogs(*[str(i + 1) for i in range(4)])
     await training_database.create_card_entry(
         card_spec=CardSpec(
             timestamp=1,
@@ -313,12 +320,14 @@ async def test_get_card_entry_as_dict(
 
 
 async def test_create_training_entry_but_card_is_full_raises_exception(
+    create_dogs,
     training_database,
     create_card_entry,
     training_timestamp,
     training_type,
     user_id,
 ):
+    await create_dogs("some-0", "some-1")
     await create_card_entry()
     with pytest.raises(
         CardFull,
@@ -335,12 +344,14 @@ async def test_create_training_entry_but_card_is_full_raises_exception(
 
 
 async def test_create_training_entry_but_assign_overflowing_trainings_to_new_card(
+    create_dogs,
     training_database,
     create_card_entry,
     training_timestamp,
     training_type,
     user_id,
 ):
+    await create_dogs("some-0", "some-1")
     card = await create_card_entry()
     card_new = await create_card_entry()
     trainings = await training_database.create_training_entry(
@@ -491,3 +502,306 @@ async def test_get_all_dogs(
 
     assert len(dogs) == 1
     assert dogs[0].id == dog.id
+
+
+async def test_create_training_entry_fills_remaining_slots_of_oldest_card_first(
+    create_dogs,
+    training_database,
+    training_timestamp,
+    training_type,
+    user_id,
+):
+    await create_dogs(*[f"some-{i}" for i in range(5)])
+    cards = [
+        await training_database.create_card_entry(
+            card_spec=CardSpec(timestamp=i + 1, cost=1, slots=2, user_id=user_id)
+        )
+        for i in range(3)
+    ]
+    await training_database.create_training_entry(
+        training_spec=TrainingSpec(
+            timestamp=training_timestamp,
+            type=training_type,
+            dogs=["some-0", "some-1", "some-2"],
+            user_id=user_id,
+        )
+    )
+    trainings = await training_database.create_training_entry(
+        training_spec=TrainingSpec(
+            timestamp=training_timestamp,
+            type=training_type,
+            dogs=["some-3", "some-4"],
+            user_id=user_id,
+        )
+    )
+
+    assert [training.card_id for training in trainings] == [cards[1].id, cards[2].id]
+
+
+async def test_create_training_entry_returns_trainings_with_dog(
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    trainings = await create_training_entry(dogs=[dog.id])
+
+    assert trainings[0].as_dict()["dog"] == dog.as_dict()
+
+
+async def test_create_training_entry_concurrently_never_overbooks_a_card(
+    create_dogs,
+    training_database,
+    training_timestamp,
+    training_type,
+    user_id,
+):
+    await create_dogs(*[f"some-{i}" for i in range(200)])
+    cards = [
+        await training_database.create_card_entry(
+            card_spec=CardSpec(timestamp=i + 1, cost=1, slots=10, user_id=user_id)
+        )
+        for i in range(3)
+    ]
+
+    results = await asyncio.gather(
+        *[
+            training_database.create_training_entry(
+                training_spec=TrainingSpec(
+                    timestamp=training_timestamp,
+                    type=training_type,
+                    dogs=[f"some-{i}"],
+                    user_id=user_id,
+                )
+            )
+            for i in range(200)
+        ],
+        return_exceptions=True,
+    )
+
+    booked = [result for result in results if isinstance(result, list)]
+    assert len(booked) == 30
+    assert all(isinstance(result, (list, CardFull)) for result in results)
+    for card in cards:
+        actual_card = await training_database.get_card_entry_by_id(
+            card_id=card.id, user_id=user_id
+        )
+        assert len(actual_card.trainings) == card.slots
+        assert actual_card.remaining_slots == 0
+
+
+async def test_create_training_entry_raises_booking_conflict_after_retries(
+    training_database,
+    create_card_entry,
+    training_timestamp,
+    training_type,
+    user_id,
+    monkeypatch,
+):
+    await create_card_entry()
+
+    async def book_trainings(*, session, training_spec):
+        raise StaleDataError()
+
+    monkeypatch.setattr(training_database, "_book_trainings", book_trainings)
+    with pytest.raises(
+        BookingConflict,
+        match=f"The cards of the user: {user_id} are booked concurrently",
+    ):
+        await training_database.create_training_entry(
+            training_spec=TrainingSpec(
+                timestamp=training_timestamp,
+                type=training_type,
+                dogs=["some-0"],
+                user_id=user_id,
+            )
+        )
+
+
+async def test_unit_of_work_shares_one_session_and_commits_once(
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    create_training_entry,
+    user_id,
+):
+    checkouts = training_database.pool_metrics.checkouts
+    async with training_database.unit_of_work(write=True):
+        card = await create_card_entry()
+        dog = await create_dog_entry()
+        await create_training_entry(dogs=[dog.id])
+        (card_row,) = await training_database.get_all_card_entries(user_id=user_id)
+        assert card_row.id == card.id
+
+    assert training_database.pool_metrics.checkouts == checkouts + 1
+    card = await training_database.get_card_entry_by_id(
+        card_id=card.id, user_id=user_id
+    )
+    assert card.remaining_slots == 0
+
+
+async def test_unit_of_work_rolls_back_on_error(
+    training_database,
+    create_card_entry,
+    user_id,
+):
+    with pytest.raises(CardNotFound):
+        async with training_database.unit_of_work(write=True):
+            card = await create_card_entry()
+            await training_database.get_card_entry_by_id(
+                card_id="some", user_id=user_id
+            )
+
+    with pytest.raises(CardNotFound):
+        await training_database.get_card_entry_by_id(card_id=card.id, user_id=user_id)
+
+
+def _training_specs(*, dog_id, user_id, sizes):
+    return [
+        TrainingSpec(
+            timestamp=index + 1,
+            type=TrainingType.QUERBEET,
+            dogs=[dog_id] * size,
+            user_id=user_id,
+        )
+        for index, size in enumerate(sizes)
+    ]
+
+
+async def test_create_training_entries_books_all_dates_with_one_insert(
+    training_database,
+    create_dog_entry,
+    user_id,
+):
+    card = await training_database.create_card_entry(
+        card_spec=CardSpec(timestamp=1, cost=1, slots=5, user_id=user_id)
+    )
+    dog = await create_dog_entry()
+    inserts = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO training"):
+            inserts.append(statement)
+
+    event.listen(training_database.engine.sync_engine, "before_cursor_execute", collect)
+    try:
+        results = await training_database.create_training_entries(
+            training_specs=_training_specs(
+                dog_id=dog.id, user_id=user_id, sizes=[1, 2, 1]
+            )
+        )
+    finally:
+        event.remove(
+            training_database.engine.sync_engine, "before_cursor_execute", collect
+        )
+
+    assert len(inserts) == 1
+    assert [
+        [training.timestamp for training in result.trainings] for result in results
+    ] == [[1], [2, 2], [3]]
+    assert all(result.error is None for result in results)
+    card = await training_database.get_card_entry_by_id(
+        card_id=card.id, user_id=user_id
+    )
+    assert card.remaining_slots == 1
+    assert len(card.trainings) == 4
+
+
+async def test_create_training_entries_books_nothing_if_one_does_not_fit(
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    with pytest.raises(
+        CardFull, match="Only 1 slot available but 2 amount of slots are required"
+    ):
+        await training_database.create_training_entries(
+            training_specs=_training_specs(dog_id=dog.id, user_id=user_id, sizes=[1, 1])
+        )
+
+    assert await training_database.get_all_training_entries(user_id=user_id) == []
+
+
+async def test_create_training_entries_best_effort_books_what_fits(
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    user_id,
+):
+    await create_card_entry()
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    results = await training_database.create_training_entries(
+        training_specs=_training_specs(dog_id=dog.id, user_id=user_id, sizes=[1, 2, 1]),
+        best_effort=True,
+    )
+
+    assert [len(result.trainings) for result in results] == [1, 0, 1]
+    assert results[1].error.startswith(
+        "Only 1 slot available but 2 amount of slots are required"
+    )
+    assert len(await training_database.get_all_training_entries(user_id=user_id)) == 2
+
+
+async def test_get_all_training_entries_with_filter(
+    training_database, create_dog_entry, user_id
+):
+    dogs = [await create_dog_entry(), await create_dog_entry()]
+    for card_timestamp in (1, 2):
+        await training_database.create_card_entry(
+            card_spec=CardSpec(
+                timestamp=card_timestamp, cost=1, slots=4, user_id=user_id
+            )
+        )
+    for timestamp, training_type, dog in [
+        (10, TrainingType.QUERBEET, dogs[0]),
+        (20, TrainingType.QUERBEET, dogs[1]),
+        (30, TrainingType.ALLTAGSSPAZIERGANG, dogs[0]),
+        (40, TrainingType.QUERBEET, dogs[0]),
+    ]:
+        await training_database.create_training_entry(
+            training_spec=TrainingSpec(
+                timestamp=timestamp, type=training_type, dogs=[dog.id], user_id=user_id
+            )
+        )
+
+    async def timestamps(**kwargs):
+        trainings = await training_database.get_all_training_entries(
+            user_id=user_id, **kwargs
+        )
+        return [training.timestamp for training in trainings]
+
+    assert await timestamps(training_filter=TrainingFilter(start=20, end=40)) == [
+        20,
+        30,
+    ]
+    assert await timestamps(training_filter=TrainingFilter(dog_id=dogs[0].id)) == [
+        10,
+        30,
+        40,
+    ]
+    assert await timestamps(
+        training_filter=TrainingFilter(type=TrainingType.QUERBEET, start=15)
+    ) == [20, 40]
+    assert await timestamps(descending=True, limit=2) == [40, 30]
+    (last,) = await training_database.get_all_training_entries(
+        user_id=user_id, descending=True, limit=1
+    )
+    assert await timestamps(
+        descending=True, after=(last.timestamp, last.id), limit=2
+    ) == [30, 20]
+    cards = await training_database.get_all_card_entries(user_id=user_id)
+    assert await timestamps(training_filter=TrainingFilter(card_id=cards[0].id)) == [
+        10,
+        20,
+        30,
+        40,
+    ]
+    assert await timestamps(training_filter=TrainingFilter(card_id=cards[1].id)) == []
@@ -1,21 +1,38 @@
+import asyncio
+import json
+
 import attrs
 import pytest
 from aiohttp import web
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
 
-from dogtraining.server.models import Card
+from dogtraining.server.engine import QueryBudgets
+from dogtraining.server.models import Card, UserRevision
 from dogtraining.server.training_database import (
+    IMPORT_CHUNK_SIZE,
     CardSpec,
     DogSpec,
     TrainingSpec,
     TrainingType,
 )
-from dogtraining.server.training_handler import TrainingHandler, user_authentication
+from dogtraining.server.training_handler import (
+    TrainingHandler,
+    compression,
+    enforce_query_budgets,
+    unit_of_work,
+    user_authentication,
+)
 
 
 @pytest.fixture
-async def client(aiohttp_client, training_database):
+async def client(aiohttp_client, training_database, query_budgets):
     training_handler = TrainingHandler(training_database=training_database)
-    app = web.Application(middlewares=[user_authentication])
+    app = web.Application(
+        middlewares=[enforce_query_budgets, user_authentication, unit_of_work]
+    )
+    app["query_budgets"] = query_budgets
+    app["training_database"] = training_database
     app.add_routes(
         [
             web.get("/trainings", training_handler.get_all_trainings),
@@ -24,10 +41,19 @@ async def client(aiohttp_client, training_database):
             web.get("/cards/{id}", training_handler.get_card_by_id),
             web.post("/cards", training_handler.create_card_entry),
             web.post("/trainings", training_handler.create_training_entry),
+            web.post("/trainings/batch", training_handler.create_training_entries),
             web.get("/training_types", training_handler.get_all_training_types),
             web.post("/dogs", training_handler.create_dog_entry),
             web.get("/dogs", training_handler.get_all_dogs),
             web.get("/dogs/{id}", training_handler.get_dog_by_id),
+            web.post(
+                "/import/{kind:dogs|cards|trainings}", training_handler.import_entries
+            ),
+            web.get(
+                "/export/{kind:dogs|cards|trainings}", training_handler.export_entries
+            ),
+            web.get("/stats", training_handler.get_statistics),
+            web.get("/metrics/pool", training_handler.get_pool_status),
         ]
     )
     return await aiohttp_client(app)
@@ -148,13 +174,38 @@ async def test_create_training_entry_with_invalid_payload_fails(client, user_id)
     }
 
 
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/cards", {"timestamp": 10**20, "cost": 1, "slots": 1}),
+        ("/trainings", {"timestamp": 10**20, "type": "querbeet", "dogs": ["a"]}),
+    ],
+)
+async def test_create_entry_with_a_timestamp_out_of_range_fails(
+    client, user_id, path, body
+):
+    response = await client.post(path, json=body, headers={"user_id": user_id})
+    assert response.status == 400
+    assert "can not be after" in (await response.json())["error"]
+
+
+async def test_create_dog_entry_with_invalid_json_fails(client, user_id):
+    response = await client.post("/dogs", data=b"{", headers={"user_id": user_id})
+    assert response.status == 400
+    assert await response.json() == {
+        "error": "The payload has to be a valid JSON object"
+    }
+
+
 async def test_create_training_entry_but_card_does_not_exist(
+    create_dogs,
     client,
     training_timestamp,
     training_type,
     training_dogs,
     user_id,
 ):
+    await create_dogs(*training_dogs)
     training_spec = TrainingSpec(
         timestamp=training_timestamp,
         type=training_type,
@@ -170,6 +221,49 @@ async def test_create_training_entry_but_card_does_not_exist(
     }
 
 
+@pytest.mark.parametrize("path", ["/trainings", "/trainings/batch"])
+@pytest.mark.parametrize("owner", [None, "other"])
+async def test_create_training_entry_with_an_unknown_dog_fails(
+    client, training_database, create_card_entry, create_dogs, user_id, path, owner
+):
+    await create_card_entry()
+    if owner is not None:
+        await create_dogs("some-dog", user_id=owner)
+    training = {"timestamp": 1, "type": "querbeet", "dogs": ["some-dog"]}
+
+    response = await client.post(
+        path,
+        json=training if path == "/trainings" else [training],
+        headers={"user_id": user_id},
+    )
+
+    assert response.status == 400
+    assert await response.json() == {"error": "The dogs: ['some-dog'] do not exist"}
+    assert await training_database.get_all_training_entries(user_id=user_id) == []
+
+
+async def test_create_training_entries_best_effort_reports_unknown_dogs(
+    client, create_card_entry, create_dog_entry, user_id
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    response = await client.post(
+        "/trainings/batch",
+        params={"mode": "best_effort"},
+        json=[
+            {"timestamp": 1, "type": "querbeet", "dogs": ["some-dog"]},
+            {"timestamp": 2, "type": "querbeet", "dogs": [dog.id]},
+        ],
+        headers={"user_id": user_id},
+    )
+
+    assert response.status == 200
+    unknown, booked = await response.json()
+    assert unknown == {"error": "The dogs: ['some-dog'] do not exist"}
+    assert booked["trainings"][0]["dog"]["id"] == dog.id
+
+
 async def test_create_training_entry_with_valid_data_succeeds(
     client,
     create_card_entry,
@@ -199,12 +293,14 @@ async def test_create_training_entry_with_valid_data_succeeds(
 
 
 async def test_create_training_entry_but_card_will_be_overflown_raises_exception(
+    create_dogs,
     client,
     create_card_entry,
     training_type,
     training_timestamp,
     user_id,
 ):
+    await create_dogs("some", "dog")
     await create_card_entry()
     training_spec = TrainingSpec(
         timestamp=training_timestamp,
@@ -346,3 +442,647 @@ async def test_get_all_dogs(
             user_id=user_id,
         ).items()
     )
+
+
+@pytest.fixture
+async def create_cards(training_database, user_id):
+    async def create_entries(amount) -> list:
+        return [
+            await training_database.create_card_entry(
+                card_spec=CardSpec(timestamp=i + 1, cost=1, slots=1, user_id=user_id)
+            )
+            for i in range(amount)
+        ]
+
+    return create_entries
+
+
+async def test_get_all_cards_paginated(client, create_cards, user_id):
+    cards = await create_cards(5)
+
+    response = await client.get("/cards?limit=2", headers={"user_id": user_id})
+    assert response.status == 200
+    assert [card["id"] for card in await response.json()] == [
+        card.id for card in cards[:2]
+    ]
+
+    next_url = response.links["next"]["url"].path_qs
+    response = await client.get(next_url, headers={"user_id": user_id})
+    assert [card["id"] for card in await response.json()] == [
+        card.id for card in cards[2:4]
+    ]
+
+    next_url = response.links["next"]["url"].path_qs
+    response = await client.get(next_url, headers={"user_id": user_id})
+    assert [card["id"] for card in await response.json()] == [cards[4].id]
+    assert "next" not in response.links
+
+
+@pytest.mark.parametrize("path", ["/trainings", "/cards", "/dogs"])
+@pytest.mark.parametrize(
+    "query",
+    [
+        "after=abc",
+        "after=1",
+        "after=²,x",
+        "limit=0",
+        "limit=abc",
+        "limit=²",
+        "limit=100000",
+        "stream=xml",
+    ],
+)
+async def test_get_all_with_invalid_query_fails(client, user_id, path, query):
+    response = await client.get(f"{path}?{query}", headers={"user_id": user_id})
+    assert response.status == 400
+    assert "error" in await response.json()
+
+
+async def test_get_all_trainings_streamed_as_ndjson(
+    client,
+    create_card_entry,
+    create_training_entry,
+    create_dog_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    training = await create_training_entry(dogs=[dog.id])
+
+    response = await client.get(
+        "/trainings?stream=ndjson", headers={"user_id": user_id}
+    )
+    assert response.status == 200
+    assert response.content_type == "application/x-ndjson"
+    lines = (await response.text()).splitlines()
+    assert [json.loads(line) for line in lines] == [training[0].as_dict()]
+
+
+@pytest.mark.parametrize("amount", [0, 3])
+async def test_get_all_cards_streamed_as_json_array(
+    client, create_cards, user_id, amount
+):
+    cards = await create_cards(amount)
+
+    response = await client.get("/cards?stream=json", headers={"user_id": user_id})
+    assert response.status == 200
+    assert [card["id"] for card in await response.json()] == [card.id for card in cards]
+
+
+async def test_get_all_cards_returns_shallow_cards_by_default(
+    client,
+    create_card_entry,
+    create_training_entry,
+    create_dog_entry,
+    user_id,
+):
+    card = await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id])
+
+    response = await client.get("/cards", headers={"user_id": user_id})
+    assert response.status == 200
+    assert await response.json() == [
+        dict(
+            id=card.id,
+            timestamp=card.timestamp,
+            cost=card.cost,
+            slots=card.slots,
+            used_slots=1,
+            remaining_slots=0,
+            user_id=user_id,
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "expand, expected_dog",
+    [
+        ("trainings", False),
+        ("trainings.dog", True),
+        ("trainings,trainings.dog", True),
+    ],
+)
+@pytest.mark.parametrize("path", ["/cards", "/cards/{id}"])
+async def test_get_cards_with_expanded_trainings(
+    client,
+    create_card_entry,
+    create_training_entry,
+    create_dog_entry,
+    user_id,
+    expand,
+    expected_dog,
+    path,
+):
+    card = await create_card_entry()
+    dog = await create_dog_entry()
+    training = await create_training_entry(dogs=[dog.id])
+
+    response = await client.get(
+        path.format(id=card.id),
+        params={"expand": expand},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    response_json = await response.json()
+    if isinstance(response_json, list):
+        (response_json,) = response_json
+    assert response_json["trainings"] == [
+        training[0].as_dict(expand=("dog",) if expected_dog else ())
+    ]
+
+
+async def test_get_all_cards_with_invalid_expand_fails(client, user_id):
+    response = await client.get(
+        "/cards", params={"expand": "trainings.card"}, headers={"user_id": user_id}
+    )
+    assert response.status == 400
+    assert await response.json() == {
+        "error": "The query parameter expand can only contain: ['trainings', 'trainings.dog'] but was: ['trainings.card']"
+    }
+
+
+async def test_get_all_trainings_without_dog(
+    client,
+    create_card_entry,
+    create_training_entry,
+    create_dog_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    training = await create_training_entry(dogs=[dog.id])
+
+    response = await client.get(
+        "/trainings", params={"expand": ""}, headers={"user_id": user_id}
+    )
+    assert response.status == 200
+    assert await response.json() == [training[0].as_dict(expand=())]
+
+
+async def test_get_pool_status(client, user_id):
+    await client.get("/dogs", headers={"user_id": user_id})
+
+    response = await client.get("/metrics/pool", headers={"user_id": user_id})
+    assert response.status == 200
+    response_json = await response.json()
+    assert response_json["checkouts"] >= 1
+    assert response_json["in_use"] == 0
+
+
+@pytest.fixture
+async def unit_of_work_client(aiohttp_client, training_database):
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(middlewares=[user_authentication, unit_of_work])
+    app["training_database"] = training_database
+    app.add_routes(
+        [
+            web.get("/cards", training_handler.get_all_cards),
+            web.post("/cards", training_handler.create_card_entry),
+            web.post("/trainings", training_handler.create_training_entry),
+            web.post("/dogs", training_handler.create_dog_entry),
+            web.post("/import/{kind}", training_handler.import_entries),
+        ]
+    )
+    return await aiohttp_client(app)
+
+
+async def test_unit_of_work_checks_out_one_connection_per_request(
+    unit_of_work_client,
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    user_id,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    checkouts = training_database.pool_metrics.checkouts
+
+    response = await unit_of_work_client.post(
+        "/trainings",
+        json={"timestamp": 1, "type": TrainingType.QUERBEET.value, "dogs": [dog.id]},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    assert training_database.pool_metrics.checkouts == checkouts + 1
+
+    response = await unit_of_work_client.get(
+        "/cards", params={"expand": "trainings.dog"}, headers={"user_id": user_id}
+    )
+    assert response.status == 200
+    assert (await response.json())[0]["trainings"][0]["dog"]["id"] == dog.id
+    assert training_database.pool_metrics.checkouts == checkouts + 2
+
+
+async def test_unit_of_work_begins_the_write_after_the_body_is_read(
+    unit_of_work_client, training_database, user_id
+):
+    uploading, resume = asyncio.Event(), asyncio.Event()
+
+    async def slow_body():
+        yield b'{"registration_time": 1, '
+        uploading.set()
+        await resume.wait()
+        yield b'"name": "Rex"}'
+
+    request = asyncio.create_task(
+        unit_of_work_client.post(
+            "/dogs",
+            data=slow_body(),
+            headers={"user_id": user_id, "Content-Type": "application/json"},
+        )
+    )
+    await uploading.wait()
+    await asyncio.sleep(0.1)
+    await asyncio.wait_for(
+        training_database.create_dog_entry(
+            dog_spec=DogSpec(registration_time=1, name="Bello", user_id=user_id)
+        ),
+        timeout=1,
+    )
+    resume.set()
+    response = await request
+    assert response.status == 200
+
+    dogs = await training_database.get_all_dogs(user_id=user_id)
+    assert sorted(dog.name for dog in dogs) == ["Bello", "Rex"]
+
+
+async def test_unit_of_work_retries_a_transient_booking_error(
+    unit_of_work_client,
+    training_database,
+    create_card_entry,
+    create_dog_entry,
+    user_id,
+    monkeypatch,
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+    book_trainings = training_database._book_trainings
+    attempts = []
+
+    class Busy(Exception):
+        sqlite_errorname = "SQLITE_BUSY"
+
+    async def busy_once(*, session, training_spec):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OperationalError("INSERT", {}, Busy())
+        return await book_trainings(session=session, training_spec=training_spec)
+
+    monkeypatch.setattr(training_database, "_book_trainings", busy_once)
+    response = await unit_of_work_client.post(
+        "/trainings",
+        json={"timestamp": 1, "type": TrainingType.QUERBEET.value, "dogs": [dog.id]},
+        headers={"user_id": user_id},
+    )
+
+    assert response.status == 200
+    assert len(attempts) == 2
+    assert len(await training_database.get_all_training_entries(user_id=user_id)) == 1
+
+
+async def test_create_training_entries(
+    client, create_card_entry, create_dog_entry, user_id
+):
+    await create_card_entry()
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    response = await client.post(
+        "/trainings/batch",
+        json=[
+            {"timestamp": timestamp, "type": "querbeet", "dogs": [dog.id]}
+            for timestamp in (1, 2)
+        ],
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    results = await response.json()
+    assert [result["trainings"][0]["timestamp"] for result in results] == [1, 2]
+    assert results[0]["trainings"][0]["dog"]["id"] == dog.id
+
+
+async def test_create_training_entries_all_or_nothing_fails_if_card_is_full(
+    client, create_card_entry, create_dog_entry, user_id
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    response = await client.post(
+        "/trainings/batch",
+        json=[
+            {"timestamp": timestamp, "type": "querbeet", "dogs": [dog.id]}
+            for timestamp in (1, 2)
+        ],
+        headers={"user_id": user_id},
+    )
+    assert response.status == 400
+    response = await client.get("/trainings", headers={"user_id": user_id})
+    assert await response.json() == []
+
+
+async def test_create_training_entries_best_effort(
+    client, create_card_entry, create_dog_entry, user_id
+):
+    await create_card_entry()
+    dog = await create_dog_entry()
+
+    response = await client.post(
+        "/trainings/batch",
+        params={"mode": "best_effort"},
+        json=[
+            {"timestamp": timestamp, "type": "querbeet", "dogs": [dog.id]}
+            for timestamp in (1, 2)
+        ],
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    first, second = await response.json()
+    assert len(first["trainings"]) == 1
+    assert second["error"].startswith("Only 0 slot available")
+
+
+@pytest.mark.parametrize(
+    "params, body",
+    [
+        ({}, []),
+        ({}, {"timestamp": 1, "type": "querbeet", "dogs": ["some"]}),
+        ({}, [{"timestamp": 1, "type": "some", "dogs": ["some"]}]),
+        ({"mode": "some"}, [{"timestamp": 1, "type": "querbeet", "dogs": ["some"]}]),
+    ],
+)
+async def test_create_training_entries_with_invalid_payload_fails(
+    client, user_id, params, body
+):
+    response = await client.post(
+        "/trainings/batch", params=params, json=body, headers={"user_id": user_id}
+    )
+    assert response.status == 400
+
+
+async def test_import_and_export_entries(client, user_id):
+    response = await client.post(
+        "/import/dogs",
+        params={"format": "csv"},
+        data=b"id,registration_time,name\nd-0,1,Rex\nd-1,2,Bello\n",
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    assert await response.json() == {"imported": 2}
+
+    response = await client.get(
+        "/export/dogs", params={"format": "ndjson"}, headers={"user_id": user_id}
+    )
+    assert response.status == 200
+    assert response.content_type == "application/x-ndjson"
+    assert [json.loads(line) for line in (await response.text()).splitlines()] == [
+        {"id": "d-0", "registration_time": 1, "name": "Rex"},
+        {"id": "d-1", "registration_time": 2, "name": "Bello"},
+    ]
+
+
+async def test_import_entries_reports_imported_entries_on_error(client, user_id):
+    response = await client.post(
+        "/import/cards",
+        params={"skip": "1"},
+        data=b'{"timestamp": 1}\n{"timestamp": 1, "cost": 1, "slots": 1}\n{"timestamp": 1}\n',
+        headers={"user_id": user_id},
+    )
+    assert response.status == 400
+    response_json = await response.json()
+    assert response_json["imported"] == 1
+    assert response_json["error"].startswith("The entry 3 is invalid")
+
+
+@pytest.mark.parametrize("skip", ["-1", "abc", "²"])
+async def test_import_entries_with_invalid_skip_fails(client, user_id, skip):
+    response = await client.post(
+        "/import/cards",
+        params={"skip": skip},
+        data=b'{"timestamp": 1, "cost": 1, "slots": 1}\n',
+        headers={"user_id": user_id},
+    )
+    assert response.status == 400
+    assert (await response.json())["error"].startswith(
+        "The query parameter skip has to be a positive int"
+    )
+
+
+async def test_import_entries_commits_chunks_outside_of_the_unit_of_work(
+    unit_of_work_client, training_database, user_id
+):
+    response = await unit_of_work_client.post(
+        "/import/dogs",
+        data=b'{"registration_time": 1, "name": "Rex"}\n' * IMPORT_CHUNK_SIZE + b"{}\n",
+        headers={"user_id": user_id},
+    )
+    assert response.status == 400
+    assert (await response.json())["imported"] == IMPORT_CHUNK_SIZE
+    dogs = await training_database.get_all_dogs(user_id=user_id)
+    assert len(dogs) == IMPORT_CHUNK_SIZE
+
+
+async def _shift_revisions(training_database, seconds):
+    async with training_database.unit_of_work(write=True) as session:
+        await session.execute(
+            update(UserRevision).values(modified_at=UserRevision.modified_at + seconds)
+        )
+
+
+async def test_list_endpoints_answer_conditional_requests(
+    client, training_database, create_card_entry, user_id
+):
+    await create_card_entry()
+    await _shift_revisions(training_database, -1)
+    response = await client.get("/cards", headers={"user_id": user_id})
+    assert response.status == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    for headers in ({"If-None-Match": etag}, {"If-Modified-Since": last_modified}):
+        response = await client.get("/cards", headers={"user_id": user_id, **headers})
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+
+    response = await client.get(
+        "/cards",
+        params={"limit": 1},
+        headers={"user_id": user_id, "If-None-Match": etag},
+    )
+    assert response.status == 200
+    response = await client.get(
+        "/cards", headers={"user_id": "other", "If-None-Match": etag}
+    )
+    assert response.status == 200
+
+    await create_card_entry()
+    response = await client.get(
+        "/cards", headers={"user_id": user_id, "If-None-Match": etag}
+    )
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+    assert len(await response.json()) == 2
+
+
+async def test_last_modified_is_only_sent_for_a_past_second(
+    client, training_database, create_card_entry, user_id
+):
+    await create_card_entry()
+    await _shift_revisions(training_database, 60)
+    response = await client.get("/cards", headers={"user_id": user_id})
+    assert "Last-Modified" not in response.headers
+    etag = response.headers["ETag"]
+
+    await _shift_revisions(training_database, -61)
+    response = await client.get("/cards", headers={"user_id": user_id})
+    last_modified = response.headers["Last-Modified"]
+    await create_card_entry()
+    response = await client.get(
+        "/cards", headers={"user_id": user_id, "If-Modified-Since": last_modified}
+    )
+    assert response.status == 200
+    assert len(await response.json()) == 2
+
+    response = await client.get(
+        "/cards",
+        headers={
+            "user_id": user_id,
+            "If-None-Match": etag,
+            "If-Modified-Since": "Fri, 31 Dec 9999 23:59:59 GMT",
+        },
+    )
+    assert response.status == 200
+
+
+async def test_validators_are_weak_and_vary_on_the_encoding(client, user_id):
+    response = await client.get("/dogs", headers={"user_id": user_id})
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "Accept-Encoding" in response.headers.getall("Vary")
+
+    response = await client.get(
+        "/dogs", headers={"user_id": user_id, "If-None-Match": etag}
+    )
+    assert response.status == 304
+    assert "Accept-Encoding" in response.headers.getall("Vary")
+
+
+async def test_streamed_list_has_validators(client, user_id):
+    response = await client.get(
+        "/trainings", params={"stream": "ndjson"}, headers={"user_id": user_id}
+    )
+    assert response.status == 200
+    etag = response.headers["ETag"]
+
+    response = await client.get(
+        "/trainings",
+        params={"stream": "ndjson"},
+        headers={"user_id": user_id, "If-None-Match": etag},
+    )
+    assert response.status == 304
+
+
+async def test_compression_of_large_responses(
+    aiohttp_client, training_database, user_id
+):
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(middlewares=[compression, user_authentication])
+    app.add_routes(
+        [
+            web.get("/cards", training_handler.get_all_cards),
+            web.get("/training_types", training_handler.get_all_training_types),
+        ]
+    )
+    client = await aiohttp_client(app)
+    for i in range(20):
+        await training_database.create_card_entry(
+            card_spec=CardSpec(timestamp=i + 1, cost=1, slots=1, user_id=user_id)
+        )
+
+    response = await client.get(
+        "/cards", headers={"user_id": user_id, "Accept-Encoding": "gzip"}
+    )
+    assert response.status == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers.getall("Vary")
+    assert len(await response.json()) == 20
+
+    response = await client.get(
+        "/training_types", headers={"user_id": user_id, "Accept-Encoding": "gzip"}
+    )
+    assert "Content-Encoding" not in response.headers
+
+
+async def test_get_statistics(client, create_card_entry, user_id):
+    await create_card_entry()
+    response = await client.get("/stats", headers={"user_id": user_id})
+    assert response.status == 200
+    statistics = await response.json()
+    assert statistics["total"]["cards"] == 1
+    assert statistics["total"]["slots"] == 1
+
+    response = await client.get(
+        "/stats",
+        headers={"user_id": user_id, "If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status == 304
+
+
+async def test_get_all_trainings_with_filter(
+    client, create_card_entry, create_dog_entry, create_training_entry, user_id
+):
+    await create_card_entry()
+    await create_card_entry()
+    dog = await create_dog_entry()
+    await create_training_entry(dogs=[dog.id])
+
+    response = await client.get(
+        "/trainings",
+        params={"from": 1, "to": 2, "dog_id": dog.id, "type": "alltagsspaziergang"},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    assert len(await response.json()) == 1
+
+    response = await client.get(
+        "/trainings",
+        params={"from": 2, "order": "desc"},
+        headers={"user_id": user_id},
+    )
+    assert response.status == 200
+    assert await response.json() == []
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"from": "yesterday"}, {"from": "²"}, {"type": "agility"}, {"order": "random"}],
+)
+async def test_get_all_trainings_with_invalid_filter(client, user_id, params):
+    response = await client.get(
+        "/trainings", params=params, headers={"user_id": user_id}
+    )
+    assert response.status == 400
+
+
+async def test_query_budget_records_endpoints_over_budget(
+    aiohttp_client, training_database, create_card_entry, user_id
+):
+    await create_card_entry()
+    training_handler = TrainingHandler(training_database=training_database)
+    app = web.Application(
+        middlewares=[enforce_query_budgets, user_authentication, unit_of_work]
+    )
+    app["query_budgets"] = QueryBudgets({"GET /cards": 1})
+    app["training_database"] = training_database
+    app.add_routes([web.get("/cards", training_handler.get_all_cards)])
+    client = await aiohttp_client(app)
+
+    response = await client.get("/cards", headers={"user_id": user_id})
+
+    assert response.status == 200
+    [exceeded] = app["query_budgets"].exceeded
+    assert exceeded.startswith("GET /cards ran ")
+    assert "but its budget is 1" in exceeded
+    assert "  BEGIN" in exceeded
+    assert "FROM card" in exceeded
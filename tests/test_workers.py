@@ -0,0 +1,113 @@
+import asyncio
+import signal
+import socket
+import sys
+
+import aiohttp
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from dogtraining.server.engine import EngineSettings
+from dogtraining.server.migrations import upgrade
+from dogtraining.server.workers import check_worker_settings
+
+
+@pytest.mark.parametrize(
+    "connection, workers, engine_settings",
+    [
+        (
+            "sqlite+aiosqlite:///test.db",
+            1,
+            EngineSettings(sqlite_journal_mode="DELETE"),
+        ),
+        ("sqlite+aiosqlite:///test.db", 4, EngineSettings()),
+        ("postgresql+asyncpg://user@localhost/db", 4, EngineSettings()),
+    ],
+)
+def test_check_worker_settings_accepts(connection, workers, engine_settings):
+    check_worker_settings(
+        connection=connection, workers=workers, engine_settings=engine_settings
+    )
+
+
+@pytest.mark.parametrize(
+    "connection, workers, engine_settings",
+    [
+        ("sqlite+aiosqlite:///test.db", 0, EngineSettings()),
+        ("sqlite+aiosqlite://", 2, EngineSettings()),
+        (
+            "sqlite+aiosqlite:///test.db",
+            2,
+            EngineSettings(sqlite_journal_mode="DELETE"),
+        ),
+    ],
+)
+def test_check_worker_settings_rejects(connection, workers, engine_settings):
+    with pytest.raises(ValueError):
+        check_worker_settings(
+            connection=connection, workers=workers, engine_settings=engine_settings
+        )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(session, url, process):
+    for _ in range(100):
+        if process.returncode is not None:
+            raise RuntimeError(f"The server exited with {process.returncode}")
+        try:
+            async with session.get(url, headers={"user_id": "probe"}) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientConnectionError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError(f"The server did not answer on {url}")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="graceful shutdown needs SIGTERM")
+async def test_workers_share_a_sqlite_database(connection, user_id):
+    engine = create_async_engine(connection)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await engine.dispose()
+    port = free_port()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "dogtraining.server",
+        f"--connection={connection}",
+        "--host=127.0.0.1",
+        f"--port={port}",
+        "--workers=2",
+        "--max_concurrent_writes=0",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    headers = {"user_id": user_id}
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_for_server(session, f"{url}/training_types", process)
+
+            async def create_card():
+                async with session.post(
+                    f"{url}/cards",
+                    json={"timestamp": 1, "cost": 1, "slots": 1},
+                    headers=headers,
+                ) as response:
+                    return response.status
+
+            assert set(await asyncio.gather(*(create_card() for _ in range(20)))) == {
+                200
+            }
+            async with session.get(f"{url}/cards", headers=headers) as response:
+                assert len(await response.json()) == 20
+    finally:
+        process.send_signal(signal.SIGTERM)
+        returncode = await asyncio.wait_for(process.wait(), timeout=10)
+    assert returncode == 0